@@ -0,0 +1,92 @@
+"""
+Benchmark: sync vs async PostgREST calls inside async handlers
+
+Starts a fake PostgREST server (fixed per-request latency) in a separate
+process and drives N concurrent clients against two handler variants:
+
+  sync  - async def handler calling the blocking SyncPostgrestClient
+          (what server.py did before utils/db.py)
+  async - async def handler awaiting the pooled AsyncPostgrestClient
+
+Usage:
+    python benchmarks/bench_async_db.py --clients 128 --duration 10 --latency-ms 20
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from aiohttp import web
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+
+HOST = "127.0.0.1"
+PORT = 54329
+
+def _serve_fake_postgrest(latency_ms: int, ready):
+    async def handle(request):
+        await asyncio.sleep(latency_ms / 1000)
+        return web.json_response([{"id": "00000000-0000-0000-0000-000000000001", "username": "bench"}])
+
+    async def serve():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, HOST, PORT).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+def start_fake_postgrest(latency_ms: int) -> multiprocessing.Process:
+    """Run a fake PostgREST in its own process so neither client variant can stall it"""
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve_fake_postgrest, args=(latency_ms, ready), daemon=True)
+    process.start()
+    ready.wait()
+    return process
+
+async def run_clients(handler, clients: int, duration: float) -> int:
+    """Run `clients` concurrent request loops for `duration` seconds, return completed requests"""
+    deadline = time.perf_counter() + duration
+    completed = 0
+
+    async def client_loop():
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            await handler()
+            completed += 1
+
+    await asyncio.gather(*(client_loop() for _ in range(clients)))
+    return completed
+
+async def main(args):
+    base_url = f"http://{HOST}:{PORT}/rest/v1"
+    server = start_fake_postgrest(args.latency_ms)
+
+    sync_client = SyncPostgrestClient(base_url)
+    async_client = AsyncPostgrestClient(base_url)
+
+    async def sync_handler():
+        sync_client.from_("users").select("*").eq("id", "x").execute()
+
+    async def async_handler():
+        await async_client.from_("users").select("*").eq("id", "x").execute()
+
+    print(f"Clients: {args.clients}, duration: {args.duration}s, DB latency: {args.latency_ms}ms")
+    for name, handler in (("sync ", sync_handler), ("async", async_handler)):
+        started = time.perf_counter()
+        completed = await run_clients(handler, args.clients, args.duration)
+        elapsed = time.perf_counter() - started
+        print(f"  {name}: {completed / elapsed:10.1f} req/s ({completed} requests)")
+
+    sync_client.session.close()
+    await async_client.aclose()
+    server.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=128)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency-ms", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,56 @@
+"""
+Microbenchmark: per-candidate vs batch interest compatibility scoring
+
+Scores one user against N candidates with a per-candidate Python Jaccard
+loop (the old discovery path) and with the NumPy bit-vector
+AIService.batch_interest_scores used by discovery, and checks both agree.
+
+Usage:
+    python benchmarks/bench_compatibility.py --candidates 10000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ai_service import AIService
+
+def jaccard_score(user_interests, candidate_interests) -> int:
+    """Interest score of one pair, computed the way discovery did before batching"""
+    if not user_interests or not candidate_interests:
+        return 0
+    common = set(user_interests) & set(candidate_interests)
+    total = set(user_interests) | set(candidate_interests)
+    return int(len(common) / len(total) * 100)
+
+def main(args):
+    rng = random.Random(7)
+    vocabulary = [f"interest_{i}" for i in range(args.vocabulary)]
+    user_interests = rng.sample(vocabulary, 8)
+    candidates = [rng.sample(vocabulary, rng.randint(0, 12)) for _ in range(args.candidates)]
+
+    service = AIService()
+
+    started = time.perf_counter()
+    loop_scores = [jaccard_score(user_interests, c) for c in candidates]
+    loop_ms = (time.perf_counter() - started) * 1000
+
+    service.batch_interest_scores(user_interests, candidates)  # warm up the vocabulary
+    started = time.perf_counter()
+    batch_scores = service.batch_interest_scores(user_interests, candidates)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    mismatches = sum(1 for a, b in zip(loop_scores, batch_scores) if abs(a - b) > 1)
+    print(f"Candidates: {args.candidates}, vocabulary: {args.vocabulary}")
+    print(f"  per-candidate loop: {loop_ms:8.2f} ms")
+    print(f"  batch (NumPy):      {batch_ms:8.2f} ms  ({loop_ms / batch_ms:.1f}x)")
+    print(f"  score mismatches:   {mismatches}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--vocabulary", type=int, default=200)
+    main(parser.parse_args())
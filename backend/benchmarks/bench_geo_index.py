@@ -0,0 +1,78 @@
+"""
+Benchmark: GeoGridIndex radius lookups at 1M users
+
+Places users around a set of city centres (dense cores plus sparse
+countryside), then measures build time and nearest-candidate query latency
+for several radii, compared with a brute-force haversine scan.
+
+Usage:
+    python benchmarks/bench_geo_index.py --users 1000000 --queries 200
+"""
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.geo_index import GeoGridIndex, haversine_km
+
+# (lat, lon) of large Russian cities
+CITIES = [
+    (55.7558, 37.6173), (59.9343, 30.3351), (55.0084, 82.9357), (56.8389, 60.6057),
+    (55.7963, 49.1088), (56.3269, 44.0059), (54.9885, 73.3242), (53.1959, 50.1002),
+    (47.2357, 39.7015), (54.7388, 55.9721), (43.5855, 39.7231), (43.1155, 131.8855),
+]
+
+def random_point(rng: random.Random):
+    if rng.random() < 0.8:
+        lat, lon = rng.choice(CITIES)
+        # ~15 km spread around the centre
+        return lat + rng.gauss(0, 0.15), lon + rng.gauss(0, 0.25)
+    return rng.uniform(42, 68), rng.uniform(28, 135)
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main(args):
+    rng = random.Random(42)
+    index = GeoGridIndex(cell_km=args.cell_km)
+    points = []
+
+    started = time.perf_counter()
+    for i in range(args.users):
+        lat, lon = random_point(rng)
+        index.update(str(i), lat, lon)
+        points.append((lat, lon))
+    print(f"Built index: {args.users} users, {len(index._cells)} cells in {time.perf_counter() - started:.1f}s")
+
+    origins = [random_point(rng) for _ in range(args.queries)]
+    for radius in (5, 25, 100):
+        latencies = []
+        for lat, lon in origins:
+            t = time.perf_counter()
+            index.nearby(lat, lon, radius, limit=args.limit)
+            latencies.append((time.perf_counter() - t) * 1000)
+        print(f"  radius {radius:>3} km, top {args.limit}: "
+              f"p50 {statistics.median(latencies):7.2f} ms, p99 {percentile(latencies, 99):7.2f} ms")
+
+    brute = []
+    for lat, lon in origins[:args.brute_queries]:
+        t = time.perf_counter()
+        matches = [d for p_lat, p_lon in points if (d := haversine_km(lat, lon, p_lat, p_lon)) <= 25]
+        matches.sort()
+        brute.append((time.perf_counter() - t) * 1000)
+    print(f"  brute force 25 km scan: p50 {statistics.median(brute):7.0f} ms ({len(brute)} queries)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--brute-queries", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--cell-km", type=float, default=2.0)
+    main(parser.parse_args())
@@ -0,0 +1,59 @@
+"""
+Benchmark: per-pair vs batched LLM compatibility scoring
+
+Runs against the offline stub LLM (services/llm_stub.py) with a fixed
+per-request latency and scores one user against N candidates twice:
+
+  per-pair - prescore_compatibility with one candidate per prompt
+  batch    - prescore_compatibility with AI_BATCH_SIZE candidates per prompt
+
+Both runs go through the production path (cache, guard, JSON parsing).
+
+Usage:
+    python benchmarks/bench_llm_batch.py --candidates 100 --latency-ms 300
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import services.ai_service as ai_module
+from services.ai_service import AIService
+from services.llm_clients import LlmClientPool
+from services.llm_stub import StubLlmChat, UserMessage
+
+def stub_pool(stub: StubLlmChat) -> LlmClientPool:
+    return LlmClientPool(lambda session_id, system_message: stub, UserMessage)
+
+async def main(args):
+    rng = random.Random(11)
+    vocabulary = [f"interest_{i}" for i in range(50)]
+    user = {"id": "user", "bio": "Люблю горы и кофе", "interests": rng.sample(vocabulary, 8)}
+    candidates = [
+        {"id": f"candidate_{i}", "bio": f"Кандидат {i}", "interests": rng.sample(vocabulary, 8)}
+        for i in range(args.candidates)
+    ]
+
+    service = AIService()
+    print(f"Candidates: {args.candidates}, LLM latency: {args.latency_ms}ms, concurrency: {service._rescore_semaphore._value}")
+
+    batch_size = ai_module.AI_BATCH_SIZE
+    for label, size in (("per-pair", 1), ("batch   ", batch_size)):
+        ai_module.AI_BATCH_SIZE = size
+        stub = StubLlmChat(latency_ms=args.latency_ms)
+        service.llm = stub_pool(stub)
+        service.compatibility_cache.memory.clear()
+        started = time.perf_counter()
+        scored = await service.prescore_compatibility(user, candidates)
+        print(f"  {label}: {time.perf_counter() - started:6.2f}s, {stub.calls} LLM requests ({scored} scored)")
+    ai_module.AI_BATCH_SIZE = batch_size
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--latency-ms", type=int, default=300)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""
+Scenario: LlmGuard behaviour with a slow LLM provider
+
+Sends icebreaker requests through AIService at a steady arrival rate against
+the stub LLM with injected latency, once with a healthy provider (latency below the
+deadline) and once with a degraded one (latency above it). Reports request
+latency, fallback count and the guard's queue depth / circuit breaker state.
+
+Usage:
+    python benchmarks/bench_llm_guard.py --requests 200 --interval-ms 10 --timeout 0.5
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ai_service import AIService
+from services.llm_clients import LlmClientPool
+from services.llm_guard import LlmGuard
+from services.llm_stub import StubLlmChat, UserMessage
+
+PROFILE = {"interests": ["хайкинг"], "bio": "Люблю горы", "job_title": "Инженер"}
+
+async def run(name: str, latency_ms: int, args):
+    stub = StubLlmChat(latency_ms=latency_ms)
+    guard = LlmGuard(max_concurrency=args.concurrency, timeout_seconds=args.timeout,
+                     failure_threshold=5, cooldown_seconds=60)
+    service = AIService()
+    service.llm = LlmClientPool(lambda session_id, system_message: stub, UserMessage, guard=guard)
+
+    latencies = []
+
+    async def request(i: int):
+        await asyncio.sleep(i * args.interval_ms / 1000)
+        started = time.perf_counter()
+        _, fell_back = await service.generate_icebreaker(PROFILE)
+        latencies.append((time.perf_counter() - started) * 1000)
+        return fell_back
+
+    started = time.perf_counter()
+    fallbacks = sum(await asyncio.gather(*(request(i) for i in range(args.requests))))
+    elapsed = time.perf_counter() - started
+
+    stats = guard.stats()
+    print(f"  {name:<8} latency {latency_ms:>5} ms: total {elapsed:5.2f}s, "
+          f"p50 {statistics.median(latencies):7.1f} ms, max {max(latencies):7.1f} ms, "
+          f"fallbacks {fallbacks}/{args.requests}")
+    print(f"           guard: state={stats['state']} max_queue_depth={stats['max_queue_depth']} "
+          f"LLM calls={stub.calls} timeouts={stats['timeouts']} rejected={stats['rejected']}")
+
+async def main(args):
+    print(f"Requests: {args.requests} every {args.interval_ms} ms, "
+          f"concurrency cap: {args.concurrency}, deadline: {args.timeout}s")
+    await run("healthy", int(args.timeout * 1000 / 10), args)
+    await run("degraded", int(args.timeout * 1000 * 10), args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+Benchmark: local first-pass moderation throughput
+
+Runs ModerationEngine.analyze over a synthetic chat corpus (mostly ordinary
+greetings, plus contact details, links, spam and insults) and reports
+messages/sec, per-message latency and how many messages would still be
+escalated to the LLM. The old four-keyword substring check is shown for
+reference.
+
+Usage:
+    python benchmarks/bench_moderation.py --messages 100000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.moderation import moderation_engine
+
+CLEAN = [
+    "Привет! Как прошла неделя?", "Заметил, что ты любишь походы, куда ездила последний раз?",
+    "Hi! What kind of music do you like?", "Давай сходим в кино в субботу", "Ахаха, согласна полностью)",
+    "Я работаю дизайнером, а ты?", "Какой твой любимый фильм?", "Good morning! Coffee later?",
+]
+RISKY = [
+    "Пиши мне в тг maria_k", "мой номер +7 (912) 345-67-89", "переходи по ссылке www.promo-site.ru",
+    "инвестиции в криптовалюту, заработок без вложений", "ты урод", "mail me: anna.k@gmail.com",
+]
+
+def corpus(size: int, risky_share: float):
+    rng = random.Random(5)
+    return [rng.choice(RISKY) if rng.random() < risky_share else rng.choice(CLEAN) for _ in range(size)]
+
+def main(args):
+    messages = corpus(args.messages, args.risky_share)
+
+    keywords = ["spam", "scam", "fake", "bot"]
+    started = time.perf_counter()
+    for message in messages:
+        any(keyword in message.lower() for keyword in keywords)
+    baseline = time.perf_counter() - started
+
+    latencies = []
+    escalated = flagged = 0
+    started = time.perf_counter()
+    for message in messages:
+        t = time.perf_counter()
+        result = moderation_engine.analyze(message)
+        latencies.append((time.perf_counter() - t) * 1_000_000)
+        escalated += result.uncertain
+        flagged += not result.uncertain and not result.to_verdict()["is_safe"]
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Messages: {args.messages} ({args.risky_share:.0%} risky)")
+    print(f"  keyword check:    {args.messages / baseline:12,.0f} msg/s")
+    print(f"  ModerationEngine: {args.messages / elapsed:12,.0f} msg/s, "
+          f"p50 {statistics.median(latencies):5.1f} us, p99 {latencies[int(len(latencies) * 0.99)]:5.1f} us")
+    print(f"  flagged locally: {flagged}, escalated to LLM: {escalated} ({escalated / args.messages:.1%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--risky-share", type=float, default=0.05)
+    main(parser.parse_args())
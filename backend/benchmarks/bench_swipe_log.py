@@ -0,0 +1,64 @@
+"""
+Benchmark: swipe event log write throughput and compaction
+
+Appends synthetic swipe events to SwipeEventLog at full speed with the
+flush loop running (batched appends to the current hour's segment file),
+then folds the written segment into daily per-user aggregates the way the
+compactor does. No database is needed; files go to a temporary directory.
+
+Usage:
+    python benchmarks/bench_swipe_log.py --events 500000 --users 10000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.swipe_log import SwipeEventLog, fold_segment
+
+ACTIONS = ["pass"] * 6 + ["like"] * 3 + ["super_like"]
+
+async def run(args, root: Path):
+    rng = random.Random(7)
+    users = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(args.users)]
+    log = SwipeEventLog(root, flush_ms=args.flush_ms)
+    log.start()
+
+    started = time.perf_counter()
+    for i in range(args.events):
+        log.append(rng.choice(users), rng.choice(users), rng.choice(ACTIONS))
+        if i % 1000 == 999:
+            # Yield like a request handler would, so the flush loop can run
+            await asyncio.sleep(0)
+    appended = time.perf_counter() - started
+    await log.stop()
+    total = time.perf_counter() - started
+
+    segments = sorted(log.segments_dir.glob("*.jsonl"))
+    size = sum(path.stat().st_size for path in segments)
+    started = time.perf_counter()
+    rows = [row for path in segments for row in fold_segment(path)]
+    folded = time.perf_counter() - started
+
+    print(f"Events: {args.events:,} from {args.users:,} users, flush every {args.flush_ms} ms")
+    print(f"  append:            {args.events / appended:12,.0f} events/s")
+    print(f"  append + flushed:  {args.events / total:12,.0f} events/s "
+          f"({log.flushes} flushes, {size / 1024 / 1024:.1f} MB in {len(segments)} segment(s))")
+    print(f"  compaction fold:   {args.events / folded:12,.0f} events/s -> {len(rows):,} daily aggregate rows")
+
+def main(args):
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(run(args, Path(root)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--flush-ms", type=int, default=200)
+    main(parser.parse_args())
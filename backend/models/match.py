@@ -1,10 +1,22 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
+# Most queued swipes accepted in one batch request
+SWIPE_BATCH_MAX_SIZE = 100
+
 class SwipeAction(BaseModel):
     swiped_user_id: str
-    action: str  # 'like', 'pass', 'super_like'
+    action: Literal["like", "pass", "super_like"]
+    # Client-generated; a retried request with the same key is not recorded twice
+    idempotency_key: Optional[str] = Field(None, max_length=64)
+
+class QueuedSwipe(SwipeAction):
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+    client_swiped_at: Optional[datetime] = None
+
+class SwipeBatch(BaseModel):
+    swipes: List[QueuedSwipe] = Field(..., min_length=1, max_length=SWIPE_BATCH_MAX_SIZE)
 
 class Match(BaseModel):
     id: str
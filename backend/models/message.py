@@ -22,6 +22,7 @@ class Message(BaseModel):
     sent_at: datetime
 
 class MessageRead(BaseModel):
+    match_id: str
     message_ids: list[str]
 
 class TypingIndicator(BaseModel):
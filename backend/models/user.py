@@ -2,6 +2,7 @@ from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 class GenderEnum(str, Enum):
     male = "male"
@@ -100,6 +101,16 @@ class UserUpdate(BaseModel):
     instagram: Optional[str] = None
     spotify: Optional[str] = None
     facebook: Optional[str] = None
+    timezone: Optional[str] = None
+    
+    @validator('timezone')
+    def validate_timezone(cls, v):
+        if v is not None:
+            try:
+                ZoneInfo(v)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError('Unknown timezone')
+        return v
 
 class UserPreferences(BaseModel):
     show_gender: Optional[str] = None
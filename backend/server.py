@@ -1,8 +1,10 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
@@ -11,10 +13,21 @@ load_dotenv()
 
 # Import utilities and services
 from utils.auth import (
-    create_access_token, get_current_user, get_password_hash, verify_password
+    create_access_token, decode_token, get_current_user, get_password_hash, verify_password
 )
-from utils.supabase_client import supabase, supabase_admin
+from utils.db import db
+from utils.loaders import RequestLoaders
+from utils.pagination import encode_cursor, decode_cursor
 from services.ai_service import ai_service
+from services.candidate_index import candidate_index, parse_point
+from services.swipe_sets import swipe_sets
+from services.recent_swipes import recent_swipes, RECENT_SWIPES_DEPTH
+from services.swipe_log import swipe_log
+from services.icebreakers import icebreakers, ICEBREAKER_PROFILE_COLUMNS
+from services.message_moderation import message_moderation
+from services.realtime import realtime, Connection
+from services.read_receipts import read_receipts
+from services.quotas import quotas, QUOTA_SETTING_KEY
 from services.payment_service import payment_service
 
 # Import models
@@ -22,8 +35,8 @@ from models.user import (
     UserCreate, UserLogin, UserProfile, UserUpdate, 
     UserPreferences, LocationUpdate
 )
-from models.match import SwipeAction, DiscoveryCard, MatchWithProfile
-from models.message import MessageCreate, Message, MessageRead
+from models.match import SwipeAction, SwipeBatch, DiscoveryCard, MatchWithProfile
+from models.message import MessageCreate, Message, MessageRead, TypingIndicator
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,6 +55,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ============================================
+# LIFECYCLE
+# ============================================
+
+@app.on_event("startup")
+async def on_startup():
+    """Open the async database clients and start background jobs"""
+    await db.connect()
+    await realtime.start()
+    if db.is_connected:
+        app.state.candidate_index_task = asyncio.create_task(candidate_index.run_refresh_loop())
+        message_moderation.start()
+        await quotas.start()
+        swipe_log.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Stop background jobs and close pooled database connections"""
+    task = getattr(app.state, "candidate_index_task", None)
+    if task:
+        task.cancel()
+    await message_moderation.stop()
+    await read_receipts.flush_all()
+    await quotas.stop()
+    await swipe_log.stop()
+    await realtime.stop()
+    await db.close()
+
 # ============================================
 # HEALTH CHECK
 # ============================================
@@ -52,8 +93,8 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "supabase_connected": supabase is not None,
-        "ai_service_ready": ai_service.chat is not None
+        "supabase_connected": db.is_connected,
+        "ai_service_ready": ai_service.llm is not None
     }
 
 # ============================================
@@ -64,17 +105,17 @@ async def health_check():
 async def register(user: UserCreate):
     """Register a new user"""
     try:
-        if not supabase_admin:
+        if not db.is_connected:
             raise HTTPException(status_code=500, detail="Supabase not configured")
         
         # Check if username exists
-        existing_username = supabase_admin.table("users").select("id").eq("username", user.username).execute()
+        existing_username = await db.table("users").select("id").eq("username", user.username).execute()
         if existing_username.data:
             raise HTTPException(status_code=400, detail="Username already taken")
         
         # Create auth user in Supabase Auth (this will also check email uniqueness)
         try:
-            auth_response = supabase_admin.auth.admin.create_user({
+            auth_response = await db.auth.admin.create_user({
                 "email": user.email,
                 "password": user.password,
                 "email_confirm": True  # Auto-confirm email
@@ -114,20 +155,22 @@ async def register(user: UserCreate):
             "coins": 100  # Welcome bonus
         }
         
-        result = supabase_admin.table("users").insert(user_data).execute()
+        result = await db.table("users").insert(user_data).execute()
         
         if not result.data:
             # Rollback: delete auth user if profile creation failed
             try:
-                supabase_admin.auth.admin.delete_user(auth_user_id)
+                await db.auth.admin.delete_user(auth_user_id)
             except:
                 pass
             raise HTTPException(status_code=500, detail="Failed to create user profile")
         
+        candidate_index.upsert(result.data[0])
+        
         # Create access token using JWT from Supabase
         # Sign in the user to get session
         try:
-            sign_in_response = supabase.auth.sign_in_with_password({
+            sign_in_response = await db.anon.auth.sign_in_with_password({
                 "email": user.email,
                 "password": user.password
             })
@@ -155,11 +198,11 @@ async def register(user: UserCreate):
 async def login(credentials: UserLogin):
     """Login user"""
     try:
-        if not supabase_admin:
+        if not db.is_connected:
             raise HTTPException(status_code=500, detail="Supabase not configured")
         
         # Find user
-        result = supabase_admin.table("users").select("*").eq("email", credentials.email).execute()
+        result = await db.table("users").select("*").eq("email", credentials.email).execute()
         
         if not result.data:
             raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -171,7 +214,7 @@ async def login(credentials: UserLogin):
             raise HTTPException(status_code=403, detail="Account is banned")
         
         # Update last active
-        supabase_admin.table("users").update({"last_active": datetime.now().isoformat()}).eq("id", user["id"]).execute()
+        await db.table("users").update({"last_active": datetime.now().isoformat()}).eq("id", user["id"]).execute()
         
         # Create access token
         access_token = create_access_token(data={"sub": user["id"]})
@@ -196,7 +239,7 @@ async def login(credentials: UserLogin):
 async def get_my_profile(current_user_id: str = Depends(get_current_user)):
     """Get current user's profile"""
     try:
-        result = supabase_admin.table("users").select("*").eq("id", current_user_id).execute()
+        result = await db.table("users").select("*").eq("id", current_user_id).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -227,7 +270,11 @@ async def update_my_profile(
         
         update_data["updated_at"] = datetime.now().isoformat()
         
-        result = supabase_admin.table("users").update(update_data).eq("id", current_user_id).execute()
+        result = await db.table("users").update(update_data).eq("id", current_user_id).execute()
+        
+        if result.data:
+            candidate_index.upsert(result.data[0])
+            quotas.invalidate(current_user_id)
         
         return result.data[0] if result.data else {}
     except Exception as e:
@@ -247,7 +294,9 @@ async def update_location(
             "location_updated_at": datetime.now().isoformat()
         }
         
-        result = supabase_admin.table("users").update(location_data).eq("id", current_user_id).execute()
+        result = await db.table("users").update(location_data).eq("id", current_user_id).execute()
+        
+        candidate_index.update_location(current_user_id, location.latitude, location.longitude)
         
         return {"success": True, "message": "Location updated"}
     except Exception as e:
@@ -261,7 +310,7 @@ async def update_preferences(
     """Update user preferences"""
     try:
         prefs_data = preferences.dict()
-        result = supabase_admin.table("users").update(prefs_data).eq("id", current_user_id).execute()
+        result = await db.table("users").update(prefs_data).eq("id", current_user_id).execute()
         
         return {"success": True, "preferences": result.data[0] if result.data else {}}
     except Exception as e:
@@ -292,22 +341,21 @@ async def upload_photo(
         # Upload to Supabase Storage
         try:
             # Upload file
-            storage_response = supabase_admin.storage.from_('user-photos').upload(
+            storage_response = await db.storage.from_('user-photos').upload(
                 unique_filename,
                 contents,
                 {'content-type': file.content_type}
             )
             
             # Get public URL
-            public_url = supabase_admin.storage.from_('user-photos').get_public_url(unique_filename)
+            public_url = await db.storage.from_('user-photos').get_public_url(unique_filename)
             
             # Update user's photos array
-            user_result = supabase_admin.table("users").select("photos").eq("id", current_user_id).execute()
+            user_result = await db.table("users").select("photos, is_premium").eq("id", current_user_id).execute()
             current_photos = user_result.data[0].get("photos", []) if user_result.data else []
             
             # Check photo limit (6 for premium, 3 for regular)
-            user_data = supabase_admin.table("users").select("is_premium").eq("id", current_user_id).execute()
-            is_premium = user_data.data[0].get("is_premium", False) if user_data.data else False
+            is_premium = user_result.data[0].get("is_premium", False) if user_result.data else False
             max_photos = 6 if is_premium else 3
             
             if len(current_photos) >= max_photos:
@@ -318,7 +366,7 @@ async def upload_photo(
             
             # Add new photo
             updated_photos = current_photos + [public_url]
-            supabase_admin.table("users").update({"photos": updated_photos}).eq("id", current_user_id).execute()
+            await db.table("users").update({"photos": updated_photos}).eq("id", current_user_id).execute()
             
             return {
                 "success": True,
@@ -344,7 +392,7 @@ async def delete_photo(
     """Delete a user photo"""
     try:
         # Get current photos
-        user_result = supabase_admin.table("users").select("photos").eq("id", current_user_id).execute()
+        user_result = await db.table("users").select("photos").eq("id", current_user_id).execute()
         current_photos = user_result.data[0].get("photos", []) if user_result.data else []
         
         if photo_index < 0 or photo_index >= len(current_photos):
@@ -355,7 +403,7 @@ async def delete_photo(
         updated_photos = [p for i, p in enumerate(current_photos) if i != photo_index]
         
         # Update database
-        supabase_admin.table("users").update({"photos": updated_photos}).eq("id", current_user_id).execute()
+        await db.table("users").update({"photos": updated_photos}).eq("id", current_user_id).execute()
         
         # TODO: Delete from Supabase Storage (optional - keeps old photos in storage)
         
@@ -378,7 +426,7 @@ async def reorder_photos(
     """Reorder user photos"""
     try:
         # Get current photos
-        user_result = supabase_admin.table("users").select("photos").eq("id", current_user_id).execute()
+        user_result = await db.table("users").select("photos").eq("id", current_user_id).execute()
         current_photos = user_result.data[0].get("photos", []) if user_result.data else []
         
         # Validate photo_order
@@ -392,7 +440,7 @@ async def reorder_photos(
         reordered_photos = [current_photos[i] for i in photo_order]
         
         # Update database
-        supabase_admin.table("users").update({"photos": reordered_photos}).eq("id", current_user_id).execute()
+        await db.table("users").update({"photos": reordered_photos}).eq("id", current_user_id).execute()
         
         return {
             "success": True,
@@ -412,7 +460,7 @@ async def get_user_profile(
 ):
     """Get another user's profile"""
     try:
-        result = supabase_admin.table("users").select("*").eq("id", user_id).execute()
+        result = await db.table("users").select("*").eq("id", user_id).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -420,7 +468,7 @@ async def get_user_profile(
         user = result.data[0]
         
         # Increment profile views
-        supabase_admin.table("users").update({
+        await db.table("users").update({
             "profile_views": user.get("profile_views", 0) + 1
         }).eq("id", user_id).execute()
         
@@ -434,6 +482,9 @@ async def get_user_profile(
 # DISCOVERY & SWIPING ENDPOINTS
 # ============================================
 
+# Candidate ids requested from the index per card, to absorb blocked or stale entries
+CANDIDATE_OVERSAMPLE = 2
+
 @app.get("/api/discovery")
 async def get_discovery_cards(
     limit: int = Query(10, ge=1, le=50),
@@ -442,55 +493,53 @@ async def get_discovery_cards(
     """Get discovery cards for swiping"""
     try:
         # Get current user data
-        user_result = supabase_admin.table("users").select("*").eq("id", current_user_id).execute()
+        user_result = await db.table("users").select("*").eq("id", current_user_id).execute()
         if not user_result.data:
             raise HTTPException(status_code=404, detail="User not found")
         
         current_user = user_result.data[0]
         
-        # Get users already swiped
-        swiped_result = supabase_admin.table("swipe_history").select("swiped_user_id").eq("user_id", current_user_id).execute()
-        swiped_ids = [s["swiped_user_id"] for s in swiped_result.data] if swiped_result.data else []
-        
-        # Build query for potential matches
-        query = supabase_admin.table("users").select("*")
-        query = query.eq("is_approved", True)
-        query = query.eq("is_banned", False)
-        query = query.neq("id", current_user_id)
-        
-        # Apply age filter
-        min_age = current_user.get("min_age", 18)
-        max_age = current_user.get("max_age", 100)
-        query = query.gte("age", min_age).lte("age", max_age)
+        # Pre-select candidate ids from the in-memory index; the discovery
+        # function then applies exclusions and distance and returns full
+        # profiles for that short list only
+        params = {"p_user_id": current_user_id, "p_limit": limit}
+        distances = {}
+        if candidate_index.ready:
+            # Already-swiped users are excluded in memory
+            swiped = await swipe_sets.get(current_user_id)
+            origin = parse_point(current_user.get("location"))
+            if origin:
+                # Nearest candidates within max_distance from the geo grid
+                nearby = candidate_index.select_nearby(
+                    current_user, origin[0], origin[1],
+                    current_user.get("max_distance") or 100,
+                    limit * CANDIDATE_OVERSAMPLE,
+                    exclude=swiped
+                )
+                distances = dict(nearby)
+                params["p_candidate_ids"] = list(distances)
+            else:
+                params["p_candidate_ids"] = candidate_index.select(current_user, limit * CANDIDATE_OVERSAMPLE, exclude=swiped)
         
-        # Apply gender filter
-        if current_user.get("show_gender"):
-            query = query.eq("gender", current_user["show_gender"])
+        result = await db.rpc("get_discovery_candidates", params).execute()
         
-        # Exclude already swiped
-        if swiped_ids:
-            query = query.not_.in_("id", swiped_ids)
+        # Too many pre-selected candidates were rejected by the database: fall back to a full scan
+        if "p_candidate_ids" in params and len(result.data or []) < limit and len(params["p_candidate_ids"]) >= limit * CANDIDATE_OVERSAMPLE:
+            params.pop("p_candidate_ids")
+            result = await db.rpc("get_discovery_candidates", params).execute()
         
-        result = query.limit(limit).execute()
+        # Calculate compatibility for all cards in one batch
+        candidates = result.data or []
+        scores = await ai_service.calculate_compatibility_batch(current_user, candidates)
         
-        # Calculate compatibility and distance for each card
         cards = []
-        for user in result.data if result.data else []:
-            # Calculate compatibility
-            compatibility = await ai_service.calculate_compatibility(
-                current_user.get("interests", []),
-                user.get("interests", []),
-                current_user.get("bio", ""),
-                user.get("bio", "")
-            )
-            
-            # TODO: Calculate distance using PostGIS
-            distance = None
+        for user, compatibility in zip(candidates, scores):
+            distance = distances.get(user["id"])
             
             cards.append({
                 **user,
                 "compatibility_score": compatibility,
-                "distance": distance
+                "distance": round(distance, 1) if distance is not None else user.get("distance")
             })
         
         # Sort by compatibility and premium status
@@ -504,62 +553,71 @@ async def get_discovery_cards(
         print(f"Discovery error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Quota features consumed by each swipe action
+SWIPE_QUOTA_FEATURES = {
+    "like": ("likes",),
+    "super_like": ("super_likes", "likes"),
+    "pass": ()
+}
+QUOTA_LIMIT_MESSAGES = {
+    "super_likes": "Daily super like limit reached",
+    "likes": "Daily like limit reached",
+    "undos": "Daily undo limit reached",
+    "messages": "Sending messages too fast"
+}
+
 @app.post("/api/swipe")
 async def swipe_action(
     swipe: SwipeAction,
     current_user_id: str = Depends(get_current_user)
 ):
     """Perform a swipe action (like, pass, super_like)"""
+    if swipe.swiped_user_id == current_user_id:
+        raise HTTPException(status_code=400, detail="Cannot swipe on yourself")
+    
+    features = SWIPE_QUOTA_FEATURES.get(swipe.action, ())
+    exhausted = await quotas.consume_all(current_user_id, features)
+    if exhausted:
+        raise HTTPException(status_code=429, detail=QUOTA_LIMIT_MESSAGES[exhausted])
+    
     try:
-        # Check daily limits for free users
-        user_result = supabase_admin.table("users").select("is_premium, total_super_likes_given").eq("id", current_user_id).execute()
-        user = user_result.data[0] if user_result.data else {}
+        # History, like and counters in one transaction;
+        # the match itself is created by the likes trigger.
+        # The paid super like limit is re-checked there across all workers,
+        # counted from midnight of the user's local day
+        result = await db.rpc("record_swipe", {
+            "p_user_id": current_user_id,
+            "p_swiped_user_id": swipe.swiped_user_id,
+            "p_action": swipe.action,
+            "p_super_like_limit": quotas.limit("free", "super_likes"),
+            "p_day_start": await quotas.day_start(current_user_id) if swipe.action == "super_like" else None,
+            "p_idempotency_key": swipe.idempotency_key
+        }).execute()
+        outcome = result.data or {}
         
-        if swipe.action == "super_like" and not user.get("is_premium"):
-            # Check daily super like limit
-            today = datetime.now().date()
-            super_likes_today = supabase_admin.table("likes").select("id").eq("liker_id", current_user_id).eq("is_super", True).gte("created_at", today.isoformat()).execute()
-            
-            if super_likes_today.data and len(super_likes_today.data) >= 1:
-                raise HTTPException(status_code=429, detail="Daily super like limit reached")
-        
-        # Record swipe in history
-        history_data = {
-            "user_id": current_user_id,
-            "swiped_user_id": swipe.swiped_user_id,
-            "action": swipe.action
-        }
-        supabase_admin.table("swipe_history").insert(history_data).execute()
-        
-        # If like or super_like, create like record
-        if swipe.action in ["like", "super_like"]:
-            like_data = {
-                "liker_id": current_user_id,
-                "liked_id": swipe.swiped_user_id,
-                "is_super": swipe.action == "super_like"
+        if outcome.get("limit_reached"):
+            for feature in features:
+                quotas.refund(current_user_id, feature)
+            raise HTTPException(status_code=429, detail=QUOTA_LIMIT_MESSAGES["super_likes"])
+        
+        if outcome.get("duplicate"):
+            for feature in features:
+                quotas.refund(current_user_id, feature)
+        else:
+            recent_swipes.push(current_user_id, outcome.get("history_id"), swipe.swiped_user_id, swipe.action, outcome.get("created_at"))
+            swipe_log.append(current_user_id, swipe.swiped_user_id, swipe.action, outcome.get("created_at"))
+        
+        swipe_sets.add(current_user_id, swipe.swiped_user_id)
+        
+        if outcome.get("match"):
+            if not outcome.get("duplicate"):
+                icebreakers.warm_match(current_user_id, swipe.swiped_user_id, match_id=outcome["match_id"])
+            return {
+                "action": swipe.action,
+                "match": True,
+                "match_id": outcome["match_id"],
+                "message": "It's a match! 🎉"
             }
-            
-            like_result = supabase_admin.table("likes").insert(like_data).execute()
-            
-            # Update stats
-            supabase_admin.table("users").update({
-                "total_likes_given": user.get("total_likes_given", 0) + 1
-            }).eq("id", current_user_id).execute()
-            
-            if swipe.action == "super_like":
-                supabase_admin.table("users").update({
-                    "total_super_likes_given": user.get("total_super_likes_given", 0) + 1
-                }).eq("id", current_user_id).execute()
-            
-            # Check for mutual match (trigger will create match automatically)
-            mutual_like = supabase_admin.table("likes").select("id").eq("liker_id", swipe.swiped_user_id).eq("liked_id", current_user_id).execute()
-            
-            if mutual_like.data:
-                return {
-                    "action": swipe.action,
-                    "match": True,
-                    "message": "It's a match! 🎉"
-                }
         
         return {
             "action": swipe.action,
@@ -569,43 +627,139 @@ async def swipe_action(
     except HTTPException:
         raise
     except Exception as e:
+        for feature in features:
+            quotas.refund(current_user_id, feature)
         print(f"Swipe error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/swipe/batch")
+async def swipe_batch(
+    batch: SwipeBatch,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Apply queued swipes (offline or fast swiping) in order with one call.
+    
+    Returns one result per swipe with its status ('recorded', 'duplicate',
+    'limit_reached' or 'invalid' for a swipe on oneself) and match outcome,
+    so a client can safely resend its whole queue after a failed flush.
+    """
+    # Quotas are taken in queue order; self-swipes and swipes past a limit are not sent
+    accepted = []
+    statuses = []
+    for item in batch.swipes:
+        if item.swiped_user_id == current_user_id:
+            accepted.append(None)
+            statuses.append("invalid")
+            continue
+        features = SWIPE_QUOTA_FEATURES.get(item.action, ())
+        exhausted = await quotas.consume_all(current_user_id, features)
+        accepted.append(None if exhausted else features)
+        statuses.append("limit_reached" if exhausted else None)
+    
+    sent = [item for item, features in zip(batch.swipes, accepted) if features is not None]
+    try:
+        recorded = []
+        if sent:
+            result = await db.rpc("record_swipes", {
+                "p_user_id": current_user_id,
+                "p_super_like_limit": quotas.limit("free", "super_likes"),
+                "p_day_start": await quotas.day_start(current_user_id)
+                if any(item.action == "super_like" for item in sent) else None,
+                "p_swipes": [
+                    {
+                        "swiped_user_id": item.swiped_user_id,
+                        "action": item.action,
+                        "idempotency_key": item.idempotency_key,
+                        "client_swiped_at": item.client_swiped_at.isoformat() if item.client_swiped_at else None
+                    }
+                    for item in sent
+                ]
+            }).execute()
+            recorded = result.data or []
+    except Exception as e:
+        for features in accepted:
+            for feature in features or ():
+                quotas.refund(current_user_id, feature)
+        print(f"Swipe batch error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    results = []
+    recorded_iter = iter(recorded)
+    for item, features, status in zip(batch.swipes, accepted, statuses):
+        if features is None:
+            results.append({
+                "idempotency_key": item.idempotency_key,
+                "swiped_user_id": item.swiped_user_id,
+                "action": item.action,
+                "status": status,
+                "match": False,
+                "match_id": None
+            })
+            continue
+        outcome = next(recorded_iter)
+        results.append(outcome)
+        if outcome["status"] != "recorded":
+            for feature in features:
+                quotas.refund(current_user_id, feature)
+            continue
+        swipe_sets.add(current_user_id, outcome["swiped_user_id"])
+        recent_swipes.push(current_user_id, outcome.get("history_id"), outcome["swiped_user_id"], outcome["action"], outcome.get("created_at"))
+        swipe_log.append(current_user_id, outcome["swiped_user_id"], outcome["action"], outcome.get("created_at"))
+        if outcome["match"]:
+            icebreakers.warm_match(current_user_id, outcome["swiped_user_id"], match_id=outcome["match_id"])
+    
+    return {
+        "results": results,
+        "matches": sum(1 for item in results if item["match"] and item["status"] == "recorded")
+    }
+
+# Coins charged per undone swipe for free-tier users
+UNDO_COIN_COST = 50
+
 @app.post("/api/swipe/undo")
-async def undo_last_swipe(current_user_id: str = Depends(get_current_user)):
-    """Undo last swipe (Premium feature)"""
+async def undo_last_swipe(
+    steps: int = Query(1, ge=1, le=RECENT_SWIPES_DEPTH),
+    current_user_id: str = Depends(get_current_user)
+):
+    """Undo the last `steps` swipes (free for Premium, coins per swipe otherwise)"""
+    if not await quotas.consume(current_user_id, "undos", steps):
+        raise HTTPException(status_code=429, detail=QUOTA_LIMIT_MESSAGES["undos"])
+    
     try:
-        # Check if user is premium
-        user_result = supabase_admin.table("users").select("is_premium, coins").eq("id", current_user_id).execute()
-        user = user_result.data[0] if user_result.data else {}
-        
-        if not user.get("is_premium"):
-            # Charge coins
-            if user.get("coins", 0) < 50:
-                raise HTTPException(status_code=402, detail="Insufficient coins")
-            
-            supabase_admin.table("users").update({"coins": user["coins"] - 50}).eq("id", current_user_id).execute()
-        
-        # Get last swipe
-        last_swipe = supabase_admin.table("swipe_history").select("*").eq("user_id", current_user_id).order("created_at", desc=True).limit(1).execute()
-        
-        if not last_swipe.data:
-            raise HTTPException(status_code=404, detail="No recent swipe to undo")
-        
-        swipe = last_swipe.data[0]
-        
-        # Delete swipe from history
-        supabase_admin.table("swipe_history").delete().eq("id", swipe["id"]).execute()
-        
-        # If it was a like, delete the like
-        if swipe["action"] in ["like", "super_like"]:
-            supabase_admin.table("likes").delete().eq("liker_id", current_user_id).eq("liked_id", swipe["swiped_user_id"]).execute()
-        
-        return {"success": True, "message": "Swipe undone"}
+        # Coin charge and rollback happen in one transaction
+        outcome = await recent_swipes.undo(current_user_id, steps, UNDO_COIN_COST)
+    except Exception as e:
+        quotas.refund(current_user_id, "undos", steps)
+        print(f"Undo error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
     
-    except HTTPException:
-        raise
+    undone = outcome.get("undone") or []
+    quotas.refund(current_user_id, "undos", steps - len(undone))
+    
+    if outcome.get("status") == "insufficient_coins":
+        raise HTTPException(status_code=402, detail="Insufficient coins")
+    if not undone:
+        raise HTTPException(status_code=404, detail="No recent swipe to undo")
+    
+    for swipe in undone:
+        swipe_sets.discard(current_user_id, swipe["swiped_user_id"])
+        swipe_log.append(current_user_id, swipe["swiped_user_id"], "undo")
+        # The undone like no longer counts against today's limits
+        for feature in SWIPE_QUOTA_FEATURES.get(swipe["action"], ()):
+            quotas.refund(current_user_id, feature)
+    
+    return {
+        "success": True,
+        "message": "Swipe undone",
+        "undone": undone,
+        "coins": outcome.get("coins")
+    }
+
+@app.get("/api/quotas")
+async def get_my_quotas(current_user_id: str = Depends(get_current_user)):
+    """Remaining daily likes, super likes and undos, and messages per minute (null = unlimited)"""
+    try:
+        return await quotas.remaining(current_user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -617,40 +771,36 @@ async def undo_last_swipe(current_user_id: str = Depends(get_current_user)):
 async def get_matches(current_user_id: str = Depends(get_current_user)):
     """Get all matches for current user"""
     try:
-        # Get matches where user is either user_id_1 or user_id_2
-        matches_result = supabase_admin.table("matches").select("*").or_(
-            f"user_id_1.eq.{current_user_id},user_id_2.eq.{current_user_id}"
-        ).eq("is_blocked", False).execute()
+        # One indexed read of the denormalized inbox, sorted by the database
+        inbox_result = await db.table("match_inbox").select(
+            "match_id, match_created_at, unread_count, last_message_id, last_message_preview, "
+            "last_message_type, last_sender_id, last_message_at, matched_user:users!other_user_id(*)"
+        ).eq("user_id", current_user_id).eq("is_blocked", False).order("last_activity_at", desc=True).execute()
         
         matches = []
-        for match in matches_result.data if matches_result.data else []:
-            # Get the other user's ID
-            other_user_id = match["user_id_2"] if match["user_id_1"] == current_user_id else match["user_id_1"]
-            
-            # Get other user's profile
-            user_result = supabase_admin.table("users").select("*").eq("id", other_user_id).execute()
-            if not user_result.data:
+        for row in inbox_result.data or []:
+            if not row.get("matched_user"):
                 continue
             
-            other_user = user_result.data[0]
-            
-            # Get last message
-            last_msg = supabase_admin.table("messages").select("*").eq("match_id", match["id"]).order("sent_at", desc=True).limit(1).execute()
-            
-            # Get unread count
-            unread_count = supabase_admin.table("messages").select("id").eq("match_id", match["id"]).eq("is_read", False).neq("sender_id", current_user_id).execute()
+            last_message = None
+            if row.get("last_message_id"):
+                last_message = {
+                    "id": row["last_message_id"],
+                    "match_id": row["match_id"],
+                    "sender_id": row["last_sender_id"],
+                    "content": row["last_message_preview"],
+                    "message_type": row["last_message_type"],
+                    "sent_at": row["last_message_at"]
+                }
             
             matches.append({
-                "match_id": match["id"],
-                "matched_user": other_user,
-                "created_at": match["created_at"],
-                "last_message": last_msg.data[0] if last_msg.data else None,
-                "unread_count": len(unread_count.data) if unread_count.data else 0
+                "match_id": row["match_id"],
+                "matched_user": row["matched_user"],
+                "created_at": row["match_created_at"],
+                "last_message": last_message,
+                "unread_count": row.get("unread_count", 0)
             })
         
-        # Sort by last message time
-        matches.sort(key=lambda x: x.get("last_message", {}).get("sent_at", x["created_at"]), reverse=True)
-        
         return matches
     
     except Exception as e:
@@ -662,12 +812,12 @@ async def get_received_likes(current_user_id: str = Depends(get_current_user)):
     """Get list of users who liked you (Premium feature)"""
     try:
         # Check if user is premium
-        user_result = supabase_admin.table("users").select("is_premium").eq("id", current_user_id).execute()
+        user_result = await db.table("users").select("is_premium").eq("id", current_user_id).execute()
         user = user_result.data[0] if user_result.data else {}
         
         if not user.get("is_premium"):
             # Return blurred count only
-            likes = supabase_admin.table("likes").select("id").eq("liked_id", current_user_id).execute()
+            likes = await db.table("likes").select("id").eq("liked_id", current_user_id).execute()
             return {
                 "count": len(likes.data) if likes.data else 0,
                 "premium_required": True,
@@ -675,14 +825,19 @@ async def get_received_likes(current_user_id: str = Depends(get_current_user)):
             }
         
         # Get all likes
-        likes_result = supabase_admin.table("likes").select("*").eq("liked_id", current_user_id).execute()
+        likes_result = await db.table("likes").select("*").eq("liked_id", current_user_id).execute()
+        
+        likes = likes_result.data or []
+        
+        # Fetch all liker profiles in one batched query
+        loaders = RequestLoaders(current_user_id)
+        profiles = await loaders.profiles.load_many([like["liker_id"] for like in likes])
         
         users = []
-        for like in likes_result.data if likes_result.data else []:
-            user_result = supabase_admin.table("users").select("*").eq("id", like["liker_id"]).execute()
-            if user_result.data:
+        for like, profile in zip(likes, profiles):
+            if profile:
                 users.append({
-                    **user_result.data[0],
+                    **profile,
                     "is_super_like": like.get("is_super", False),
                     "liked_at": like["created_at"]
                 })
@@ -704,12 +859,26 @@ async def get_received_likes(current_user_id: str = Depends(get_current_user)):
 async def get_messages(
     match_id: str,
     limit: int = Query(50, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
     current_user_id: str = Depends(get_current_user)
 ):
-    """Get messages for a match"""
+    """Get a page of messages for a match, newest first.
+    
+    Without a cursor returns the latest messages. `before` pages back in
+    history from a page's `older_cursor`; `after` fetches messages newer
+    than a page's `newer_cursor`.
+    """
     try:
+        if before and after:
+            raise HTTPException(status_code=400, detail="Use either before or after, not both")
+        try:
+            cursor = decode_cursor(before or after) if (before or after) else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Verify user is part of this match
-        match_result = supabase_admin.table("matches").select("*").eq("id", match_id).execute()
+        match_result = await db.table("matches").select("*").eq("id", match_id).execute()
         if not match_result.data:
             raise HTTPException(status_code=404, detail="Match not found")
         
@@ -717,31 +886,55 @@ async def get_messages(
         if current_user_id not in [match["user_id_1"], match["user_id_2"]]:
             raise HTTPException(status_code=403, detail="Not authorized")
         
-        # Get messages
-        messages_result = supabase_admin.table("messages").select("*").eq("match_id", match_id).order("sent_at", desc=False).limit(limit).execute()
-        
-        # Mark messages as read
-        supabase_admin.table("messages").update({
-            "is_read": True,
-            "read_at": datetime.now().isoformat()
-        }).eq("match_id", match_id).eq("is_read", False).neq("sender_id", current_user_id).execute()
+        # Keyset page over idx_messages_match_sent: (sent_at, id) strictly before/after the cursor.
+        # Messages hidden by moderation stay visible only to their sender
+        query = db.table("messages").select("*").eq("match_id", match_id).or_(f"is_hidden.eq.false,sender_id.eq.{current_user_id}")
+        if cursor:
+            sent_at, message_id = cursor
+            if before:
+                query = query.lte("sent_at", sent_at).or_(f"sent_at.lt.{sent_at},id.lt.{message_id}")
+            else:
+                query = query.gte("sent_at", sent_at).or_(f"sent_at.gt.{sent_at},id.gt.{message_id}")
+        descending = not after
+        messages_result = await query.order("sent_at", desc=descending).order("id", desc=descending).limit(limit + 1).execute()
+        
+        messages = messages_result.data or []
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after:
+            messages.reverse()
         
-        return messages_result.data if messages_result.data else []
+        return {
+            "messages": messages,
+            "has_more": has_more,
+            "older_cursor": encode_cursor(messages[-1]) if messages else before,
+            "newer_cursor": encode_cursor(messages[0]) if messages else after
+        }
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/messages/read")
+async def mark_messages_read(
+    receipt: MessageRead,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Queue read receipts; they are coalesced per match and written in one bulk update"""
+    read_receipts.add(current_user_id, receipt.match_id, receipt.message_ids)
+    return {"queued": len(receipt.message_ids)}
+
 @app.post("/api/messages")
 async def send_message(
     message: MessageCreate,
     current_user_id: str = Depends(get_current_user)
 ):
     """Send a message"""
+    result = None
     try:
         # Verify match
-        match_result = supabase_admin.table("matches").select("*").eq("id", message.match_id).execute()
+        match_result = await db.table("matches").select("*").eq("id", message.match_id).execute()
         if not match_result.data:
             raise HTTPException(status_code=404, detail="Match not found")
         
@@ -749,19 +942,24 @@ async def send_message(
         if current_user_id not in [match["user_id_1"], match["user_id_2"]]:
             raise HTTPException(status_code=403, detail="Not authorized")
         
-        # If sending a gift, deduct coins
+        # If sending a gift, check the balance
         if message.message_type == "gift" and message.gift_cost:
-            user_result = supabase_admin.table("users").select("coins").eq("id", current_user_id).execute()
+            user_result = await db.table("users").select("coins").eq("id", current_user_id).execute()
             user = user_result.data[0] if user_result.data else {}
             
             if user.get("coins", 0) < message.gift_cost:
                 raise HTTPException(status_code=402, detail="Insufficient coins")
-            
+        
+        # Rate limited only once the request is valid; refunded below if nothing is sent
+        if not await quotas.consume(current_user_id, "messages"):
+            raise HTTPException(status_code=429, detail=QUOTA_LIMIT_MESSAGES["messages"])
+        
+        if message.message_type == "gift" and message.gift_cost:
             # Deduct coins
-            supabase_admin.table("users").update({"coins": user["coins"] - message.gift_cost}).eq("id", current_user_id).execute()
+            await db.table("users").update({"coins": user["coins"] - message.gift_cost}).eq("id", current_user_id).execute()
             
             # Record transaction
-            supabase_admin.table("coin_transactions").insert({
+            await db.table("coin_transactions").insert({
                 "user_id": current_user_id,
                 "amount": -message.gift_cost,
                 "transaction_type": "gift_sent",
@@ -776,18 +974,24 @@ async def send_message(
             "message_type": message.message_type,
             "media_url": message.media_url,
             "gift_id": message.gift_id,
-            "gift_cost": message.gift_cost
+            "gift_cost": message.gift_cost,
+            # Only text is moderated; media and gifts without text need no review
+            "moderation_status": "pending" if message.content else "approved"
         }
         
         if message.message_type in ["image", "voice", "video"]:
             # Set expiration for media (7 days)
             msg_data["expires_at"] = (datetime.now() + timedelta(days=7)).isoformat()
         
-        result = supabase_admin.table("messages").insert(msg_data).execute()
+        result = await db.table("messages").insert(msg_data).execute()
+        
+        # Moderated in the background; flagged messages are hidden afterwards
+        if result.data:
+            message_moderation.submit(result.data[0])
         
         # Create notification for recipient
         recipient_id = match["user_id_2"] if match["user_id_1"] == current_user_id else match["user_id_1"]
-        supabase_admin.table("notifications").insert({
+        await db.table("notifications").insert({
             "user_id": recipient_id,
             "notification_type": "message",
             "title": "New Message",
@@ -795,46 +999,138 @@ async def send_message(
             "data": {"match_id": message.match_id}
         }).execute()
         
+        if result.data:
+            await realtime.publish([current_user_id, recipient_id], {
+                "type": "message",
+                "match_id": message.match_id,
+                "message": result.data[0]
+            })
+        
         return result.data[0] if result.data else {}
     
     except HTTPException:
         raise
     except Exception as e:
+        if result is None:
+            quotas.refund(current_user_id, "messages")
         print(f"Send message error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/messages/icebreaker/{match_id}")
 async def get_icebreaker(
     match_id: str,
+    regenerate: bool = False,
     current_user_id: str = Depends(get_current_user)
 ):
-    """Get AI-generated icebreaker suggestion"""
+    """Get AI-generated icebreaker suggestion (cached per match; regenerate=true bypasses the cache)"""
     try:
-        # Get match
-        match_result = supabase_admin.table("matches").select("*").eq("id", match_id).execute()
+        # Match with both participants' icebreaker profile columns in one query
+        match_result = await db.table("matches").select(
+            f"user_id_1, user_id_2, "
+            f"user_1:users!user_id_1({ICEBREAKER_PROFILE_COLUMNS}), "
+            f"user_2:users!user_id_2({ICEBREAKER_PROFILE_COLUMNS})"
+        ).eq("id", match_id).execute()
         if not match_result.data:
             raise HTTPException(status_code=404, detail="Match not found")
         
         match = match_result.data[0]
-        other_user_id = match["user_id_2"] if match["user_id_1"] == current_user_id else match["user_id_1"]
+        if current_user_id not in (match["user_id_1"], match["user_id_2"]):
+            raise HTTPException(status_code=404, detail="Match not found")
         
-        # Get other user's profile
-        user_result = supabase_admin.table("users").select("*").eq("id", other_user_id).execute()
-        if not user_result.data:
+        other_user = match["user_2"] if match["user_id_1"] == current_user_id else match["user_1"]
+        if not other_user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        other_user = user_result.data[0]
+        # The cached icebreaker is only served if it was written for this version of the profile
+        if not regenerate:
+            cached = icebreakers.get(match_id, current_user_id, other_user)
+            if cached is not None:
+                return {"icebreaker": cached, "cached": True}
         
-        # Generate icebreaker
-        icebreaker = await ai_service.generate_icebreaker(other_user)
+        # Generate icebreaker and cache it for this match
+        icebreaker = await icebreakers.generate(match_id, current_user_id, other_user)
         
-        return {"icebreaker": icebreaker}
+        return {"icebreaker": icebreaker, "cached": False}
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ============================================
+# REAL-TIME GATEWAY (WebSocket)
+# ============================================
+
+async def resolve_match_peer(connection: Connection, match_id: str) -> Optional[str]:
+    """Other participant of a match the connected user belongs to (None if not theirs)"""
+    other_user_id = connection.matches.get(match_id)
+    if other_user_id is None:
+        # Matches created after the connection opened
+        match_result = await db.table("matches").select("user_id_1, user_id_2, is_blocked").eq("id", match_id).execute()
+        match = match_result.data[0] if match_result.data else None
+        if not match or match.get("is_blocked") or connection.user_id not in (match["user_id_1"], match["user_id_2"]):
+            return None
+        other_user_id = match["user_id_2"] if match["user_id_1"] == connection.user_id else match["user_id_1"]
+        connection.matches[match_id] = other_user_id
+    return other_user_id
+
+async def handle_client_event(connection: Connection, event: dict):
+    event_type = event.get("type")
+    if event_type == "ping":
+        connection.push({"type": "pong"})
+    elif event_type == "typing":
+        typing = TypingIndicator(**event)
+        other_user_id = await resolve_match_peer(connection, typing.match_id)
+        if other_user_id:
+            await realtime.publish([other_user_id], {
+                "type": "typing",
+                "match_id": typing.match_id,
+                "user_id": connection.user_id,
+                "is_typing": typing.is_typing
+            })
+    elif event_type == "read":
+        receipt = MessageRead(**event)
+        other_user_id = await resolve_match_peer(connection, receipt.match_id)
+        if other_user_id:
+            read_receipts.add(connection.user_id, receipt.match_id, receipt.message_ids, other_user_id)
+    else:
+        connection.push({"type": "error", "detail": f"Unknown event type: {event_type}"})
+
+@app.websocket("/api/ws")
+async def realtime_gateway(websocket: WebSocket, token: str = Query(...)):
+    """Push new messages, read receipts and typing indicators for all of the user's matches.
+    
+    Browsers cannot set headers on WebSocket requests, so the JWT is passed as ?token=.
+    """
+    payload = decode_token(token)
+    user_id = payload.get("sub") if payload else None
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    connection = Connection(websocket, user_id)
+    writer = asyncio.create_task(connection.writer())
+    try:
+        inbox_result = await db.table("match_inbox").select("match_id, other_user_id").eq("user_id", user_id).eq("is_blocked", False).execute()
+        connection.matches = {row["match_id"]: row["other_user_id"] for row in inbox_result.data or []}
+        realtime.register(connection)
+        connection.push({"type": "ready", "matches": list(connection.matches)})
+        
+        while True:
+            text = await websocket.receive_text()
+            try:
+                await handle_client_event(connection, json.loads(text))
+            except (ValueError, TypeError) as e:
+                connection.push({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Realtime gateway error: {e}")
+    finally:
+        realtime.unregister(connection)
+        writer.cancel()
+
 # ============================================
 # PREMIUM & COINS ENDPOINTS
 # ============================================
@@ -888,7 +1184,7 @@ async def purchase_coins(
 async def get_coin_balance(current_user_id: str = Depends(get_current_user)):
     """Get user's coin balance"""
     try:
-        result = supabase_admin.table("users").select("coins").eq("id", current_user_id).execute()
+        result = await db.table("users").select("coins").eq("id", current_user_id).execute()
         if not result.data:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -906,21 +1202,21 @@ async def get_admin_stats(current_user_id: str = Depends(get_current_user)):
     try:
         # TODO: Add admin role check
         
-        # Total users
-        total_users = supabase_admin.table("users").select("id", count="exact").execute()
-        
-        # Active users (last 7 days)
         seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
-        active_users = supabase_admin.table("users").select("id", count="exact").gte("last_active", seven_days_ago).execute()
-        
-        # Total matches
-        total_matches = supabase_admin.table("matches").select("id", count="exact").execute()
         
-        # Premium users
-        premium_users = supabase_admin.table("users").select("id", count="exact").eq("is_premium", True).execute()
-        
-        # Pending approvals
-        pending_approvals = supabase_admin.table("users").select("id", count="exact").eq("is_approved", False).execute()
+        # Independent count queries run concurrently
+        total_users, active_users, total_matches, premium_users, pending_approvals = await asyncio.gather(
+            # Total users
+            db.table("users").select("id", count="exact").execute(),
+            # Active users (last 7 days)
+            db.table("users").select("id", count="exact").gte("last_active", seven_days_ago).execute(),
+            # Total matches
+            db.table("matches").select("id", count="exact").execute(),
+            # Premium users
+            db.table("users").select("id", count="exact").eq("is_premium", True).execute(),
+            # Pending approvals
+            db.table("users").select("id", count="exact").eq("is_approved", False).execute()
+        )
         
         return {
             "total_users": total_users.count if hasattr(total_users, 'count') else 0,
@@ -933,11 +1229,40 @@ async def get_admin_stats(current_user_id: str = Depends(get_current_user)):
         print(f"Admin stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/discovery/index")
+async def get_discovery_index_stats(current_user_id: str = Depends(get_current_user)):
+    """Get in-memory candidate index size, memory footprint and refresh lag"""
+    return {
+        **candidate_index.stats(),
+        "swipe_sets": swipe_sets.stats(),
+        "recent_swipes": recent_swipes.stats(),
+        "swipe_log": swipe_log.stats()
+    }
+
+@app.get("/api/admin/realtime/stats")
+async def get_realtime_stats(current_user_id: str = Depends(get_current_user)):
+    """Get WebSocket connection, delivery and read receipt counters for this worker"""
+    return {**realtime.stats(), "read_receipts": read_receipts.stats()}
+
+@app.get("/api/admin/quotas/stats")
+async def get_quota_stats(current_user_id: str = Depends(get_current_user)):
+    """Get quota limits and counters for this worker"""
+    return quotas.stats()
+
+@app.get("/api/admin/ai/stats")
+async def get_ai_stats(current_user_id: str = Depends(get_current_user)):
+    """Get AI service cache counters"""
+    return {
+        **ai_service.stats(),
+        "icebreakers": icebreakers.stats(),
+        "message_moderation": message_moderation.stats()
+    }
+
 @app.get("/api/admin/users/pending")
 async def get_pending_users(current_user_id: str = Depends(get_current_user)):
     """Get users pending approval"""
     try:
-        result = supabase_admin.table("users").select("*").eq("is_approved", False).execute()
+        result = await db.table("users").select("*").eq("is_approved", False).execute()
         return result.data if result.data else []
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -946,7 +1271,9 @@ async def get_pending_users(current_user_id: str = Depends(get_current_user)):
 async def approve_user(user_id: str, current_user_id: str = Depends(get_current_user)):
     """Approve a user"""
     try:
-        result = supabase_admin.table("users").update({"is_approved": True}).eq("id", user_id).execute()
+        result = await db.table("users").update({"is_approved": True}).eq("id", user_id).execute()
+        if result.data:
+            candidate_index.upsert(result.data[0])
         return {"success": True, "user": result.data[0] if result.data else {}}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -955,10 +1282,11 @@ async def approve_user(user_id: str, current_user_id: str = Depends(get_current_
 async def reject_user(user_id: str, reason: str, current_user_id: str = Depends(get_current_user)):
     """Reject a user"""
     try:
-        result = supabase_admin.table("users").update({
+        result = await db.table("users").update({
             "is_banned": True,
             "ban_reason": reason
         }).eq("id", user_id).execute()
+        candidate_index.remove(user_id)
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -972,12 +1300,15 @@ async def update_admin_settings(
     """Update admin settings (OAuth keys, etc.)"""
     try:
         # Upsert setting
-        result = supabase_admin.table("admin_settings").upsert({
+        result = await db.table("admin_settings").upsert({
             "setting_key": setting_key,
             "setting_value": setting_value,
             "updated_at": datetime.now().isoformat()
         }).execute()
         
+        if setting_key == QUOTA_SETTING_KEY:
+            await quotas.refresh_limits()
+        
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -986,7 +1317,7 @@ async def update_admin_settings(
 async def get_admin_settings(current_user_id: str = Depends(get_current_user)):
     """Get admin settings"""
     try:
-        result = supabase_admin.table("admin_settings").select("*").execute()
+        result = await db.table("admin_settings").select("*").execute()
         
         # Convert to dict
         settings = {}
@@ -1,105 +1,296 @@
 import os
+import re
 import json
-from typing import List, Dict, Optional
+import asyncio
+import numpy as np
+from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+from services.compatibility_cache import CompatibilityCache
+from services.llm_clients import LlmClientPool
+from services.llm_guard import LlmUnavailable
+from services.moderation import moderation_engine, verdict_cache_key
+from utils.cache import LRUCache
+
 load_dotenv()
 
+# Two-stage ranking: only the top K local scores are re-scored by the LLM
+AI_RESCORE_TOP_K = int(os.getenv("AI_RESCORE_TOP_K", "5"))
+AI_RESCORE_CONCURRENCY = int(os.getenv("AI_RESCORE_CONCURRENCY", "4"))
+AI_RESCORE_BUDGET_MS = int(os.getenv("AI_RESCORE_BUDGET_MS", "800"))
+# Candidates scored per LLM request in batch mode
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "10"))
+# Offline stub LLM for local development (no API key needed)
+AI_LLM_STUB = os.getenv("AI_LLM_STUB") == "1"
+AI_LLM_STUB_LATENCY_MS = int(os.getenv("AI_LLM_STUB_LATENCY_MS", "0"))
+# Moderation verdicts cached by normalized content hash
+MODERATION_CACHE_MAX_BYTES = int(os.getenv("MODERATION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+MODERATION_CACHE_TTL_SECONDS = float(os.getenv("MODERATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+
 class AIService:
     def __init__(self):
         self.llm_key = os.getenv("EMERGENT_LLM_KEY")
-        self.chat = None
+        # Stateless per-task LLM clients (None when no key and no stub)
+        self.llm: Optional[LlmClientPool] = None
+        # Interest string -> bit position for packed interest vectors
+        self._interest_vocab: Dict[str, int] = {}
+        self._rescore_semaphore = asyncio.Semaphore(AI_RESCORE_CONCURRENCY)
+        self.compatibility_cache = CompatibilityCache()
+        # Moderation verdicts by source: local engine, LLM escalation, local fallback after LLM error
+        self.moderation_counts = {"local": 0, "escalated": 0, "deferred": 0}
+        self.moderation_cache = LRUCache(MODERATION_CACHE_MAX_BYTES, ttl_seconds=MODERATION_CACHE_TTL_SECONDS)
         
         # Initialize LLM client if key is available
-        if self.llm_key:
+        if AI_LLM_STUB:
+            from services.llm_stub import StubLlmChat, UserMessage
+            stub = StubLlmChat(latency_ms=AI_LLM_STUB_LATENCY_MS)
+            self.llm = LlmClientPool(lambda session_id, system_message: stub, UserMessage)
+            print("✅ AI Service initialized with stub LLM")
+        elif self.llm_key:
             try:
-                from emergentintegrations.llm.chat import LlmChat
-                # Initialize with default system message
-                self.chat = LlmChat(
-                    api_key=self.llm_key,
-                    session_id="dating-app-ai",
-                    system_message="You are a helpful AI assistant for a dating app. Provide friendly, engaging, and appropriate responses."
-                ).with_model("openai", "gpt-4o-mini")
+                from emergentintegrations.llm.chat import LlmChat, UserMessage
+                
+                def make_chat(session_id: str, system_message: str):
+                    return LlmChat(
+                        api_key=self.llm_key,
+                        session_id=session_id,
+                        system_message=system_message
+                    ).with_model("openai", "gpt-4o-mini")
+                
+                self.llm = LlmClientPool(make_chat, UserMessage)
                 print("✅ AI Service initialized with Emergent LLM (gpt-4o-mini)")
             except Exception as e:
                 print(f"⚠️ AI Service initialization error: {e}")
     
-    async def calculate_compatibility(self, user1_interests: List[str], user2_interests: List[str], 
-                                     user1_bio: str = "", user2_bio: str = "") -> int:
-        """Calculate compatibility score between two users (0-100%)"""
+    async def _send(self, task: str, prompt: str) -> str:
+        """Send a single stateless prompt for `task` to the LLM and return the raw reply"""
+        return await self.llm.send(task, prompt)
+    
+    def _llm_ready(self) -> bool:
+        """LLM configured and its circuit breaker not open (otherwise use local fallbacks)"""
+        return self.llm is not None and self.llm.available
+    
+    def _pack_interests(self, interest_lists: List[List[str]]) -> np.ndarray:
+        """Pack interest lists into rows of bit vectors (uint8 words) over the interned vocabulary"""
+        vocab = self._interest_vocab
+        lists = [interests or [] for interests in interest_lists]
+        flat = [interest for interests in lists for interest in interests]
+        bit_ids = list(map(vocab.get, flat))
+        if None in bit_ids:
+            for i, interest in enumerate(flat):
+                if bit_ids[i] is None:
+                    bit_ids[i] = vocab.setdefault(interest, len(vocab))
         
-        # Basic calculation based on common interests
-        if not user1_interests or not user2_interests:
-            return 0
+        bits = np.array(bit_ids, dtype=np.intp)
+        rows = np.repeat(np.arange(len(lists)), [len(interests) for interests in lists])
+        
+        matrix = np.zeros((len(lists), max(8, len(vocab))), dtype=bool)
+        matrix[rows, bits] = True
+        return np.packbits(matrix, axis=1)
+    
+    @staticmethod
+    def _popcount(packed: np.ndarray) -> np.ndarray:
+        """Number of set bits per row"""
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+        return np.unpackbits(packed, axis=1).sum(axis=1, dtype=np.int64)
+    
+    def _interest_scores(self, user_interests: List[str],
+                         candidates_interests: List[List[str]]) -> np.ndarray:
+        """Jaccard similarity * 100 of one user against N candidates, as floats"""
+        if not user_interests or not candidates_interests:
+            return np.zeros(len(candidates_interests))
+        
+        packed = self._pack_interests([user_interests] + list(candidates_interests))
+        user_bits, candidate_bits = packed[0], packed[1:]
+        
+        common = self._popcount(candidate_bits & user_bits)
+        total = self._popcount(candidate_bits | user_bits)
+        
+        # Candidates without interests score 0
+        has_interests = self._popcount(candidate_bits) > 0
+        return np.where(has_interests, common * 100 / np.maximum(total, 1), 0.0)
+    
+    def batch_interest_scores(self, user_interests: List[str],
+                              candidates_interests: List[List[str]]) -> List[int]:
+        """Jaccard interest scores (0-100) of one user against N candidates in one NumPy pass"""
+        return self._interest_scores(user_interests, candidates_interests).astype(int).tolist()
+    
+    async def calculate_compatibility_batch(self, user: Dict, candidates: List[Dict],
+                                            top_k: int = AI_RESCORE_TOP_K,
+                                            budget_ms: int = AI_RESCORE_BUDGET_MS) -> List[int]:
+        """Calculate compatibility of one user against many candidates (0-100% each).
+        
+        Stage 1 scores every candidate locally by interests. Stage 2 re-scores
+        only the `top_k` best candidates with the LLM, AI_BATCH_SIZE candidates
+        per request and within `budget_ms`; candidates not re-scored in time
+        keep their local score.
+        """
+        user_interests = user.get("interests") or []
+        scores = self._interest_scores(
+            user_interests,
+            [candidate.get("interests") or [] for candidate in candidates]
+        )
         
-        common_interests = set(user1_interests) & set(user2_interests)
-        total_interests = set(user1_interests) | set(user2_interests)
+        user_bio = user.get("bio") or ""
+        if not self._llm_ready() or not user_bio or not user_interests or top_k <= 0:
+            return scores.astype(int).tolist()
+        
+        eligible = [
+            i for i, candidate in enumerate(candidates)
+            if candidate.get("bio") and candidate.get("interests")
+        ]
+        eligible.sort(key=lambda i: scores[i], reverse=True)
+        top = eligible[:top_k]
+        
+        ai_scores = await self._batch_ai_scores(user, [candidates[i] for i in top], budget_ms)
+        for position, ai_score in ai_scores.items():
+            i = top[position]
+            # Weighted average: 60% interests, 40% AI analysis
+            scores[i] = (scores[i] * 0.6) + (ai_score * 0.4)
+        return scores.astype(int).tolist()
+    
+    async def prescore_compatibility(self, user: Dict, candidates: List[Dict]) -> int:
+        """Fill the compatibility cache for `user` against `candidates` ahead of discovery.
         
-        if not total_interests:
+        Intended for offline jobs: no time budget, AI_BATCH_SIZE candidates per
+        LLM request. Returns the number of candidates with an AI score.
+        """
+        if not self._llm_ready() or not user.get("bio") or not user.get("interests"):
             return 0
+        eligible = [c for c in candidates if c.get("bio") and c.get("interests")]
+        return len(await self._batch_ai_scores(user, eligible, None))
+    
+    async def _batch_ai_scores(self, user: Dict, candidates: List[Dict],
+                               budget_ms: Optional[int]) -> Dict[int, int]:
+        """AI scores by candidate position: cache first, then batched LLM requests.
         
-        # Jaccard similarity
-        basic_score = (len(common_interests) / len(total_interests)) * 100
+        Chunks still running when `budget_ms` runs out are cancelled; their
+        candidates (and any the LLM skipped) are simply absent from the result.
+        """
+        if not candidates:
+            return {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget_ms / 1000 if budget_ms is not None else None
         
-        # If AI is available, enhance with semantic analysis
-        if self.client and user1_bio and user2_bio:
-            try:
-                ai_score = await self._ai_compatibility_analysis(user1_bio, user2_bio, 
-                                                                 list(common_interests))
-                # Weighted average: 60% interests, 40% AI analysis
-                final_score = (basic_score * 0.6) + (ai_score * 0.4)
-                return int(final_score)
-            except:
-                pass
-        
-        return int(basic_score)
-    
-    async def _ai_compatibility_analysis(self, bio1: str, bio2: str, 
-                                        common_interests: List[str]) -> int:
-        """Use AI to analyze compatibility based on bios"""
-        try:
-            from emergentintegrations.llm.chat import UserMessage
+        cacheable = bool(user.get("id")) and all(c.get("id") for c in candidates)
+        results: Dict[int, int] = {}
+        if cacheable:
+            cached = await asyncio.gather(*(self.compatibility_cache.get(user, c) for c in candidates))
+            results = {position: score for position, score in enumerate(cached) if score is not None}
+        
+        misses = [position for position in range(len(candidates)) if position not in results]
+        tasks = {}
+        for start in range(0, len(misses), AI_BATCH_SIZE):
+            chunk = misses[start:start + AI_BATCH_SIZE]
+            task = asyncio.ensure_future(self._score_chunk(user, [candidates[p] for p in chunk], cacheable))
+            tasks[task] = chunk
+        if not tasks:
+            return results
+        
+        timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if task.exception() is not None:
+                print(f"AI compatibility batch error: {task.exception()}")
+                continue
+            chunk = tasks[task]
+            for chunk_position, score in task.result().items():
+                results[chunk[chunk_position]] = score
+        return results
+    
+    async def _score_chunk(self, user: Dict, chunk: List[Dict], cacheable: bool) -> Dict[int, int]:
+        # Limited to AI_RESCORE_CONCURRENCY concurrent LLM calls
+        async with self._rescore_semaphore:
+            scores = await self._request_ai_compatibility_batch(user, chunk)
+        if cacheable:
+            for position, score in scores.items():
+                await self.compatibility_cache.set(user, chunk[position], score)
+        return scores
+    
+    async def _request_ai_compatibility_batch(self, user: Dict, candidates: List[Dict]) -> Dict[int, int]:
+        """Score one user against several candidates in a single JSON LLM request.
+        
+        Returns scores by candidate position; candidates missing from (or
+        malformed in) the reply are left out. Raises if the request fails.
+        """
+        user_interests = set(user.get("interests") or [])
+        lines = []
+        for number, candidate in enumerate(candidates, start=1):
+            common = user_interests & set(candidate.get("interests") or [])
+            bio = " ".join((candidate.get("bio") or "").split())
+            lines.append(f"[{number}] Bio: {bio} | Common interests: {', '.join(sorted(common)) or 'none'}")
+        
+        prompt = f"""Analyze compatibility between a dating app user and each candidate based on their bios and common interests.
             
-            prompt = f"""Analyze compatibility between two dating app users based on their bios and common interests.
+User Bio: {user.get("bio") or ""}
             
-User 1 Bio: {bio1}
-User 2 Bio: {bio2}
-Common Interests: {', '.join(common_interests)}
+Candidates:
+{chr(10).join(lines)}
             
-Provide a compatibility score from 0-100 considering:
+Score each candidate from 0-100 considering:
 - Personality compatibility
 - Life goals alignment
 - Communication style
 - Shared values
             
-Return ONLY a number between 0-100."""
-            
-            message = UserMessage(text=prompt)
-            response = await self.chat.send_message(message)
-            
-            score_text = response
-            score = int(''.join(filter(str.isdigit, score_text)))
-            return max(0, min(100, score))
-        except Exception as e:
-            print(f"AI compatibility error: {e}")
-            return 50  # Default moderate compatibility
+Respond with JSON only: {{"scores": [{{"id": 1, "score": 0-100}}, ...]}} with one entry per candidate."""
+        
+        response = await self._send("compatibility", prompt)
+        return self._parse_batch_scores(response, len(candidates))
     
-    async def generate_icebreaker(self, matched_user_profile: Dict) -> str:
-        """Generate conversation starter based on matched user's profile"""
+    @staticmethod
+    def _parse_batch_scores(response: str, count: int) -> Dict[int, int]:
+        """Extract {position: score} from a batch reply, tolerating code fences and extra text"""
+        match = re.search(r"[\[{].*[\]}]", response or "", re.DOTALL)
+        if not match:
+            return {}
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        
+        if isinstance(data, dict):
+            data = data.get("scores", data)
+        if isinstance(data, dict):
+            # {"1": 80, "2": 65}
+            entries = list(data.items())
+        elif isinstance(data, list):
+            entries = [
+                (entry.get("id"), entry.get("score")) if isinstance(entry, dict) else (number, entry)
+                for number, entry in enumerate(data, start=1)
+            ]
+        else:
+            return {}
+        
+        scores = {}
+        for candidate_id, score in entries:
+            try:
+                position = int(candidate_id) - 1
+                value = int(round(float(score)))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= position < count and position not in scores:
+                scores[position] = max(0, min(100, value))
+        return scores
+    
+    async def generate_icebreaker(self, matched_user_profile: Dict) -> Tuple[str, bool]:
+        """Generate conversation starter based on matched user's profile.
+        
+        Returns (icebreaker, fell_back); fell_back is True when the LLM was
+        unavailable or failed and a template was used instead.
+        """
         
         interests = matched_user_profile.get("interests", [])
         bio = matched_user_profile.get("bio", "")
         job = matched_user_profile.get("job_title", "")
         
-        if not self.chat:
-            # Fallback icebreakers
-            if interests:
-                return f"Заметил, что ты увлекаешься {interests[0]}! Что тебя в этом привлекло?"
-            return "Привет! Как прошла неделя?"
+        if not self._llm_ready():
+            return self._fallback_icebreaker(interests), True
         
         try:
-            from emergentintegrations.llm.chat import UserMessage
-            
             prompt = f"""Generate a friendly, natural conversation starter in Russian for a dating app match.
             
 Profile Info:
@@ -111,29 +302,49 @@ Create ONE short, engaging question (max 15 words) that shows genuine interest.
 Be casual, friendly, and specific to their profile.
 Do not use emojis. Response must be in Russian."""
             
-            message = UserMessage(text=prompt)
-            response = await self.chat.send_message(message)
+            response = await self._send("icebreaker", prompt)
             
             icebreaker = response.strip().strip('"')
-            return icebreaker
+            return icebreaker, False
+        except LlmUnavailable:
+            return self._fallback_icebreaker(interests), True
         except Exception as e:
-            print(f"AI icebreaker error: {e}")
-            if interests:
-                return f"Заметил, что ты увлекаешься {interests[0]}! Что тебя в этом привлекло?"
-            return "Привет! Как прошла неделя?"
+            print(f"AI icebreaker error: {e!r}")
+            return self._fallback_icebreaker(interests), True
+    
+    @staticmethod
+    def _fallback_icebreaker(interests: List[str]) -> str:
+        if interests:
+            return f"Заметил, что ты увлекаешься {interests[0]}! Что тебя в этом привлекло?"
+        return "Привет! Как прошла неделя?"
     
     async def moderate_content(self, content: str, content_type: str = "text") -> Dict:
-        """Moderate user-generated content for inappropriate material"""
+        """Moderate user-generated content for inappropriate material.
         
-        if not self.chat:
-            # Basic keyword filtering
-            inappropriate_keywords = ["spam", "scam", "fake", "bot"]
-            is_flagged = any(keyword in content.lower() for keyword in inappropriate_keywords)
-            return {"is_safe": not is_flagged, "reason": "keyword_filter"}
+        The local engine decides clear cases; only content in its uncertain
+        risk band is sent to the LLM. Without an LLM configured uncertain
+        content is accepted; if the LLM is configured but unavailable (open
+        breaker, timeout, error) the verdict is marked "pending" so the
+        caller can retry it later instead of acting on it.
+        """
+        cache_key = verdict_cache_key(content, content_type)
+        cached = self.moderation_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        local = moderation_engine.analyze(content)
+        if not local.uncertain or self.llm is None:
+            self.moderation_counts["local"] += 1
+            verdict = local.to_verdict()
+            if not local.uncertain:
+                self.moderation_cache.set(cache_key, verdict)
+            return dict(verdict)
+        
+        if not self.llm.available:
+            self.moderation_counts["deferred"] += 1
+            return dict(local.to_verdict(), pending=True)
         
         try:
-            from emergentintegrations.llm.chat import UserMessage
-            
             prompt = f"""Analyze this {content_type} for dating app safety.
             
 Content: {content}
@@ -145,16 +356,39 @@ Check for:
 - Personal contact info (phone, email)
 - Violent content
             
+A keyword filter flagged: {', '.join(local.categories)}
+            
 Respond with JSON: {{"is_safe": true/false, "reason": "description"}}"""
             
-            message = UserMessage(text=prompt)
-            response = await self.chat.send_message(message)
+            response = await self._send("moderation", prompt)
             
-            result = json.loads(response)
-            return result
+            match = re.search(r"\{.*\}", response, re.DOTALL)
+            result = json.loads(match.group(0) if match else response)
+            self.moderation_counts["escalated"] += 1
+            verdict = {
+                "is_safe": bool(result.get("is_safe", True)),
+                "reason": result.get("reason") or "",
+                "confidence": None,
+                "categories": local.categories,
+                "source": "llm"
+            }
+            self.moderation_cache.set(cache_key, verdict)
+            return dict(verdict)
         except Exception as e:
-            print(f"AI moderation error: {e}")
-            return {"is_safe": True, "reason": "moderation_unavailable"}
+            if not isinstance(e, LlmUnavailable):
+                print(f"AI moderation error: {e}")
+            self.moderation_counts["deferred"] += 1
+            return dict(local.to_verdict(), pending=True)
+    
+    def stats(self) -> dict:
+        """Counters for AI-related caches, LLM prompt sizes and the LLM call guard"""
+        return {
+            "compatibility_cache": self.compatibility_cache.stats(),
+            "prompt_size": self.llm.stats() if self.llm else None,
+            "llm_guard": self.llm.guard.stats() if self.llm else None,
+            "moderation": dict(self.moderation_counts),
+            "moderation_cache": self.moderation_cache.stats()
+        }
 
 # Global AI service instance
 ai_service = AIService()
@@ -0,0 +1,263 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import struct
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+
+from utils.db import db
+from services.geo_index import GeoGridIndex
+
+AGE_BUCKET_SIZE = 5
+PAGE_SIZE = 1000
+REFRESH_INTERVAL_SECONDS = int(os.getenv("CANDIDATE_INDEX_REFRESH_SECONDS", "300"))
+# Every Nth periodic refresh rebuilds from scratch to drop deleted users
+FULL_REFRESH_EVERY = int(os.getenv("CANDIDATE_INDEX_FULL_REFRESH_EVERY", "12"))
+# Delta refreshes overlap the previous window to tolerate app/DB clock skew
+WATERMARK_OVERLAP_SECONDS = 5
+
+INDEX_COLUMNS = "id, age, gender, location, interests, is_premium, is_approved, is_banned, updated_at"
+
+def parse_point(value) -> Optional[Tuple[float, float]]:
+    """Return (lat, lon) from a PostGIS point as returned by PostgREST (EWKB hex or GeoJSON)"""
+    if not value:
+        return None
+    try:
+        if isinstance(value, dict):
+            lon, lat = value["coordinates"][:2]
+            return float(lat), float(lon)
+        raw = bytes.fromhex(value)
+        byte_order = "<" if raw[0] == 1 else ">"
+        geom_type = struct.unpack(byte_order + "I", raw[1:5])[0]
+        offset = 9 if geom_type & 0x20000000 else 5  # skip SRID when present
+        lon, lat = struct.unpack(byte_order + "dd", raw[offset:offset + 16])
+        return lat, lon
+    except Exception:
+        return None
+
+class CandidateRecord:
+    """Compact discovery record for one approved, non-banned user"""
+    __slots__ = ("id", "age", "gender", "lat", "lon", "interest_ids", "is_premium")
+
+    def __init__(self, id: str, age: int, gender: Optional[str], lat: Optional[float],
+                 lon: Optional[float], interest_ids: Tuple[int, ...], is_premium: bool):
+        self.id = id
+        self.age = age
+        self.gender = gender
+        self.lat = lat
+        self.lon = lon
+        self.interest_ids = interest_ids
+        self.is_premium = is_premium
+
+class CandidateIndex:
+    """In-process index of discoverable users partitioned by (gender, age bucket)"""
+
+    def __init__(self):
+        self._partitions: Dict[Tuple[Optional[str], int], Dict[str, CandidateRecord]] = {}
+        self._records: Dict[str, CandidateRecord] = {}
+        self._vocabulary: Dict[str, int] = {}
+        self.geo = GeoGridIndex()
+        self._watermark: Optional[str] = None
+        self._refresh_count = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_update_at: Optional[float] = None
+        self.ready = False
+
+    # ---- vocabulary ----
+
+    def intern_interests(self, interests: Optional[Iterable[str]]) -> Tuple[int, ...]:
+        """Map interest strings to stable small integer ids"""
+        ids = set()
+        for interest in interests or []:
+            interest_id = self._vocabulary.get(interest)
+            if interest_id is None:
+                interest_id = self._vocabulary[interest] = len(self._vocabulary)
+            ids.add(interest_id)
+        return tuple(sorted(ids))
+
+    # ---- incremental updates ----
+
+    def upsert(self, user: dict):
+        """Insert, update or drop a user from a (partial or full) users row"""
+        user_id = user.get("id")
+        if not user_id:
+            return
+        existing = self._records.get(user_id)
+
+        if user.get("is_banned") or user.get("is_approved") is False:
+            self.remove(user_id)
+            return
+        if existing is None and not user.get("is_approved"):
+            return
+
+        age = user["age"] if "age" in user else (existing.age if existing else None)
+        if age is None:
+            self.remove(user_id)
+            return
+
+        if "location" in user:
+            point = parse_point(user["location"])
+        else:
+            point = (existing.lat, existing.lon) if existing else None
+
+        record = CandidateRecord(
+            id=user_id,
+            age=age,
+            gender=user["gender"] if "gender" in user else (existing.gender if existing else None),
+            lat=point[0] if point else None,
+            lon=point[1] if point else None,
+            interest_ids=self.intern_interests(user["interests"]) if "interests" in user else (existing.interest_ids if existing else ()),
+            is_premium=user["is_premium"] if "is_premium" in user else (existing.is_premium if existing else False)
+        )
+        self._put(record)
+
+    def update_location(self, user_id: str, lat: float, lon: float):
+        record = self._records.get(user_id)
+        if record is not None:
+            record.lat = lat
+            record.lon = lon
+            self.geo.update(user_id, lat, lon)
+            self.last_update_at = time.time()
+
+    def remove(self, user_id: str):
+        record = self._records.pop(user_id, None)
+        if record is not None:
+            partition = self._partitions.get(self._partition_key(record))
+            if partition is not None:
+                partition.pop(user_id, None)
+            self.geo.remove(user_id)
+            self.last_update_at = time.time()
+
+    def _partition_key(self, record: CandidateRecord) -> Tuple[Optional[str], int]:
+        return record.gender, record.age // AGE_BUCKET_SIZE
+
+    def _put(self, record: CandidateRecord):
+        previous = self._records.get(record.id)
+        if previous is not None and self._partition_key(previous) != self._partition_key(record):
+            self._partitions[self._partition_key(previous)].pop(record.id, None)
+        self._records[record.id] = record
+        self._partitions.setdefault(self._partition_key(record), {})[record.id] = record
+        if record.lat is not None and record.lon is not None:
+            self.geo.update(record.id, record.lat, record.lon)
+        else:
+            self.geo.remove(record.id)
+        self.last_update_at = time.time()
+
+    # ---- selection ----
+
+    def iter_eligible(self, viewer: dict, exclude: Set[str] = frozenset()) -> Iterable[CandidateRecord]:
+        """Yield records matching the viewer's gender and age preferences"""
+        min_age = viewer.get("min_age") or 18
+        max_age = viewer.get("max_age") or 100
+        show_gender = viewer.get("show_gender") or None
+        viewer_id = viewer.get("id")
+
+        for (gender, bucket), partition in self._partitions.items():
+            if show_gender and gender != show_gender:
+                continue
+            if (bucket + 1) * AGE_BUCKET_SIZE <= min_age or bucket * AGE_BUCKET_SIZE > max_age:
+                continue
+            for record in partition.values():
+                if min_age <= record.age <= max_age and record.id != viewer_id and record.id not in exclude:
+                    yield record
+
+    def select_nearby(self, viewer: dict, lat: float, lon: float, radius_km: float, limit: int,
+                      exclude: Set[str] = frozenset()) -> List[Tuple[str, float]]:
+        """Return up to `limit` (candidate id, distance_km) within the radius, nearest first"""
+        min_age = viewer.get("min_age") or 18
+        max_age = viewer.get("max_age") or 100
+        show_gender = viewer.get("show_gender") or None
+        viewer_id = viewer.get("id")
+
+        def eligible(user_id: str) -> bool:
+            record = self._records.get(user_id)
+            return (
+                record is not None
+                and user_id != viewer_id
+                and user_id not in exclude
+                and min_age <= record.age <= max_age
+                and (not show_gender or record.gender == show_gender)
+            )
+
+        return self.geo.nearby(lat, lon, radius_km, limit=limit, predicate=eligible)
+
+    def select(self, viewer: dict, limit: int, exclude: Set[str] = frozenset()) -> List[str]:
+        """Return up to `limit` random candidate ids for the viewer"""
+        eligible = [record.id for record in self.iter_eligible(viewer, exclude)]
+        if len(eligible) <= limit:
+            return eligible
+        return random.sample(eligible, limit)
+
+    # ---- refresh from database ----
+
+    async def refresh(self, full: bool = False):
+        """Reload the index: a full rebuild, or only rows updated since the last refresh"""
+        started = (datetime.now(timezone.utc) - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)).isoformat()
+        rows = []
+        offset = 0
+        while True:
+            query = db.table("users").select(INDEX_COLUMNS)
+            if full or self._watermark is None:
+                query = query.eq("is_approved", True).eq("is_banned", False)
+            else:
+                query = query.gte("updated_at", self._watermark)
+            result = await query.order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        if full or self._watermark is None:
+            self._partitions = {}
+            self._records = {}
+            self.geo = GeoGridIndex()
+        for row in rows:
+            self.upsert(row)
+
+        self._watermark = started
+        self.last_refresh_at = time.time()
+        self.ready = True
+
+    async def run_refresh_loop(self):
+        """Background task: periodic delta refresh with a periodic full rebuild"""
+        while True:
+            try:
+                await self.refresh(full=self._refresh_count % FULL_REFRESH_EVERY == 0)
+                self._refresh_count += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Candidate index refresh error: {e}")
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+
+    # ---- introspection ----
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by records, partitions and the vocabulary"""
+        total = sys.getsizeof(self._records) + sys.getsizeof(self._partitions) + sys.getsizeof(self._vocabulary)
+        for partition in self._partitions.values():
+            total += sys.getsizeof(partition)
+        for record in self._records.values():
+            total += sys.getsizeof(record) + sys.getsizeof(record.id) + sys.getsizeof(record.interest_ids)
+        for interest in self._vocabulary:
+            total += sys.getsizeof(interest)
+        return total
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "ready": self.ready,
+            "candidates": len(self._records),
+            "partitions": len(self._partitions),
+            "interests": len(self._vocabulary),
+            "located": len(self.geo),
+            "memory_bytes": self.memory_bytes(),
+            "refresh_lag_seconds": round(now - self.last_refresh_at, 1) if self.last_refresh_at else None,
+            "last_update_seconds_ago": round(now - self.last_update_at, 1) if self.last_update_at else None
+        }
+
+# Global candidate index instance
+candidate_index = CandidateIndex()
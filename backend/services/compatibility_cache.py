@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from utils.cache import LRUCache
+
+COMPATIBILITY_CACHE_MAX_BYTES = int(os.getenv("COMPATIBILITY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Optional on-disk tier (SQLite file) that survives restarts
+COMPATIBILITY_CACHE_PATH = os.getenv("COMPATIBILITY_CACHE_PATH")
+# Rows kept on disk; the least recently written are deleted past this
+COMPATIBILITY_CACHE_DISK_MAX_ROWS = int(os.getenv("COMPATIBILITY_CACHE_DISK_MAX_ROWS", "1000000"))
+# The row cap is checked once per this many disk writes
+COMPATIBILITY_CACHE_DISK_TRIM_EVERY = 1000
+
+def profile_fingerprint(user: Dict) -> str:
+    """Hash of the profile fields that affect compatibility (interests and bio)"""
+    payload = json.dumps([sorted(user.get("interests") or []), user.get("bio") or ""], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+def pair_key(user_a: Dict, user_b: Dict) -> str:
+    """Cache key for an unordered user pair plus both profile fingerprints.
+
+    Changing either user's interests or bio changes the key, so stale
+    entries are never read again and simply age out of the LRU.
+    """
+    first, second = sorted((user_a, user_b), key=lambda u: u["id"])
+    return f"{first['id']}:{second['id']}:{profile_fingerprint(first)}{profile_fingerprint(second)}"
+
+class CompatibilityCache:
+    """LLM compatibility scores per user pair: memory LRU with an optional SQLite tier"""
+
+    def __init__(self, max_bytes: int = COMPATIBILITY_CACHE_MAX_BYTES, path: Optional[str] = COMPATIBILITY_CACHE_PATH,
+                 disk_max_rows: int = COMPATIBILITY_CACHE_DISK_MAX_ROWS):
+        self.memory = LRUCache(max_bytes)
+        self.path = path
+        self.disk_max_rows = disk_max_rows
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self.disk_evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS compatibility_scores "
+                    "(key TEXT PRIMARY KEY, score INTEGER NOT NULL, updated_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_compatibility_scores_updated ON compatibility_scores (updated_at)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"⚠️ Compatibility disk cache unavailable: {e}")
+                self._db = None
+
+    async def get(self, user_a: Dict, user_b: Dict) -> Optional[int]:
+        key = pair_key(user_a, user_b)
+        score = self.memory.get(key)
+        if score is not None or self._db is None:
+            return score
+
+        score = await asyncio.to_thread(self._disk_get, key)
+        if score is not None:
+            self.disk_hits += 1
+            self.memory.set(key, score)
+        return score
+
+    async def set(self, user_a: Dict, user_b: Dict, score: int):
+        key = pair_key(user_a, user_b)
+        self.memory.set(key, score)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, score)
+            self.disk_writes += 1
+
+    def _disk_get(self, key: str) -> Optional[int]:
+        with self._db_lock:
+            row = self._db.execute("SELECT score FROM compatibility_scores WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _disk_set(self, key: str, score: int):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO compatibility_scores (key, score, updated_at) VALUES (?, ?, ?)",
+                (key, score, time.time())
+            )
+            if (self.disk_writes + 1) % COMPATIBILITY_CACHE_DISK_TRIM_EVERY == 0:
+                self._disk_trim()
+            self._db.commit()
+
+    def _disk_trim(self):
+        """Delete the oldest rows past disk_max_rows (caller holds the lock)"""
+        count = self._db.execute("SELECT COUNT(*) FROM compatibility_scores").fetchone()[0]
+        excess = count - self.disk_max_rows
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM compatibility_scores WHERE key IN "
+                "(SELECT key FROM compatibility_scores ORDER BY updated_at LIMIT ?)",
+                (excess,)
+            )
+            self.disk_evictions += excess
+
+    def stats(self) -> dict:
+        return {
+            **self.memory.stats(),
+            "disk_enabled": self._db is not None,
+            "disk_hits": self.disk_hits,
+            "disk_writes": self.disk_writes,
+            "disk_evictions": self.disk_evictions
+        }
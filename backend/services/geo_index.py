@@ -0,0 +1,114 @@
+import math
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in km"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class GeoGridIndex:
+    """Fixed-size lat/lon grid over user locations for radius lookups.
+
+    Cells are `cell_km` tall (and the same number of degrees wide). A query
+    visits cells in rings of growing Chebyshev distance around the origin
+    cell, stops once a ring cannot contain anything closer than what was
+    already found, and filters points with exact haversine distance.
+    """
+
+    def __init__(self, cell_km: float = 2.0):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.lon_cells = math.ceil(360 / self.cell_deg)
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._points: Dict[str, Tuple[float, float, Tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = math.floor((lat + 90) / self.cell_deg)
+        col = math.floor((lon + 180) / self.cell_deg) % self.lon_cells
+        return row, col
+
+    def update(self, user_id: str, lat: float, lon: float):
+        """Insert or move a user"""
+        cell = self._cell(lat, lon)
+        previous = self._points.get(user_id)
+        if previous is not None and previous[2] != cell:
+            self._discard_from_cell(user_id, previous[2])
+        self._points[user_id] = (lat, lon, cell)
+        self._cells.setdefault(cell, set()).add(user_id)
+
+    def remove(self, user_id: str):
+        previous = self._points.pop(user_id, None)
+        if previous is not None:
+            self._discard_from_cell(user_id, previous[2])
+
+    def _discard_from_cell(self, user_id: str, cell: Tuple[int, int]):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(user_id)
+            if not members:
+                del self._cells[cell]
+
+    def nearby(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None,
+               predicate: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Return (user_id, distance_km) within `radius_km`, nearest first.
+
+        With `limit`, ring expansion stops as soon as the `limit` nearest
+        matches are known; `predicate` filters ids before distance ranking.
+        """
+        center_row, center_col = self._cell(lat, lon)
+
+        # Cells narrow towards the poles: widen the column span accordingly
+        max_lat = min(89.9, abs(lat) + radius_km / KM_PER_DEGREE_LAT)
+        cell_width_km = self.cell_km * math.cos(math.radians(max_lat))
+        max_row_ring = math.ceil(radius_km / self.cell_km)
+        max_col_ring = min(math.ceil(radius_km / cell_width_km), self.lon_cells // 2)
+        max_ring = max(max_row_ring, max_col_ring)
+        min_cell_km = min(self.cell_km, cell_width_km)
+
+        found: List[Tuple[str, float]] = []
+        for ring in range(max_ring + 1):
+            if limit and len(found) >= limit:
+                found.sort(key=lambda item: item[1])
+                # Any point in this ring is at least (ring - 1) cells away
+                if (ring - 1) * min_cell_km > found[limit - 1][1]:
+                    break
+            for cell in self._ring_cells(center_row, center_col, ring, max_row_ring, max_col_ring):
+                members = self._cells.get(cell)
+                if not members:
+                    continue
+                for user_id in members:
+                    if predicate is not None and not predicate(user_id):
+                        continue
+                    point_lat, point_lon, _ = self._points[user_id]
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    if distance <= radius_km:
+                        found.append((user_id, distance))
+
+        found.sort(key=lambda item: item[1])
+        return found[:limit] if limit else found
+
+    def _ring_cells(self, center_row: int, center_col: int, ring: int,
+                    max_row_ring: int, max_col_ring: int):
+        """Yield cells at Chebyshev distance `ring`, clipped to the query span"""
+        if ring == 0:
+            yield center_row, center_col
+            return
+        for d_row in range(-min(ring, max_row_ring), min(ring, max_row_ring) + 1):
+            if abs(d_row) == ring:
+                col_offsets = range(-min(ring, max_col_ring), min(ring, max_col_ring) + 1)
+            elif ring <= max_col_ring:
+                col_offsets = (-ring, ring)
+            else:
+                continue
+            for d_col in col_offsets:
+                yield center_row + d_row, (center_col + d_col) % self.lon_cells
@@ -0,0 +1,109 @@
+import os
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.cache import LRUCache
+from utils.db import db
+from services.ai_service import ai_service
+from services.compatibility_cache import profile_fingerprint
+
+ICEBREAKER_CACHE_MAX_BYTES = int(os.getenv("ICEBREAKER_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Profile columns an icebreaker is written from (and fingerprinted by)
+ICEBREAKER_PROFILE_COLUMNS = "id, interests, bio, job_title"
+
+class IcebreakerService:
+    """Icebreakers cached per (match, viewer) and pre-generated when a match is created.
+
+    Each entry remembers the fingerprint (interests + bio) of the profile it
+    was written for. `get` takes the other user's current profile (fetched by
+    the caller) and treats an entry written for a different fingerprint as a
+    miss, so edits made through any worker invalidate it. Template fallbacks
+    (LLM unavailable) are returned but not cached.
+    """
+
+    def __init__(self, max_bytes: int = ICEBREAKER_CACHE_MAX_BYTES):
+        # (match_id, viewer_id) -> (other_user_id, fingerprint, icebreaker)
+        self._entries = LRUCache(max_bytes)
+        self._generating: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.invalidations = 0
+        self.generated = 0
+        self.fallbacks = 0
+
+    def get(self, match_id: str, viewer_id: str, other_user: Dict) -> Optional[str]:
+        """Cached icebreaker for the viewer, or None if missing or written for another profile version"""
+        entry = self._entries.get((match_id, viewer_id))
+        if entry is None:
+            return None
+        other_user_id, fingerprint, icebreaker = entry
+        if other_user_id != other_user.get("id") or fingerprint != profile_fingerprint(other_user):
+            self._entries.pop((match_id, viewer_id))
+            self.invalidations += 1
+            return None
+        return icebreaker
+
+    async def generate(self, match_id: str, viewer_id: str, other_user: Dict) -> str:
+        """Generate and cache an icebreaker; concurrent calls for the same key share one LLM call"""
+        key = (match_id, viewer_id)
+        pending = self._generating.get(key)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._generating[key] = future
+        try:
+            icebreaker, fell_back = await ai_service.generate_icebreaker(other_user)
+            if fell_back:
+                self.fallbacks += 1
+            else:
+                self._entries.set(key, (other_user["id"], profile_fingerprint(other_user), icebreaker))
+                self.generated += 1
+            future.set_result(icebreaker)
+            return icebreaker
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be awaiting the shared future; mark the exception retrieved
+            future.exception()
+            raise
+        finally:
+            del self._generating[key]
+
+    def warm_match(self, user_a_id: str, user_b_id: str, match_id: Optional[str] = None):
+        """Schedule background generation of both users' icebreakers for their new match"""
+        task = asyncio.create_task(self._warm_match(user_a_id, user_b_id, match_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _warm_match(self, user_a_id: str, user_b_id: str, match_id: Optional[str]):
+        try:
+            participants = [user_a_id, user_b_id]
+            if match_id is None:
+                match_result = await db.table("matches").select("id").in_("user_id_1", participants).in_("user_id_2", participants).limit(1).execute()
+                if not match_result.data:
+                    return
+                match_id = match_result.data[0]["id"]
+
+            users_result = await db.table("users").select(ICEBREAKER_PROFILE_COLUMNS).in_("id", participants).execute()
+            profiles: List[Dict] = users_result.data or []
+            if len(profiles) != 2:
+                return
+            first, second = profiles
+            await asyncio.gather(
+                self.generate(match_id, first["id"], second),
+                self.generate(match_id, second["id"], first)
+            )
+        except Exception as e:
+            print(f"Icebreaker warm-up error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            **self._entries.stats(),
+            "generated": self.generated,
+            "fallbacks": self.fallbacks,
+            "invalidations": self.invalidations,
+            "in_flight": len(self._generating),
+            "background_tasks": len(self._background)
+        }
+
+# Global icebreaker service
+icebreakers = IcebreakerService()
@@ -0,0 +1,68 @@
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from services.llm_guard import LlmGuard
+
+# One client configuration per task type; each gets its own system message
+TASK_SYSTEM_MESSAGES = {
+    "compatibility": "You are a compatibility analyst for a dating app. Reply only in the requested format.",
+    "icebreaker": "You are a helpful AI assistant for a dating app. Provide friendly, engaging, and appropriate responses.",
+    "moderation": "You are a content safety reviewer for a dating app. Reply only with the requested JSON."
+}
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for prompt size metrics"""
+    return (len(text) + 3) // 4
+
+class PromptStats:
+    """Prompt size counters for one task type"""
+    __slots__ = ("calls", "total_tokens", "max_tokens", "last_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+
+    def record(self, tokens: int):
+        self.calls += 1
+        self.total_tokens += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        self.last_tokens = tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "avg_prompt_tokens": round(self.total_tokens / self.calls, 1) if self.calls else None,
+            "max_prompt_tokens": self.max_tokens,
+            "last_prompt_tokens": self.last_tokens
+        }
+
+class LlmClientPool:
+    """Stateless LLM access: a fresh chat client per call, configured per task type.
+
+    `factory(session_id, system_message)` builds a chat client. Every call gets
+    a new session, so no conversation history is carried between requests and
+    the prompt is always just the system message plus the task prompt.
+    All calls go through one shared LlmGuard.
+    """
+
+    def __init__(self, factory: Callable[[str, str], Any], message_cls: Callable[..., Any],
+                 guard: Optional[LlmGuard] = None):
+        self.factory = factory
+        self.message_cls = message_cls
+        self.guard = guard or LlmGuard()
+        self.prompt_stats: Dict[str, PromptStats] = {task: PromptStats() for task in TASK_SYSTEM_MESSAGES}
+
+    async def send(self, task: str, prompt: str) -> str:
+        system_message = TASK_SYSTEM_MESSAGES[task]
+        chat = self.factory(f"dating-app-{task}-{uuid.uuid4().hex}", system_message)
+        self.prompt_stats[task].record(approximate_tokens(system_message) + approximate_tokens(prompt))
+        return await self.guard.call(lambda: chat.send_message(self.message_cls(text=prompt)))
+
+    @property
+    def available(self) -> bool:
+        return self.guard.available
+
+    def stats(self) -> dict:
+        return {task: stats.to_dict() for task, stats in self.prompt_stats.items()}
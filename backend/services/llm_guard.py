@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Shared limits for every LLM call made by AIService
+AI_LLM_MAX_CONCURRENCY = int(os.getenv("AI_LLM_MAX_CONCURRENCY", "8"))
+AI_LLM_TIMEOUT_SECONDS = float(os.getenv("AI_LLM_TIMEOUT_SECONDS", "10"))
+# Consecutive failures that open the circuit, and how long it stays open
+AI_LLM_BREAKER_FAILURES = int(os.getenv("AI_LLM_BREAKER_FAILURES", "5"))
+AI_LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+class LlmUnavailable(Exception):
+    """Raised instead of calling the LLM while the circuit breaker is open,
+    and when a call misses its deadline (callers fall back quietly on both)"""
+
+class LlmGuard:
+    """Concurrency cap, per-call deadline and circuit breaker for LLM calls.
+
+    The deadline covers both waiting for a slot and the call itself; a missed
+    deadline raises LlmUnavailable like an open circuit does. After
+    `failure_threshold` consecutive failures or timeouts the circuit opens and
+    calls fail fast with LlmUnavailable for `cooldown_seconds`; then a single
+    probe call is let through (half-open) to decide whether to close it again.
+    """
+
+    def __init__(self, max_concurrency: int = AI_LLM_MAX_CONCURRENCY,
+                 timeout_seconds: float = AI_LLM_TIMEOUT_SECONDS,
+                 failure_threshold: int = AI_LLM_BREAKER_FAILURES,
+                 cooldown_seconds: float = AI_LLM_BREAKER_COOLDOWN_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.circuit_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown_seconds:
+            return "open"
+        return "half_open"
+
+    @property
+    def available(self) -> bool:
+        """Whether a call would currently be attempted"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probe_in_flight)
+
+    async def call(self, operation: Callable[[], Awaitable[T]], timeout_seconds: Optional[float] = None) -> T:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probe_in_flight):
+            self.rejected += 1
+            raise LlmUnavailable("LLM circuit breaker is open")
+
+        probe = state == "half_open"
+        if probe:
+            self._probe_in_flight = True
+        self.calls += 1
+        try:
+            result = await asyncio.wait_for(self._run(operation), timeout_seconds or self.timeout_seconds)
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            self._record_failure()
+            raise LlmUnavailable("LLM call timed out") from e
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failures += 1
+            self._record_failure()
+            raise
+        else:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            return result
+        finally:
+            if probe:
+                self._probe_in_flight = False
+
+    async def _run(self, operation: Callable[[], Awaitable[T]]) -> T:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await operation()
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _record_failure(self):
+        self._consecutive_failures += 1
+        if self._opened_at is not None or self._consecutive_failures >= self.failure_threshold:
+            # A failed half-open probe re-opens the circuit for another cooldown
+            if self._opened_at is None:
+                self.circuit_opened += 1
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "circuit_opened": self.circuit_opened
+        }
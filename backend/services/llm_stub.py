@@ -0,0 +1,43 @@
+import re
+import json
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+@dataclass
+class UserMessage:
+    """Stand-in for emergentintegrations.llm.chat.UserMessage"""
+    text: str
+
+# "[3] Bio: ..." lines of the batch compatibility prompt
+_CANDIDATE_LINE = re.compile(r"^\[(\w+)\]", re.MULTILINE)
+
+def _stable_score(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=2).digest(), "little") % 101
+
+class StubLlmChat:
+    """Offline LLM replacement with deterministic replies for every AIService prompt.
+
+    Enabled with AI_LLM_STUB=1 so discovery, icebreakers and moderation can be
+    run locally without an API key. `latency_ms` simulates provider latency.
+    """
+
+    def __init__(self, latency_ms: int = 0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    async def send_message(self, message: UserMessage) -> str:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        prompt = message.text
+        if '"scores"' in prompt:
+            scores = [
+                {"id": candidate_id, "score": _stable_score(prompt + candidate_id)}
+                for candidate_id in _CANDIDATE_LINE.findall(prompt)
+            ]
+            return json.dumps({"scores": scores})
+        if '"is_safe"' in prompt:
+            return json.dumps({"is_safe": True, "reason": "stub"})
+        return "Привет! Чем ты любишь заниматься по выходным?"
@@ -0,0 +1,236 @@
+import os
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from utils.db import db
+from services.ai_service import ai_service
+from services.realtime import realtime
+
+MESSAGE_MODERATION_WORKERS = int(os.getenv("MESSAGE_MODERATION_WORKERS", "4"))
+MESSAGE_MODERATION_QUEUE_SIZE = int(os.getenv("MESSAGE_MODERATION_QUEUE_SIZE", "10000"))
+MESSAGE_MODERATION_BATCH_SIZE = int(os.getenv("MESSAGE_MODERATION_BATCH_SIZE", "20"))
+MESSAGE_MODERATION_MAX_ATTEMPTS = int(os.getenv("MESSAGE_MODERATION_MAX_ATTEMPTS", "3"))
+# Messages still 'pending' this long after sending are re-queued by the sweep
+# (dropped under backpressure, exhausted retries, or lost in a restart)
+MESSAGE_MODERATION_SWEEP_SECONDS = int(os.getenv("MESSAGE_MODERATION_SWEEP_SECONDS", "60"))
+MESSAGE_MODERATION_SWEEP_MIN_AGE_SECONDS = 120
+# Swept messages are claimed for this long so other workers' sweeps skip them
+MESSAGE_MODERATION_SWEEP_LEASE_SECONDS = 300
+
+# Local moderation categories -> reports.reason
+REPORT_REASONS = {
+    "profanity": "harassment",
+    "insult": "harassment",
+    "sexual": "inappropriate_content",
+    "scam": "spam",
+    "spam": "spam",
+    "phone": "spam",
+    "email": "spam",
+    "link": "spam",
+    "telegram": "spam",
+    "telegram_link": "spam",
+    "handle": "spam"
+}
+
+class QueuedMessage:
+    __slots__ = ("id", "content", "enqueued_at", "attempts")
+
+    def __init__(self, message_id: str, content: str, attempts: int = 0):
+        self.id = message_id
+        self.content = content
+        self.enqueued_at = time.monotonic()
+        self.attempts = attempts
+
+class MessageModerationPipeline:
+    """Moderates sent messages in the background so chat send latency is unaffected.
+
+    `submit` never blocks: when the queue is full the message stays 'pending'
+    in the database and the periodic sweep picks it up later; the sweep
+    claims rows through claim_pending_messages, so several API workers never
+    moderate the same message. Messages without text are stored as
+    'approved' and never enter the pipeline. Workers take up
+    to MESSAGE_MODERATION_BATCH_SIZE messages at a time, approve clean ones
+    with one update and retract flagged ones (hide + report) via
+    retract_flagged_message, telling the recipient's open chats to drop them
+    with a 'message_hidden' event. Uncertain messages that could not reach
+    the LLM stay 'pending' for the sweep. Failed messages are retried with
+    backoff.
+    """
+
+    def __init__(self, workers: int = MESSAGE_MODERATION_WORKERS,
+                 queue_size: int = MESSAGE_MODERATION_QUEUE_SIZE,
+                 batch_size: int = MESSAGE_MODERATION_BATCH_SIZE,
+                 max_attempts: int = MESSAGE_MODERATION_MAX_ATTEMPTS):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued_ids: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        # Recent queue lag samples in seconds (time from submit to moderation)
+        self._lags = deque(maxlen=1000)
+
+        self.submitted = 0
+        self.dropped = 0
+        self.approved = 0
+        self.flagged = 0
+        self.deferred = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, message: Dict) -> bool:
+        """Queue a stored message for moderation; returns False if it was left for the sweep"""
+        if self._queue is None or not message.get("content") or message["id"] in self._queued_ids:
+            return False
+        return self._enqueue(QueuedMessage(message["id"], message["content"]))
+
+    def _enqueue(self, item: QueuedMessage) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._queued_ids.add(item.id)
+        self.submitted += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._process(batch)
+            except Exception as e:
+                print(f"Message moderation error: {e}")
+            finally:
+                for item in batch:
+                    self._queued_ids.discard(item.id)
+                    self._queue.task_done()
+
+    async def _process(self, batch: List[QueuedMessage]):
+        now = time.monotonic()
+        self._lags.extend(now - item.enqueued_at for item in batch)
+
+        verdicts = await asyncio.gather(
+            *(ai_service.moderate_content(item.content, "message") for item in batch),
+            return_exceptions=True
+        )
+
+        approved_ids = []
+        for item, verdict in zip(batch, verdicts):
+            if isinstance(verdict, Exception):
+                self._retry(item)
+            elif verdict.get("pending"):
+                # Uncertain and the LLM is unavailable: leave it 'pending' for the sweep
+                self.deferred += 1
+            elif verdict.get("is_safe", True):
+                approved_ids.append(item.id)
+            else:
+                try:
+                    await self._retract(item, verdict)
+                    self.flagged += 1
+                except Exception as e:
+                    print(f"Message retract error: {e}")
+                    self._retry(item)
+
+        if approved_ids:
+            try:
+                await db.table("messages").update({
+                    "moderation_status": "approved",
+                    "moderated_at": datetime.now(timezone.utc).isoformat()
+                }).in_("id", approved_ids).eq("moderation_status", "pending").execute()
+                self.approved += len(approved_ids)
+            except Exception as e:
+                print(f"Message approve error: {e}")
+                for item in batch:
+                    if item.id in approved_ids:
+                        self._retry(item)
+
+    async def _retract(self, item: QueuedMessage, verdict: Dict):
+        categories = verdict.get("categories") or []
+        reason = next((REPORT_REASONS[c] for c in categories if c in REPORT_REASONS), "inappropriate_content")
+        result = await db.rpc("retract_flagged_message", {
+            "p_message_id": item.id,
+            "p_reason": reason,
+            "p_description": f"Auto-moderation ({verdict.get('source', 'local')}): {verdict.get('reason', '')}"[:500]
+        }).execute()
+        hidden = result.data
+        if hidden and hidden.get("recipient_id"):
+            # The sender still sees the message; only the recipient's view changes
+            await realtime.publish([hidden["recipient_id"]], {
+                "type": "message_hidden",
+                "match_id": hidden["match_id"],
+                "message_id": hidden["message_id"]
+            })
+
+    def _retry(self, item: QueuedMessage):
+        item.attempts += 1
+        if item.attempts >= self.max_attempts:
+            # Stays 'pending' in the database; the sweep will try again later
+            self.failed += 1
+            return
+        self.retried += 1
+        delay = 2 ** item.attempts
+        asyncio.get_running_loop().call_later(delay, self._requeue, item)
+
+    def _requeue(self, item: QueuedMessage):
+        if item.id not in self._queued_ids:
+            self._enqueue(QueuedMessage(item.id, item.content, item.attempts))
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(MESSAGE_MODERATION_SWEEP_SECONDS)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Message moderation sweep error: {e}")
+
+    async def sweep(self) -> int:
+        """Re-queue messages still pending moderation; returns how many were queued"""
+        free = self.queue_size - self._queue.qsize()
+        if free <= 0:
+            return 0
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=MESSAGE_MODERATION_SWEEP_MIN_AGE_SECONDS)).isoformat()
+        result = await db.rpc("claim_pending_messages", {
+            "p_before": cutoff,
+            "p_limit": min(free, 1000),
+            "p_lease_seconds": MESSAGE_MODERATION_SWEEP_LEASE_SECONDS
+        }).execute()
+        return sum(self.submit(message) for message in result.data or [])
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "approved": self.approved,
+            "flagged": self.flagged,
+            "deferred": self.deferred,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 1) if lags else None,
+            "lag_p95_ms": round(lags[int(len(lags) * 0.95)] * 1000, 1) if lags else None,
+            "lag_max_ms": round(lags[-1] * 1000, 1) if lags else None
+        }
+
+# Global message moderation pipeline
+message_moderation = MessageModerationPipeline()
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import hashlib
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Risk at or below which content is accepted locally, and at or above which
+# it is rejected locally; anything in between is escalated to the LLM
+MODERATION_SAFE_BELOW = float(os.getenv("MODERATION_SAFE_BELOW", "0.2"))
+MODERATION_FLAG_ABOVE = float(os.getenv("MODERATION_FLAG_ABOVE", "0.8"))
+# Optional JSON file replacing DEFAULT_TERMS: {"category": {"weight": 0.5, "terms": [...]}}
+MODERATION_TERMS_PATH = os.getenv("MODERATION_TERMS_PATH")
+# Bump when terms, thresholds or the LLM prompt change so cached verdicts are not reused
+MODERATION_POLICY_VERSION = os.getenv("MODERATION_POLICY_VERSION", "1")
+
+# Terms match whole words; a trailing "*" makes the term a stem that also
+# matches longer words starting with it (inflected forms)
+DEFAULT_TERMS = {
+    "profanity": {
+        "weight": 0.5,
+        "terms": ["хуй*", "хуе*", "пизд*", "ебат*", "ебан*", "бляд*", "сука", "суки", "fuck*", "shit*", "bitch*"]
+    },
+    "insult": {
+        "weight": 0.5,
+        "terms": ["урод*", "дебил*", "идиот*", "тупая", "тупой", "шлюх*", "мразь", "idiot*", "stupid", "loser", "whore*"]
+    },
+    "sexual": {
+        "weight": 0.7,
+        "terms": ["секс за деньги", "интим услуг*", "nudes", "нюдсы", "onlyfans", "эскорт*", "escort*"]
+    },
+    "scam": {
+        "weight": 0.6,
+        "terms": ["перевод на карту", "переведи деньги", "скинь деньги", "криптовалют*", "инвестиц*",
+                  "ставки на спорт", "казино", "заработок без вложений", "western union", "bitcoin*", "crypto*",
+                  "investment*", "gift card*"]
+    },
+    "spam": {
+        "weight": 0.4,
+        "terms": ["spam", "scam", "fake", "bot", "промокод*", "подпишись", "переходи по ссылке", "subscribe", "promo code*"]
+    }
+}
+
+# Contact details and off-platform links
+PATTERNS = {
+    "phone": (re.compile(r"(?<!\d)(?:\+\d{1,3}|8)?[\s\-(]*\d{3}[\s\-)]*\d{3}[\s\-]*\d{2}[\s\-]*\d{2}(?!\d)"), 0.9),
+    "email": (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), 0.9),
+    "telegram_link": (re.compile(r"\b(?:t\.me|telegram\.me)/\w+", re.IGNORECASE), 0.9),
+    # "тг: maria_k", "telegram @maria_k" (could also be a harmless mention)
+    "telegram": (re.compile(r"\b(?:телеграм\w*|телега|тг|telegram|tg)\W{0,3}@?[A-Za-z]\w{4,31}\b", re.IGNORECASE), 0.6),
+    "link": (re.compile(r"https?://\S+|www\.\S+|\b[\w-]+\.(?:ru|com|net|org|me|io|su|рф)\b", re.IGNORECASE), 0.6),
+    "handle": (re.compile(r"(?<![\w.])@[A-Za-z]\w{4,31}\b"), 0.5)
+}
+
+def normalize(text: str) -> str:
+    """Lowercase, fold ё and collapse whitespace before term matching"""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+def verdict_cache_key(content: str, content_type: str) -> str:
+    """Cache key for a verdict: normalized content hash, content type and policy version"""
+    digest = hashlib.blake2b(normalize(content).encode(), digest_size=16).hexdigest()
+    return f"{MODERATION_POLICY_VERSION}:{content_type}:{digest}"
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text for all terms"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        # Trie as parallel lists: goto transitions, failure links, outputs
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        for term, label in patterns:
+            self._add(term, label)
+        self._build()
+
+    def _add(self, term: str, label: Any):
+        node = 0
+        for char in term:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((term, label))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, str, Any]]:
+        """All matches as (start, term, label)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                for term, label in out[node]:
+                    matches.append((i - len(term) + 1, term, label))
+        return matches
+
+class ModerationResult:
+    """Local verdict: combined risk, matched categories and whether the LLM should decide"""
+    __slots__ = ("risk", "categories", "matches")
+
+    def __init__(self, risk: float, categories: List[str], matches: List[str]):
+        self.risk = risk
+        self.categories = categories
+        self.matches = matches
+
+    @property
+    def uncertain(self) -> bool:
+        return MODERATION_SAFE_BELOW < self.risk < MODERATION_FLAG_ABOVE
+
+    def to_verdict(self) -> Dict:
+        # Only risk at or above the uncertain band is rejected locally
+        is_safe = self.risk < MODERATION_FLAG_ABOVE
+        return {
+            "is_safe": is_safe,
+            "reason": ", ".join(self.categories) if self.categories else "clean",
+            "confidence": round(1 - self.risk if is_safe else self.risk, 3),
+            "categories": self.categories,
+            "source": "local"
+        }
+
+class ModerationEngine:
+    """First-pass moderation: term matcher plus contact/link detectors with a 0-1 risk score"""
+
+    def __init__(self, terms: Optional[Dict[str, Dict]] = None):
+        terms = terms or self._load_terms()
+        self.weights = {category: float(spec["weight"]) for category, spec in terms.items()}
+        self.weights.update({name: weight for name, (_, weight) in PATTERNS.items()})
+        self.matcher = AhoCorasick(
+            (normalize(term.rstrip("*")), (category, term.endswith("*")))
+            for category, spec in terms.items()
+            for term in spec["terms"]
+        )
+
+    @staticmethod
+    def _load_terms() -> Dict[str, Dict]:
+        if MODERATION_TERMS_PATH:
+            try:
+                with open(MODERATION_TERMS_PATH, encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️ Moderation terms file unavailable, using defaults: {e}")
+        return DEFAULT_TERMS
+
+    def analyze(self, content: str) -> ModerationResult:
+        text = normalize(content)
+        found: Dict[str, List[str]] = {}
+        for start, term, (category, is_stem) in self.matcher.find(text):
+            # Terms must start a word; whole-word terms must also end one
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            end = start + len(term)
+            if not is_stem and end < len(text) and text[end].isalnum():
+                continue
+            found.setdefault(category, []).append(term)
+        for name, (pattern, _) in PATTERNS.items():
+            match = pattern.search(content)
+            if match:
+                found.setdefault(name, []).append(match.group(0))
+
+        # Independent signals: risk = 1 - prod(1 - weight); repeats of a category count once
+        safe = 1.0
+        for category in found:
+            safe *= 1 - self.weights[category]
+        risk = round(1 - safe, 4)
+        return ModerationResult(risk, sorted(found), [m for hits in found.values() for m in hits])
+
+# Global moderation engine
+moderation_engine = ModerationEngine()
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from utils.db import db
+
+# admin_settings row holding per-tier limits as JSON (merged over DEFAULT_QUOTA_LIMITS)
+QUOTA_SETTING_KEY = "quota_limits"
+# Unsaved daily usage is added to user_quotas (and totals and limits re-read) this often
+QUOTA_PERSIST_SECONDS = int(os.getenv("QUOTA_PERSIST_SECONDS", "30"))
+# Tier and timezone are re-read from users after this long (premium can change)
+QUOTA_PROFILE_TTL_SECONDS = int(os.getenv("QUOTA_PROFILE_TTL_SECONDS", "300"))
+# Users whose quota state is kept in memory (least recently used are dropped)
+QUOTA_MAX_USERS = int(os.getenv("QUOTA_MAX_USERS", "100000"))
+# Used for users without a (valid) timezone
+QUOTA_DEFAULT_TIMEZONE = os.getenv("QUOTA_DEFAULT_TIMEZONE", "Europe/Moscow")
+
+# Counters reset at midnight in the user's timezone
+DAILY_FEATURES = ("super_likes", "likes", "undos")
+# Token buckets refilled continuously: feature -> period in seconds the limit applies to
+RATE_FEATURES = {"messages": 60}
+
+# None means unlimited
+DEFAULT_QUOTA_LIMITS = {
+    "free": {"super_likes": 1, "likes": None, "undos": None, "messages": None},
+    "premium": {"super_likes": None, "likes": None, "undos": None, "messages": None}
+}
+
+@lru_cache(maxsize=512)
+def resolve_timezone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or QUOTA_DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(QUOTA_DEFAULT_TIMEZONE)
+
+class UserQuota:
+    """One user's tier, timezone, daily counters and rate buckets"""
+    __slots__ = ("tier", "timezone", "loaded_at", "daily", "buckets")
+
+    def __init__(self, tier: str, timezone: ZoneInfo):
+        self.tier = tier
+        self.timezone = timezone
+        self.loaded_at = time.monotonic()
+        # feature -> [local date, used]
+        self.daily: Dict[str, List] = {}
+        # feature -> [tokens, monotonic time of last refill]
+        self.buckets: Dict[str, List[float]] = {}
+
+    def today(self) -> date:
+        return datetime.now(self.timezone).date()
+
+    def day_start(self) -> datetime:
+        """Midnight of the user's current local day"""
+        return datetime.now(self.timezone).replace(hour=0, minute=0, second=0, microsecond=0)
+
+class QuotaService:
+    """Per-user feature limits checked in memory.
+
+    Daily features (super likes, likes, undos) are counters for the user's
+    local day; messages use a token bucket. State is loaded lazily in one
+    query (tier, timezone and persisted counters). Every
+    QUOTA_PERSIST_SECONDS each worker adds its unsaved usage to user_quotas
+    as deltas (add_quota_usage) and adopts the resulting totals, so workers
+    never overwrite each other's counts. Between flushes a worker does not
+    see usage taken on other workers, so a daily limit can be exceeded by
+    that much; the paid super like limit is also checked by record_swipe.
+    """
+
+    def __init__(self, max_users: int = QUOTA_MAX_USERS):
+        self.max_users = max_users
+        self.limits: Dict[str, Dict[str, Optional[int]]] = {
+            tier: dict(features) for tier, features in DEFAULT_QUOTA_LIMITS.items()
+        }
+        self._users: "OrderedDict[str, UserQuota]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        # user_id -> {(feature, local date): usage delta} not yet added to user_quotas
+        self._dirty: Dict[str, Dict[Tuple[str, date], int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.allowed = 0
+        self.rejected = 0
+        self.persisted = 0
+
+    async def start(self):
+        await self.refresh_limits()
+        self._task = asyncio.create_task(self._persist_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def refresh_limits(self):
+        """Re-read per-tier limits from admin_settings"""
+        try:
+            result = await db.table("admin_settings").select("setting_value").eq("setting_key", QUOTA_SETTING_KEY).execute()
+            configured = json.loads(result.data[0]["setting_value"] or "{}") if result.data else {}
+            limits = {tier: dict(features) for tier, features in DEFAULT_QUOTA_LIMITS.items()}
+            for tier, features in configured.items():
+                limits.setdefault(tier, {}).update(features)
+            self.limits = limits
+        except Exception as e:
+            print(f"Quota limits refresh error: {e}")
+
+    def limit(self, tier: str, feature: str) -> Optional[int]:
+        return self.limits.get(tier, self.limits["free"]).get(feature)
+
+    async def day_start(self, user_id: str) -> str:
+        """Start of the user's local day as an ISO timestamp (for checks run in the database)"""
+        state = await self._get(user_id)
+        return state.day_start().isoformat()
+
+    async def _get(self, user_id: str) -> UserQuota:
+        state = self._users.get(user_id)
+        if state is not None:
+            self._users.move_to_end(user_id)
+            if time.monotonic() - state.loaded_at > QUOTA_PROFILE_TTL_SECONDS:
+                await self._refresh_profile(user_id, state)
+            return state
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            state = await self._load(user_id)
+            self._users[user_id] = state
+            while len(self._users) > self.max_users:
+                # Unsaved counters stay in _dirty until the next flush
+                self._users.popitem(last=False)
+            future.set_result(state)
+            return state
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._loading[user_id]
+
+    async def _load(self, user_id: str) -> UserQuota:
+        result = await db.table("users").select("is_premium, timezone, user_quotas(feature, window_date, used)").eq("id", user_id).execute()
+        row = result.data[0] if result.data else {}
+        state = UserQuota("premium" if row.get("is_premium") else "free", resolve_timezone(row.get("timezone")))
+        for counter in row.get("user_quotas") or []:
+            self._sync_counter(user_id, state, counter)
+        # Usage of an evicted user that has not been flushed yet for a newer day
+        for (feature, day), delta in self._dirty.get(user_id, {}).items():
+            window = state.daily.get(feature)
+            if window is None or window[0] < day:
+                state.daily[feature] = [day, max(delta, 0)]
+        return state
+
+    async def _refresh_profile(self, user_id: str, state: UserQuota):
+        """Re-read tier, timezone and the counters other workers have persisted"""
+        state.loaded_at = time.monotonic()
+        try:
+            result = await db.table("users").select("is_premium, timezone, user_quotas(feature, window_date, used)").eq("id", user_id).execute()
+            if result.data:
+                state.tier = "premium" if result.data[0].get("is_premium") else "free"
+                state.timezone = resolve_timezone(result.data[0].get("timezone"))
+                for counter in result.data[0].get("user_quotas") or []:
+                    self._sync_counter(user_id, state, counter)
+        except Exception as e:
+            print(f"Quota profile refresh error: {e}")
+
+    def _sync_counter(self, user_id: str, state: UserQuota, counter: dict):
+        """Adopt a persisted total plus this worker's usage not yet added to it"""
+        day = date.fromisoformat(counter["window_date"])
+        window = state.daily.get(counter["feature"])
+        if window is not None and window[0] > day:
+            # This worker already counts a later day than the table has seen
+            return
+        unsaved = self._dirty.get(user_id, {}).get((counter["feature"], day), 0)
+        state.daily[counter["feature"]] = [day, max(counter["used"] + unsaved, 0)]
+
+    def invalidate(self, user_id: str):
+        """Re-read tier and timezone on the user's next check (after an upgrade or profile edit)"""
+        state = self._users.get(user_id)
+        if state is not None:
+            state.loaded_at = 0
+
+    async def consume(self, user_id: str, feature: str, amount: int = 1) -> bool:
+        """Take `amount` from the user's quota; False (nothing taken) if it would be exceeded"""
+        state = await self._get(user_id)
+        limit = self.limit(state.tier, feature)
+        if feature in RATE_FEATURES:
+            allowed = self._take_tokens(state, feature, limit, amount)
+        else:
+            allowed = self._count(user_id, state, feature, limit, amount)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return allowed
+
+    async def consume_all(self, user_id: str, features: Iterable[str]) -> Optional[str]:
+        """Consume one of each feature; returns the first exhausted feature (after refunding the rest) or None"""
+        taken = []
+        for feature in features:
+            if not await self.consume(user_id, feature):
+                for previous in taken:
+                    self.refund(user_id, previous)
+                return feature
+            taken.append(feature)
+        return None
+
+    def refund(self, user_id: str, feature: str, amount: int = 1):
+        """Give back usage for an action that did not happen"""
+        state = self._users.get(user_id)
+        if state is None:
+            return
+        if feature in RATE_FEATURES:
+            bucket = state.buckets.get(feature)
+            if bucket is not None:
+                bucket[0] += amount
+            return
+        window = state.daily.get(feature)
+        if window is not None and window[0] >= state.today():
+            window[1] = max(window[1] - amount, 0)
+            self._add_usage(user_id, feature, window[0], -amount)
+
+    def _count(self, user_id: str, state: UserQuota, feature: str, limit: Optional[int], amount: int) -> bool:
+        today = state.today()
+        window = state.daily.get(feature)
+        # Only a later local day opens a new window: switching to a timezone
+        # that is behind must not hand out the same day's allowance again
+        if window is None or window[0] < today:
+            window = state.daily[feature] = [today, 0]
+        if limit is not None and window[1] + amount > limit:
+            return False
+        window[1] += amount
+        self._add_usage(user_id, feature, window[0], amount)
+        return True
+
+    def _add_usage(self, user_id: str, feature: str, day: date, delta: int):
+        unsaved = self._dirty.setdefault(user_id, {})
+        unsaved[(feature, day)] = unsaved.get((feature, day), 0) + delta
+
+    @staticmethod
+    def _take_tokens(state: UserQuota, feature: str, limit: Optional[int], amount: int) -> bool:
+        if limit is None:
+            return True
+        now = time.monotonic()
+        bucket = state.buckets.get(feature)
+        if bucket is None:
+            bucket = state.buckets[feature] = [float(limit), now]
+        tokens = min(float(limit), bucket[0] + (now - bucket[1]) * limit / RATE_FEATURES[feature])
+        bucket[1] = now
+        if tokens < amount:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - amount
+        return True
+
+    async def remaining(self, user_id: str) -> Dict[str, Optional[int]]:
+        """Remaining allowance per feature (None = unlimited)"""
+        state = await self._get(user_id)
+        today = state.today()
+        remaining = {}
+        for feature in DAILY_FEATURES:
+            limit = self.limit(state.tier, feature)
+            window = state.daily.get(feature)
+            used = window[1] if window is not None and window[0] >= today else 0
+            remaining[feature] = None if limit is None else max(limit - used, 0)
+        for feature, period in RATE_FEATURES.items():
+            limit = self.limit(state.tier, feature)
+            bucket = state.buckets.get(feature)
+            if limit is None:
+                remaining[feature] = None
+            elif bucket is None:
+                remaining[feature] = limit
+            else:
+                remaining[feature] = int(min(float(limit), bucket[0] + (time.monotonic() - bucket[1]) * limit / period))
+        return remaining
+
+    async def _persist_loop(self):
+        while True:
+            await asyncio.sleep(QUOTA_PERSIST_SECONDS)
+            await self.flush()
+            await self.refresh_limits()
+
+    async def flush(self):
+        """Add all unsaved usage to user_quotas in one request and adopt the new totals"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        # One row per counter: usage of a day older than the newest one is obsolete
+        latest: Dict[Tuple[str, str], Tuple[date, int]] = {}
+        for user_id, unsaved in dirty.items():
+            for (feature, day), delta in unsaved.items():
+                current = latest.get((user_id, feature))
+                if current is None or current[0] < day:
+                    latest[(user_id, feature)] = (day, delta)
+        rows = [
+            {"user_id": user_id, "feature": feature, "window_date": day.isoformat(), "delta": delta}
+            for (user_id, feature), (day, delta) in sorted(latest.items())
+        ]
+        try:
+            result = await db.rpc("add_quota_usage", {"p_rows": rows}).execute()
+            self.persisted += len(rows)
+        except Exception as e:
+            print(f"Quota persist error: {e}")
+            # Keep them for the next attempt, merged with usage taken meanwhile
+            for user_id, unsaved in dirty.items():
+                for (feature, day), delta in unsaved.items():
+                    self._add_usage(user_id, feature, day, delta)
+            return
+        for counter in result.data or []:
+            state = self._users.get(counter["user_id"])
+            if state is not None:
+                self._sync_counter(counter["user_id"], state, counter)
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._users),
+            "dirty_counters": sum(len(unsaved) for unsaved in self._dirty.values()),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "persisted": self.persisted,
+            "limits": self.limits
+        }
+
+# Global quota service
+quotas = QuotaService()
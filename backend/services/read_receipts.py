@@ -0,0 +1,117 @@
+import os
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from utils.db import db
+from services.realtime import realtime
+
+# How long receipts for one match are coalesced before a single bulk update
+READ_RECEIPT_WINDOW_MS = int(os.getenv("READ_RECEIPT_WINDOW_MS", "500"))
+# Flush early once this many message ids are pending for one match
+READ_RECEIPT_MAX_PENDING = 200
+
+class ReadReceiptBuffer:
+    """Coalesces read receipts per (reader, match) and flushes each group in one update.
+
+    The first receipt for a group starts a READ_RECEIPT_WINDOW_MS timer; later
+    receipts join the pending set. The flush calls mark_messages_read (which
+    also lowers the reader's inbox unread counter) and pushes a `read` event
+    with the marked ids to the other participant.
+    """
+
+    def __init__(self, window_ms: int = READ_RECEIPT_WINDOW_MS):
+        self.window_ms = window_ms
+        self._pending: Dict[Tuple[str, str], Set[str]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        # Other participant per group when the caller already knows it
+        self._peers: Dict[Tuple[str, str], str] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        self.received = 0
+        self.flushed_batches = 0
+        self.marked = 0
+
+    def add(self, reader_id: str, match_id: str, message_ids: Iterable[str],
+            other_user_id: Optional[str] = None):
+        key = (reader_id, match_id)
+        if other_user_id:
+            self._peers[key] = other_user_id
+        pending = self._pending.setdefault(key, set())
+        before = len(pending)
+        pending.update(message_id for message_id in message_ids if self._is_uuid(message_id))
+        self.received += len(pending) - before
+
+        if len(pending) >= READ_RECEIPT_MAX_PENDING:
+            self._schedule_flush(key)
+        elif key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window_ms / 1000, self._schedule_flush, key)
+
+    @staticmethod
+    def _is_uuid(value: str) -> bool:
+        try:
+            uuid.UUID(value)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    def _schedule_flush(self, key: Tuple[str, str]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        message_ids = self._pending.pop(key, None)
+        other_user_id = self._peers.pop(key, None)
+        if not message_ids:
+            return
+        task = asyncio.create_task(self._flush(key, message_ids, other_user_id))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, key: Tuple[str, str], message_ids: Set[str], other_user_id: Optional[str]):
+        reader_id, match_id = key
+        try:
+            result = await db.rpc("mark_messages_read", {
+                "p_match_id": match_id,
+                "p_user_id": reader_id,
+                "p_message_ids": sorted(message_ids)
+            }).execute()
+            marked = result.data or []
+            self.flushed_batches += 1
+            self.marked += len(marked)
+            if marked:
+                other_user_id = other_user_id or await self._other_participant(reader_id, match_id)
+                if other_user_id:
+                    await realtime.publish([other_user_id], {
+                        "type": "read",
+                        "match_id": match_id,
+                        "reader_id": reader_id,
+                        "message_ids": marked,
+                        "read_at": datetime.now().isoformat()
+                    })
+        except Exception as e:
+            print(f"Read receipt flush error: {e}")
+
+    @staticmethod
+    async def _other_participant(reader_id: str, match_id: str) -> Optional[str]:
+        result = await db.table("match_inbox").select("other_user_id").eq("user_id", reader_id).eq("match_id", match_id).execute()
+        return result.data[0]["other_user_id"] if result.data else None
+
+    async def flush_all(self):
+        """Flush every pending group now (used on shutdown)"""
+        for key in list(self._pending):
+            self._schedule_flush(key)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending_groups": len(self._pending),
+            "pending_ids": sum(len(ids) for ids in self._pending.values()),
+            "received": self.received,
+            "flushed_batches": self.flushed_batches,
+            "marked": self.marked
+        }
+
+# Global read receipt buffer
+read_receipts = ReadReceiptBuffer()
@@ -0,0 +1,150 @@
+import os
+import json
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Optional, Set
+
+# "memory" delivers within this process only; "redis" fans out across workers
+REALTIME_BROKER = os.getenv("REALTIME_BROKER", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Events buffered per connection before a slow client is disconnected
+REALTIME_SEND_QUEUE_SIZE = int(os.getenv("REALTIME_SEND_QUEUE_SIZE", "256"))
+
+CHANNEL_PREFIX = "realtime:user:"
+
+class Broker(ABC):
+    """Pub/sub transport between workers; subclasses deliver events to `dispatch`"""
+
+    async def start(self, dispatch: Callable[[str, Dict], None]):
+        self.dispatch = dispatch
+
+    @abstractmethod
+    async def publish(self, user_id: str, event: Dict):
+        ...
+
+    async def close(self):
+        pass
+
+class InProcessBroker(Broker):
+    """Single-worker broker: publishing is a direct local dispatch"""
+
+    async def publish(self, user_id: str, event: Dict):
+        self.dispatch(user_id, event)
+
+class RedisBroker(Broker):
+    """Multi-worker broker over Redis pub/sub (needs the optional `redis` package)"""
+
+    def __init__(self, url: str = REDIS_URL):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, dispatch: Callable[[str, Dict], None]):
+        await super().start(dispatch)
+        pubsub = self.redis.pubsub()
+        await pubsub.psubscribe(CHANNEL_PREFIX + "*")
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for item in pubsub.listen():
+            if item.get("type") != "pmessage":
+                continue
+            channel = item["channel"].decode() if isinstance(item["channel"], bytes) else item["channel"]
+            self.dispatch(channel[len(CHANNEL_PREFIX):], json.loads(item["data"]))
+
+    async def publish(self, user_id: str, event: Dict):
+        await self.redis.publish(CHANNEL_PREFIX + user_id, json.dumps(event, default=str))
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+        await self.redis.close()
+
+def create_broker() -> Broker:
+    if REALTIME_BROKER == "redis":
+        try:
+            return RedisBroker()
+        except Exception as e:
+            print(f"⚠️ Redis realtime broker unavailable, using in-process delivery: {e}")
+    return InProcessBroker()
+
+class Connection:
+    """One WebSocket client: a bounded send queue drained by its own writer task"""
+
+    def __init__(self, websocket, user_id: str, queue_size: int = REALTIME_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # match_id -> other participant, for authorizing client events
+        self.matches: Dict[str, str] = {}
+        self.overflowed = False
+
+    def push(self, event: Dict) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+    async def writer(self):
+        while not self.overflowed:
+            event = await self.queue.get()
+            await self.websocket.send_text(json.dumps(event, default=str))
+        # Too slow to keep up: close so the client reconnects and refetches history
+        await self.websocket.close(code=1013)
+
+class RealtimeHub:
+    """Routes events to the WebSocket connections of their recipient users"""
+
+    def __init__(self, broker: Optional[Broker] = None):
+        self.broker = broker or create_broker()
+        self._connections: Dict[str, Set[Connection]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self):
+        await self.broker.start(self._dispatch)
+
+    async def stop(self):
+        await self.broker.close()
+
+    def register(self, connection: Connection):
+        self._connections.setdefault(connection.user_id, set()).add(connection)
+
+    def unregister(self, connection: Connection):
+        connections = self._connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.user_id]
+
+    async def publish(self, user_ids: Iterable[str], event: Dict):
+        """Send an event to every connection of the given users (on any worker)"""
+        for user_id in set(user_ids):
+            self.published += 1
+            try:
+                await self.broker.publish(user_id, event)
+            except Exception as e:
+                print(f"Realtime publish error: {e}")
+
+    def _dispatch(self, user_id: str, event: Dict):
+        for connection in self._connections.get(user_id, ()):
+            if connection.push(event):
+                self.delivered += 1
+            else:
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "broker": type(self.broker).__name__,
+            "online_users": len(self._connections),
+            "connections": sum(len(c) for c in self._connections.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped
+        }
+
+# Global realtime hub
+realtime = RealtimeHub()
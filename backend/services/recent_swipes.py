@@ -0,0 +1,130 @@
+import os
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from utils.db import db
+
+# Swipes per user that can be undone step by step
+RECENT_SWIPES_DEPTH = int(os.getenv("RECENT_SWIPES_DEPTH", "10"))
+# Users whose buffers are kept in memory (least recently used are dropped)
+RECENT_SWIPES_MAX_USERS = int(os.getenv("RECENT_SWIPES_MAX_USERS", "50000"))
+
+class RecentSwipe:
+    __slots__ = ("history_id", "swiped_user_id", "action", "created_at")
+
+    def __init__(self, history_id: str, swiped_user_id: str, action: str, created_at: Optional[str]):
+        self.history_id = history_id
+        self.swiped_user_id = swiped_user_id
+        self.action = action
+        self.created_at = created_at
+
+class RecentSwipeStore:
+    """Per-user ring buffers of the last RECENT_SWIPES_DEPTH swipes, backed by swipe_history.
+
+    Buffers are loaded lazily with one indexed query and kept current by
+    `push`. `undo` pops entries and hands their history ids to undo_swipes,
+    which charges coins and deletes the rows in one transaction. If another
+    worker recorded newer swipes the database answers 'stale' and the buffer
+    is rebuilt from the table before one retry.
+    """
+
+    def __init__(self, depth: int = RECENT_SWIPES_DEPTH, max_users: int = RECENT_SWIPES_MAX_USERS):
+        self.depth = depth
+        self.max_users = max_users
+        self._buffers: "OrderedDict[str, deque]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.undone = 0
+        self.reloads = 0
+
+    async def get(self, user_id: str) -> deque:
+        """Return the user's buffer (oldest first), loading it from swipe_history if not cached"""
+        buffer = self._buffers.get(user_id)
+        if buffer is not None:
+            self._buffers.move_to_end(user_id)
+            return buffer
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            buffer = await self._load(user_id)
+            self._buffers[user_id] = buffer
+            while len(self._buffers) > self.max_users:
+                self._buffers.popitem(last=False)
+            future.set_result(buffer)
+            return buffer
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._loading[user_id]
+
+    async def _load(self, user_id: str) -> deque:
+        result = await db.table("swipe_history").select("id, swiped_user_id, action, created_at").eq("user_id", user_id).order("created_at", desc=True).limit(self.depth).execute()
+        rows = reversed(result.data or [])
+        return deque(
+            (RecentSwipe(row["id"], row["swiped_user_id"], row["action"], row["created_at"]) for row in rows),
+            maxlen=self.depth
+        )
+
+    def push(self, user_id: str, history_id: Optional[str], swiped_user_id: str, action: str,
+             created_at: Optional[str] = None):
+        """Record a new swipe; no-op when the buffer is not cached (it will be rebuilt from the DB)"""
+        buffer = self._buffers.get(user_id)
+        if buffer is not None and history_id:
+            buffer.append(RecentSwipe(history_id, swiped_user_id, action, created_at))
+
+    def discard(self, user_id: str):
+        self._buffers.pop(user_id, None)
+
+    async def undo(self, user_id: str, steps: int = 1, coin_cost: int = 0) -> Dict:
+        """Undo the user's last `steps` swipes atomically; returns the undo_swipes result"""
+        outcome: Dict = {"status": "not_found", "undone": []}
+        for attempt in range(2):
+            buffer = await self.get(user_id)
+            if len(buffer) < steps and attempt == 0:
+                # Earlier undos may have drained it while older swipes remain in the table
+                self.discard(user_id)
+                self.reloads += 1
+                buffer = await self.get(user_id)
+            entries: List[RecentSwipe] = [buffer.pop() for _ in range(min(steps, len(buffer)))]
+            if not entries:
+                return outcome
+
+            try:
+                result = await db.rpc("undo_swipes", {
+                    "p_user_id": user_id,
+                    "p_history_ids": [entry.history_id for entry in entries],
+                    "p_coin_cost": coin_cost
+                }).execute()
+            except Exception:
+                buffer.extend(reversed(entries))
+                raise
+            outcome = result.data or outcome
+
+            if outcome.get("status") == "undone":
+                self.undone += len(outcome.get("undone") or [])
+                return outcome
+            if outcome.get("status") == "insufficient_coins":
+                buffer.extend(reversed(entries))
+                return outcome
+            # 'stale' or 'not_found': history changed elsewhere; rebuild from the table and retry
+            self.discard(user_id)
+            self.reloads += 1
+        return outcome
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._buffers),
+            "depth": self.depth,
+            "undone": self.undone,
+            "reloads": self.reloads
+        }
+
+# Global recent-swipe store
+recent_swipes = RecentSwipeStore()
@@ -0,0 +1,228 @@
+import os
+import json
+import fcntl
+import gzip
+import time
+import shutil
+import socket
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.db import db
+
+# Segment files are written under SWIPE_LOG_DIR/segments, archived to SWIPE_LOG_DIR/archive
+SWIPE_LOG_DIR = Path(os.getenv("SWIPE_LOG_DIR", str(Path(__file__).resolve().parent.parent / "data" / "swipe_log")))
+# Buffered events are appended to their segment this often, or as soon as this many are pending
+SWIPE_LOG_FLUSH_MS = int(os.getenv("SWIPE_LOG_FLUSH_MS", "200"))
+SWIPE_LOG_FLUSH_MAX_EVENTS = int(os.getenv("SWIPE_LOG_FLUSH_MAX_EVENTS", "5000"))
+# Compaction pass interval; an hourly segment is compacted once its hour ended this long ago
+SWIPE_LOG_COMPACT_SECONDS = int(os.getenv("SWIPE_LOG_COMPACT_SECONDS", "300"))
+SWIPE_LOG_SEGMENT_GRACE_SECONDS = 300
+# Archived (gzipped) segments are deleted after this many days
+SWIPE_LOG_ARCHIVE_DAYS = int(os.getenv("SWIPE_LOG_ARCHIVE_DAYS", "90"))
+# swipe_history rows older than this are folded into swiped_sets and deleted
+SWIPE_HISTORY_RETENTION_DAYS = int(os.getenv("SWIPE_HISTORY_RETENTION_DAYS", "30"))
+SWIPE_HISTORY_COMPACT_BATCH = 10000
+
+# Segment hours and event timestamps are UTC, like swipe_history.created_at
+SEGMENT_HOUR_FORMAT = "%Y%m%d%H"
+# Event action -> swipe_daily_stats column
+AGGREGATE_COLUMNS = {"like": "likes", "super_like": "super_likes", "pass": "passes", "undo": "undos"}
+
+def segment_hour(name: str) -> datetime:
+    return datetime.strptime(name.split("-", 1)[0], SEGMENT_HOUR_FORMAT).replace(tzinfo=timezone.utc)
+
+def fold_segment(path: Path) -> List[Dict]:
+    """Daily per-user counts for one segment: [{"day", "user_id", "likes", ...}]"""
+    counts: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(AGGREGATE_COLUMNS.values(), 0))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-write
+                continue
+            column = AGGREGATE_COLUMNS.get(event.get("action"))
+            if column:
+                counts[(event["ts"][:10], event["user_id"])][column] += 1
+    return [{"day": day, "user_id": user_id, **columns} for (day, user_id), columns in counts.items()]
+
+class SwipeEventLog:
+    """Append-only, hourly-partitioned log of swipe events on local disk.
+
+    `append` only buffers in memory; a flush task appends pending events to
+    the current hour's segment (one file per hour and worker) every
+    SWIPE_LOG_FLUSH_MS. Segments are partitioned by arrival time, so a late
+    event never reopens a compacted hour. One worker per host (holding the
+    compactor lock file) folds each closed segment into swipe_daily_stats
+    exactly once (add_swipe_daily_stats records the segment name in the same
+    transaction), then gzips it into the archive.
+    It also moves swipe_history rows past the retention window into the
+    compact per-user swiped_sets arrays, keeping the hot table small.
+
+    swipe_history stays the system of record for discovery exclusion,
+    undo and idempotency; this log feeds aggregates and the raw archive.
+    """
+
+    def __init__(self, root: Path = SWIPE_LOG_DIR, flush_ms: int = SWIPE_LOG_FLUSH_MS,
+                 flush_max_events: int = SWIPE_LOG_FLUSH_MAX_EVENTS):
+        self.segments_dir = root / "segments"
+        self.archive_dir = root / "archive"
+        self.flush_ms = flush_ms
+        self.flush_max_events = flush_max_events
+        # Worker-unique suffix so several processes never write the same file
+        self.writer_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._pending: List[Dict] = []
+        self._flush_now: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock_file = None
+        self.appended = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.write_errors = 0
+        self.segments_compacted = 0
+        self.history_compacted = 0
+
+    def start(self):
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self._flush_now = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._compact_loop())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    def append(self, user_id: str, swiped_user_id: str, action: str, ts: Optional[str] = None):
+        """Buffer one event (action: like, super_like, pass or undo)"""
+        self._pending.append({
+            "ts": ts or datetime.now(timezone.utc).isoformat(),
+            "user_id": user_id,
+            "swiped_user_id": swiped_user_id,
+            "action": action
+        })
+        self.appended += 1
+        if len(self._pending) >= self.flush_max_events and self._flush_now is not None:
+            self._flush_now.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Append all buffered events to the current hour's segment"""
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._write, events)
+            self.flushed += len(events)
+            self.flushes += 1
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Swipe log write error: {e}")
+            self._pending = events + self._pending
+
+    def _write(self, events: List[Dict]):
+        name = f"{datetime.now(timezone.utc).strftime(SEGMENT_HOUR_FORMAT)}-{self.writer_id}.jsonl"
+        with open(self.segments_dir / name, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events))
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(SWIPE_LOG_COMPACT_SECONDS)
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Swipe log compaction error: {e}")
+
+    def closed_segments(self) -> List[Path]:
+        """Segments of every worker whose hour (plus a grace period) has passed, oldest first"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=1, seconds=SWIPE_LOG_SEGMENT_GRACE_SECONDS)
+        return sorted(
+            (path for path in self.segments_dir.glob("*.jsonl") if segment_hour(path.name) <= cutoff),
+            key=lambda path: path.name
+        )
+
+    def _is_compactor(self) -> bool:
+        """Whether this worker holds the host's compactor lock (kept until the process exits)"""
+        if self._lock_file is None:
+            lock_file = open(self.segments_dir / ".compactor.lock", "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    async def compact(self):
+        """Fold closed segments into daily aggregates, archive them, and trim swipe_history"""
+        if not self._is_compactor():
+            # Another worker on this host compacts segments; history trimming is safe to share
+            await self.compact_history()
+            return
+        for path in self.closed_segments():
+            rows = await asyncio.to_thread(fold_segment, path)
+            await db.rpc("add_swipe_daily_stats", {"p_segment": path.name, "p_rows": rows}).execute()
+            await asyncio.to_thread(self._archive, path)
+            self.segments_compacted += 1
+        await asyncio.to_thread(self._expire_archive)
+        await self.compact_history()
+
+    def _archive(self, path: Path):
+        with open(path, "rb") as src, gzip.open(self.archive_dir / (path.name + ".gz"), "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        path.unlink()
+
+    def _expire_archive(self):
+        cutoff = time.time() - SWIPE_LOG_ARCHIVE_DAYS * 86400
+        for path in self.archive_dir.glob("*.jsonl.gz"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+
+    async def compact_history(self) -> int:
+        """Move swipe_history rows past the retention window into swiped_sets, in batches"""
+        before = (datetime.now(timezone.utc) - timedelta(days=SWIPE_HISTORY_RETENTION_DAYS)).isoformat()
+        total = 0
+        while True:
+            result = await db.rpc("compact_swipe_history", {
+                "p_before": before,
+                "p_limit": SWIPE_HISTORY_COMPACT_BATCH
+            }).execute()
+            moved = result.data or 0
+            total += moved
+            if moved < SWIPE_HISTORY_COMPACT_BATCH:
+                break
+        self.history_compacted += total
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "write_errors": self.write_errors,
+            "segments": len(list(self.segments_dir.glob("*.jsonl"))) if self.segments_dir.exists() else 0,
+            "compactor": self._lock_file is not None,
+            "segments_compacted": self.segments_compacted,
+            "history_compacted": self.history_compacted
+        }
+
+# Global swipe event log
+swipe_log = SwipeEventLog()
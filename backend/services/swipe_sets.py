@@ -0,0 +1,209 @@
+import os
+import sys
+import asyncio
+import hashlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.db import db
+
+PAGE_SIZE = 1000
+# Users whose swiped-sets are kept in memory (least recently used are dropped)
+MAX_CACHED_USERS = int(os.getenv("SWIPE_SET_MAX_USERS", "50000"))
+# Sets at least this large get a Bloom filter in front of the sorted array
+BLOOM_MIN_SIZE = 1024
+BLOOM_BITS_PER_ITEM = 10
+BLOOM_HASHES = 7
+
+class UserIdInterner:
+    """Maps user UUID strings to dense unsigned integers"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._keys: List[str] = []
+
+    def intern(self, user_id: str) -> int:
+        value = self._ids.get(user_id)
+        if value is None:
+            value = self._ids[user_id] = len(self._keys)
+            self._keys.append(user_id)
+        return value
+
+    def lookup(self, user_id: str) -> Optional[int]:
+        """Return the id without interning (None if never seen)"""
+        return self._ids.get(user_id)
+
+    def key(self, value: int) -> str:
+        return self._keys[value]
+
+class BloomFilter:
+    """Fixed-size Bloom filter over interned integer ids"""
+    __slots__ = ("bits", "size")
+
+    def __init__(self, capacity: int):
+        self.size = max(64, capacity * BLOOM_BITS_PER_ITEM)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: int):
+        digest = hashlib.blake2b(value.to_bytes(4, "little"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(BLOOM_HASHES):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: int):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, value: int) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class SwipedSet:
+    """Sorted uint32 array of interned user ids with an optional Bloom front"""
+    __slots__ = ("interner", "values", "bloom", "_bloom_capacity")
+
+    def __init__(self, interner: UserIdInterner, user_ids: Iterable[str] = ()):
+        self.interner = interner
+        self.values = array("I", sorted({interner.intern(user_id) for user_id in user_ids}))
+        self.bloom: Optional[BloomFilter] = None
+        self._bloom_capacity = 0
+        self._rebuild_bloom()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, user_id: str) -> bool:
+        value = self.interner.lookup(user_id)
+        if value is None:
+            return False
+        if self.bloom is not None and not self.bloom.might_contain(value):
+            return False
+        i = bisect_left(self.values, value)
+        return i < len(self.values) and self.values[i] == value
+
+    def add(self, user_id: str):
+        value = self.interner.intern(user_id)
+        i = bisect_left(self.values, value)
+        if i < len(self.values) and self.values[i] == value:
+            return
+        self.values.insert(i, value)
+        if self.bloom is not None:
+            self.bloom.add(value)
+        if len(self.values) >= max(BLOOM_MIN_SIZE, self._bloom_capacity * 2):
+            self._rebuild_bloom()
+
+    def discard(self, user_id: str):
+        # Bloom bits are left set: a stale bit only costs one extra bisect
+        value = self.interner.lookup(user_id)
+        if value is None:
+            return
+        i = bisect_left(self.values, value)
+        if i < len(self.values) and self.values[i] == value:
+            del self.values[i]
+
+    def _rebuild_bloom(self):
+        if len(self.values) < BLOOM_MIN_SIZE:
+            self.bloom = None
+            self._bloom_capacity = 0
+            return
+        self._bloom_capacity = len(self.values)
+        self.bloom = BloomFilter(self._bloom_capacity * 2)
+        for value in self.values:
+            self.bloom.add(value)
+
+    def memory_bytes(self) -> int:
+        total = sys.getsizeof(self) + sys.getsizeof(self.values)
+        if self.bloom is not None:
+            total += sys.getsizeof(self.bloom.bits)
+        return total
+
+class SwipeSetStore:
+    """Per-user swiped-sets, loaded lazily from swiped_sets and swipe_history and kept current by swipes"""
+
+    def __init__(self, max_users: int = MAX_CACHED_USERS):
+        self.max_users = max_users
+        self.interner = UserIdInterner()
+        self._sets: "OrderedDict[str, SwipedSet]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Swipes (True) and undos (False) made while a user's set is loading,
+        # applied to the loaded set since the load may have missed them
+        self._loading_changes: Dict[str, List[Tuple[bool, str]]] = {}
+
+    async def get(self, user_id: str) -> SwipedSet:
+        """Return the user's swiped-set, rebuilding it from swipe_history if not cached"""
+        swiped = self._sets.get(user_id)
+        if swiped is not None:
+            self._sets.move_to_end(user_id)
+            return swiped
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        changes = self._loading_changes[user_id] = []
+        try:
+            swiped = SwipedSet(self.interner, await self._load(user_id))
+            for added, swiped_user_id in changes:
+                if added:
+                    swiped.add(swiped_user_id)
+                else:
+                    swiped.discard(swiped_user_id)
+            self._store(user_id, swiped)
+            future.set_result(swiped)
+            return swiped
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be awaiting the shared future; mark the exception retrieved
+            future.exception()
+            raise
+        finally:
+            del self._loading[user_id]
+            del self._loading_changes[user_id]
+
+    async def _load(self, user_id: str) -> List[str]:
+        # Swipes past the history retention window were compacted into one array row
+        compacted = await db.table("swiped_sets").select("swiped_user_ids").eq("user_id", user_id).execute()
+        swiped_ids = list(compacted.data[0]["swiped_user_ids"] or []) if compacted.data else []
+        offset = 0
+        while True:
+            result = await db.table("swipe_history").select("swiped_user_id").eq("user_id", user_id).order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+            page = result.data or []
+            swiped_ids.extend(row["swiped_user_id"] for row in page)
+            if len(page) < PAGE_SIZE:
+                return swiped_ids
+            offset += PAGE_SIZE
+
+    def _store(self, user_id: str, swiped: SwipedSet):
+        self._sets[user_id] = swiped
+        self._sets.move_to_end(user_id)
+        while len(self._sets) > self.max_users:
+            self._sets.popitem(last=False)
+
+    def add(self, user_id: str, swiped_user_id: str):
+        """Record a swipe; no-op when the set is not cached (it will be rebuilt from the DB)"""
+        swiped = self._sets.get(user_id)
+        if swiped is not None:
+            swiped.add(swiped_user_id)
+        elif user_id in self._loading_changes:
+            self._loading_changes[user_id].append((True, swiped_user_id))
+
+    def discard(self, user_id: str, swiped_user_id: str):
+        swiped = self._sets.get(user_id)
+        if swiped is not None:
+            swiped.discard(swiped_user_id)
+        elif user_id in self._loading_changes:
+            self._loading_changes[user_id].append((False, swiped_user_id))
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._sets),
+            "interned_ids": len(self.interner._keys),
+            "memory_bytes": sum(s.memory_bytes() for s in self._sets.values())
+        }
+
+# Global swiped-set store
+swipe_sets = SwipeSetStore()
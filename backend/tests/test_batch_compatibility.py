@@ -0,0 +1,113 @@
+import asyncio
+
+from services.ai_service import AIService
+from services.llm_clients import LlmClientPool
+from services.llm_stub import StubLlmChat, UserMessage
+
+parse = AIService._parse_batch_scores
+
+def make_service(latency_ms: int = 0) -> AIService:
+    service = AIService()
+    service.stub = StubLlmChat(latency_ms=latency_ms)
+    service.llm = LlmClientPool(lambda session_id, system_message: service.stub, UserMessage)
+    return service
+
+def make_candidates(count: int):
+    return [
+        {"id": f"candidate_{i}", "bio": f"Кандидат {i}", "interests": ["travel", "music", f"hobby_{i}"]}
+        for i in range(count)
+    ]
+
+USER = {"id": "user", "bio": "Люблю горы и кофе", "interests": ["travel", "music", "coffee"]}
+
+# _parse_batch_scores
+
+def test_parse_scores_object():
+    reply = '{"scores": [{"id": 1, "score": 80}, {"id": 2, "score": 35}]}'
+    assert parse(reply, 2) == {0: 80, 1: 35}
+
+def test_parse_tolerates_code_fences_and_text():
+    reply = 'Here you go:\n```json\n{"scores": [{"id": 2, "score": 70}, {"id": 1, "score": 10}]}\n```\nHope it helps'
+    assert parse(reply, 2) == {0: 10, 1: 70}
+
+def test_parse_id_map_and_plain_list():
+    assert parse('{"1": 80, "2": "65"}', 2) == {0: 80, 1: 65}
+    assert parse("[55, 66, 77]", 3) == {0: 55, 1: 66, 2: 77}
+
+def test_parse_malformed_reply_is_empty():
+    assert parse("", 3) == {}
+    assert parse(None, 3) == {}
+    assert parse("I cannot score these candidates", 3) == {}
+    assert parse('{"scores": [{"id": 1, "score": 80}', 3) == {}
+    assert parse('"just a string"', 3) == {}
+
+def test_parse_partial_reply_keeps_valid_entries():
+    reply = '{"scores": [{"id": 1, "score": 90}, {"id": 3}, {"id": "x", "score": 50}, {"score": 40}, {"id": 2, "score": "high"}]}'
+    assert parse(reply, 3) == {0: 90}
+
+def test_parse_out_of_range_ids_and_scores():
+    reply = '{"scores": [{"id": 0, "score": 50}, {"id": 4, "score": 50}, {"id": 1, "score": 150}, {"id": 2, "score": -20}, {"id": 3, "score": 42.6}]}'
+    assert parse(reply, 3) == {0: 100, 1: 0, 2: 43}
+
+def test_parse_duplicate_ids_keep_first():
+    assert parse('{"scores": [{"id": 1, "score": 10}, {"id": 1, "score": 99}]}', 1) == {0: 10}
+
+# calculate_compatibility_batch
+
+def test_top_k_rescored_within_budget():
+    async def run():
+        service = make_service()
+        candidates = make_candidates(12)
+        local = service.batch_interest_scores(USER["interests"], [c["interests"] for c in candidates])
+
+        scores = await service.calculate_compatibility_batch(USER, candidates, top_k=3, budget_ms=1000)
+
+        # One request covers the top 3; everyone else keeps the local score
+        assert service.stub.calls == 1
+        cached = [await service.compatibility_cache.get(USER, c) for c in candidates]
+        assert sum(score is not None for score in cached) == 3
+        for i, ai_score in enumerate(cached):
+            if ai_score is None:
+                assert scores[i] == local[i]
+            else:
+                assert abs(scores[i] - (local[i] * 0.6 + ai_score * 0.4)) <= 1
+
+    asyncio.run(run())
+
+def test_budget_exceeded_falls_back_to_local_scores():
+    async def run():
+        service = make_service(latency_ms=300)
+        candidates = make_candidates(8)
+        local = service.batch_interest_scores(USER["interests"], [c["interests"] for c in candidates])
+
+        scores = await service.calculate_compatibility_batch(USER, candidates, top_k=5, budget_ms=20)
+
+        assert scores == local
+        # Cancelled requests leave nothing in the cache
+        cached = [await service.compatibility_cache.get(USER, c) for c in candidates]
+        assert cached == [None] * len(candidates)
+
+    asyncio.run(run())
+
+def test_cached_scores_skip_the_llm():
+    async def run():
+        service = make_service()
+        candidates = make_candidates(4)
+        first = await service.calculate_compatibility_batch(USER, candidates, top_k=4, budget_ms=1000)
+        calls = service.stub.calls
+
+        # Even with no time budget left, cached AI scores are still applied
+        second = await service.calculate_compatibility_batch(USER, candidates, top_k=4, budget_ms=0)
+
+        assert second == first
+        assert service.stub.calls == calls
+
+    asyncio.run(run())
+
+def test_no_llm_uses_local_scores():
+    service = AIService()
+    service.llm = None
+    candidates = make_candidates(5)
+    local = service.batch_interest_scores(USER["interests"], [c["interests"] for c in candidates])
+
+    assert asyncio.run(service.calculate_compatibility_batch(USER, candidates)) == local
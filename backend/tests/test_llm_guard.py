@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from services.llm_guard import LlmGuard, LlmUnavailable
+
+COOLDOWN = 0.05
+
+def make_guard(**kwargs) -> LlmGuard:
+    options = {"max_concurrency": 4, "timeout_seconds": 1, "failure_threshold": 3, "cooldown_seconds": COOLDOWN}
+    options.update(kwargs)
+    return LlmGuard(**options)
+
+async def succeed():
+    return "ok"
+
+async def fail():
+    raise RuntimeError("provider error")
+
+async def open_circuit(guard: LlmGuard):
+    for _ in range(guard.failure_threshold):
+        with pytest.raises(RuntimeError):
+            await guard.call(fail)
+
+def test_opens_after_consecutive_failures():
+    async def run():
+        guard = make_guard()
+        for _ in range(guard.failure_threshold - 1):
+            with pytest.raises(RuntimeError):
+                await guard.call(fail)
+        assert guard.state == "closed"
+
+        with pytest.raises(RuntimeError):
+            await guard.call(fail)
+        assert guard.state == "open"
+        assert not guard.available
+        assert guard.circuit_opened == 1
+
+    asyncio.run(run())
+
+def test_success_resets_failure_count():
+    async def run():
+        guard = make_guard()
+        for _ in range(guard.failure_threshold - 1):
+            with pytest.raises(RuntimeError):
+                await guard.call(fail)
+        assert await guard.call(succeed) == "ok"
+        with pytest.raises(RuntimeError):
+            await guard.call(fail)
+        assert guard.state == "closed"
+
+    asyncio.run(run())
+
+def test_open_circuit_fails_fast():
+    async def run():
+        guard = make_guard()
+        await open_circuit(guard)
+        calls = []
+
+        async def operation():
+            calls.append(1)
+            return "ok"
+
+        with pytest.raises(LlmUnavailable):
+            await guard.call(operation)
+        assert calls == []
+        assert guard.rejected == 1
+
+    asyncio.run(run())
+
+def test_half_open_probe_success_closes():
+    async def run():
+        guard = make_guard()
+        await open_circuit(guard)
+        await asyncio.sleep(COOLDOWN * 1.5)
+        assert guard.state == "half_open"
+        assert guard.available
+
+        assert await guard.call(succeed) == "ok"
+        assert guard.state == "closed"
+
+    asyncio.run(run())
+
+def test_half_open_probe_failure_reopens():
+    async def run():
+        guard = make_guard()
+        await open_circuit(guard)
+        await asyncio.sleep(COOLDOWN * 1.5)
+
+        with pytest.raises(RuntimeError):
+            await guard.call(fail)
+        assert guard.state == "open"
+        # Re-opening after a probe is the same outage, not a new one
+        assert guard.circuit_opened == 1
+
+    asyncio.run(run())
+
+def test_half_open_lets_one_probe_through():
+    async def run():
+        guard = make_guard()
+        await open_circuit(guard)
+        await asyncio.sleep(COOLDOWN * 1.5)
+        release = asyncio.Event()
+
+        async def slow_probe():
+            await release.wait()
+            return "ok"
+
+        probe = asyncio.ensure_future(guard.call(slow_probe))
+        await asyncio.sleep(0)
+        assert not guard.available
+        with pytest.raises(LlmUnavailable):
+            await guard.call(succeed)
+
+        release.set()
+        assert await probe == "ok"
+        assert guard.state == "closed"
+
+    asyncio.run(run())
+
+def test_deadline_raises_unavailable_and_counts_as_failure():
+    async def run():
+        guard = make_guard(timeout_seconds=0.02, failure_threshold=2)
+
+        async def hang():
+            await asyncio.sleep(1)
+
+        with pytest.raises(LlmUnavailable):
+            await guard.call(hang)
+        assert guard.timeouts == 1
+        assert guard.state == "closed"
+
+        with pytest.raises(LlmUnavailable):
+            await guard.call(hang, timeout_seconds=0.01)
+        assert guard.timeouts == 2
+        assert guard.state == "open"
+
+    asyncio.run(run())
+
+def test_deadline_includes_waiting_for_a_slot():
+    async def run():
+        guard = make_guard(max_concurrency=1, timeout_seconds=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            await release.wait()
+            return "ok"
+
+        holder = asyncio.ensure_future(guard.call(hold, timeout_seconds=1))
+        await asyncio.sleep(0)
+        with pytest.raises(LlmUnavailable):
+            await guard.call(succeed)
+        assert guard.waiting == 0
+
+        release.set()
+        assert await holder == "ok"
+
+    asyncio.run(run())
+
+def test_concurrency_cap():
+    async def run():
+        guard = make_guard(max_concurrency=2)
+        peak = 0
+
+        async def operation():
+            nonlocal peak
+            peak = max(peak, guard.in_flight)
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        results = await asyncio.gather(*(guard.call(operation) for _ in range(6)))
+        assert results == ["ok"] * 6
+        assert peak == 2
+        assert guard.max_waiting >= 4
+
+    asyncio.run(run())
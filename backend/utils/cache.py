@@ -0,0 +1,83 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+def approximate_size(key: Hashable, value: Any) -> int:
+    """Rough per-entry memory cost used for size-based eviction"""
+    return sys.getsizeof(key) + sys.getsizeof(value) + 64
+
+class LRUCache:
+    """In-memory LRU cache bounded by approximate size in bytes, with optional TTL"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float] = None,
+                 sizeof: Callable[[Hashable, Any], int] = approximate_size):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if key in self._entries:
+            self._remove(key)
+        size = self.sizeof(key, value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        self._entries[key] = (value, size, expires_at)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._remove(key)
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
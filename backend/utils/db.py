@@ -0,0 +1,80 @@
+from supabase import acreate_client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
+from typing import Optional
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+DB_TIMEOUT_SECONDS = int(os.getenv("DB_TIMEOUT_SECONDS", "10"))
+
+class Database:
+    """Async data-access layer shared by all request handlers.
+
+    Holds one long-lived AsyncClient per key. Each client keeps a single
+    httpx.AsyncClient underneath, so PostgREST calls reuse pooled keep-alive
+    connections and awaiting them yields the event loop instead of blocking it.
+    """
+
+    def __init__(self):
+        self.admin: Optional[AsyncClient] = None
+        self.anon: Optional[AsyncClient] = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self.admin is not None
+
+    async def connect(self):
+        """Create the async clients (called once on app startup)"""
+        options = AsyncClientOptions(postgrest_client_timeout=DB_TIMEOUT_SECONDS)
+        try:
+            if SUPABASE_URL and SUPABASE_SERVICE_KEY and self.admin is None:
+                self.admin = await acreate_client(SUPABASE_URL, SUPABASE_SERVICE_KEY, options=options)
+                print("✅ Async Supabase admin initialized")
+            if SUPABASE_URL and SUPABASE_KEY and self.anon is None:
+                self.anon = await acreate_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+                print("✅ Async Supabase client initialized")
+        except Exception as e:
+            print(f"❌ Async Supabase initialization error: {e}")
+
+    async def close(self):
+        """Release pooled connections (called on app shutdown)"""
+        for client in (self.admin, self.anon):
+            if client is None:
+                continue
+            try:
+                await client.postgrest.aclose()
+            except Exception as e:
+                print(f"Database close error: {e}")
+        self.admin = None
+        self.anon = None
+
+    def table(self, name: str):
+        """Start a PostgREST query on the service-role client"""
+        if self.admin is None:
+            raise Exception("Supabase admin not configured")
+        return self.admin.table(name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None):
+        """Call a Postgres function on the service-role client"""
+        if self.admin is None:
+            raise Exception("Supabase admin not configured")
+        return self.admin.rpc(fn, params or {})
+
+    @property
+    def auth(self):
+        if self.admin is None:
+            raise Exception("Supabase admin not configured")
+        return self.admin.auth
+
+    @property
+    def storage(self):
+        if self.admin is None:
+            raise Exception("Supabase admin not configured")
+        return self.admin.storage
+
+# Global database instance
+db = Database()
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+
+from utils.db import db
+
+# Keys per in_() query; keeps the PostgREST URL well under proxy limits
+MAX_BATCH_SIZE = 100
+
+class BatchLoader:
+    """Request-scoped loader that coalesces lookups into one batch call.
+
+    Every `load(key)` issued during the same event loop tick is collected and
+    resolved by a single `batch_fn(keys)` call, which must return a dict
+    mapping key -> value. Results are memoized for the lifetime of the loader.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 default: Any = None, max_batch_size: int = MAX_BATCH_SIZE):
+        self.batch_fn = batch_fn
+        self.default = default
+        self.max_batch_size = max_batch_size
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        # Strong references to in-flight batches; the event loop only keeps weak ones
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> Awaitable[Any]:
+        """Schedule a key for the next batch and return an awaitable for its value"""
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append(key)
+        if len(self._queue) == 1:
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        for i in range(0, len(keys), self.max_batch_size):
+            task = asyncio.ensure_future(self._resolve(keys[i:i + self.max_batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, keys: List[Hashable]):
+        try:
+            values = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                if not self._cache[key].done():
+                    self._cache[key].set_exception(e)
+            return
+        for key in keys:
+            if not self._cache[key].done():
+                self._cache[key].set_result(values.get(key, self.default))
+
+class RequestLoaders:
+    """Batch loaders for one request made on behalf of `viewer_id`"""
+
+    def __init__(self, viewer_id: str):
+        self.viewer_id = viewer_id
+        self.profiles = BatchLoader(self._load_profiles)
+
+    async def _load_profiles(self, user_ids: List[str]) -> Dict[str, dict]:
+        result = await db.table("users").select("*").in_("id", user_ids).execute()
+        return {user["id"]: user for user in result.data or []}
@@ -0,0 +1,24 @@
+import json
+import uuid
+import base64
+from datetime import datetime
+from typing import Dict, Tuple
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque keyset cursor for a message row: (sent_at, id)"""
+    raw = json.dumps([row["sent_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Return (sent_at, id) from a cursor; raises ValueError if malformed.
+
+    Both parts are validated because they are interpolated into PostgREST
+    filter expressions.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sent_at, row_id = json.loads(raw)
+        datetime.fromisoformat(sent_at)
+        return sent_at, str(uuid.UUID(row_id))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
@@ -2,12 +2,15 @@ import { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { ArrowLeft, Send, Image as ImageIcon, Smile, Mic, MoreVertical, Sparkles } from 'lucide-react';
 import { messagesAPI } from '../utils/api';
+import { connectRealtime } from '../utils/realtime';
+import { useAuthStore } from '../stores/authStore';
 import toast from 'react-hot-toast';
 
 const ChatPage = () => {
   const { matchId } = useParams();
   const navigate = useNavigate();
   const messagesEndRef = useRef(null);
+  const { user } = useAuthStore();
   
   const [messages, setMessages] = useState([]);
   const [matchedUser, setMatchedUser] = useState(null);
@@ -16,25 +19,98 @@ const ChatPage = () => {
   const [isSending, setIsSending] = useState(false);
   const [showIcebreaker, setShowIcebreaker] = useState(false);
   const [icebreaker, setIcebreaker] = useState('');
+  const [isPeerTyping, setIsPeerTyping] = useState(false);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [hasOlder, setHasOlder] = useState(false);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+  const initialPageLoadedRef = useRef(false);
+  const [isRealtimeConnected, setIsRealtimeConnected] = useState(false);
+  const realtimeRef = useRef(null);
+  const typingTimeoutRef = useRef(null);
+  // Ids already sent as read receipts
+  const receiptsSentRef = useRef(new Set());
   
   useEffect(() => {
+    initialPageLoadedRef.current = false;
+    setMessages([]);
     loadMessages();
-    const interval = setInterval(loadMessages, 3000);
-    return () => clearInterval(interval);
+    const realtime = connectRealtime((event) => {
+      if (event.match_id !== matchId) return;
+      if (event.type === 'message') {
+        setMessages((prev) => (
+          prev.some((m) => m.id === event.message.id) ? prev : [...prev, event.message]
+        ));
+        setIsPeerTyping(false);
+      } else if (event.type === 'message_hidden') {
+        // Retracted by moderation after it was delivered
+        setMessages((prev) => prev.filter((m) => m.id !== event.message_id));
+      } else if (event.type === 'read') {
+        const readIds = new Set(event.message_ids || []);
+        setMessages((prev) => prev.map((m) => (
+          readIds.has(m.id) ? { ...m, is_read: true } : m
+        )));
+      } else if (event.type === 'typing') {
+        setIsPeerTyping(event.is_typing);
+      }
+    }, (connected) => {
+      setIsRealtimeConnected(connected);
+      // Catch up on anything missed while disconnected
+      if (connected) loadMessages();
+    });
+    realtimeRef.current = realtime;
+    return () => realtime.close();
   }, [matchId]);
 
+  // Send read receipts for incoming messages as they are shown; the server batches them
+  useEffect(() => {
+    if (!user) return;
+    const unread = messages
+      .filter((m) => m.sender_id !== user.id && !m.is_read && !receiptsSentRef.current.has(m.id))
+      .map((m) => m.id);
+    if (unread.length === 0) return;
+    unread.forEach((id) => receiptsSentRef.current.add(id));
+    if (isRealtimeConnected) {
+      realtimeRef.current?.send({ type: 'read', match_id: matchId, message_ids: unread });
+    } else {
+      messagesAPI.markRead(matchId, unread).catch((error) => console.error('Failed to send read receipts:', error));
+    }
+  }, [messages, isRealtimeConnected, user]);
+
+  // Poll only while the real-time connection is down
+  useEffect(() => {
+    if (isRealtimeConnected) return;
+    const interval = setInterval(loadMessages, 10000);
+    return () => clearInterval(interval);
+  }, [matchId, isRealtimeConnected]);
+
+  // Scroll only when a newer message arrives, not when older pages are prepended
+  const newestMessageId = messages[messages.length - 1]?.id;
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [newestMessageId]);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
+  // Merge a page into the (oldest-first) message list without duplicates
+  const mergeMessages = (prev, page) => {
+    const known = new Set(prev.map((m) => m.id));
+    const merged = [...prev, ...page.filter((m) => !known.has(m.id))];
+    return merged.sort((a, b) => new Date(a.sent_at) - new Date(b.sent_at));
+  };
+
   const loadMessages = async () => {
     try {
+      // Latest page, newest first
       const response = await messagesAPI.getMessages(matchId);
-      setMessages(response.data);
+      const { messages: page, has_more, older_cursor } = response.data;
+      if (!initialPageLoadedRef.current) {
+        initialPageLoadedRef.current = true;
+        setOlderCursor(older_cursor);
+        setHasOlder(has_more);
+      }
+      setMessages((prev) => mergeMessages(prev, page));
       setIsLoading(false);
     } catch (error) {
       console.error('Failed to load messages:', error);
@@ -43,6 +119,22 @@ const ChatPage = () => {
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!olderCursor || isLoadingOlder) return;
+    setIsLoadingOlder(true);
+    try {
+      const response = await messagesAPI.getMessages(matchId, { before: olderCursor });
+      const { messages: page, has_more, older_cursor } = response.data;
+      setMessages((prev) => mergeMessages(prev, page));
+      setOlderCursor(older_cursor);
+      setHasOlder(has_more);
+    } catch (error) {
+      toast.error('Не удалось загрузить сообщения');
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!newMessage.trim() || isSending) return;
@@ -55,8 +147,11 @@ const ChatPage = () => {
         message_type: 'text'
       });
       
-      setMessages([...messages, response.data]);
+      setMessages((prev) => (
+        prev.some((m) => m.id === response.data.id) ? prev : [...prev, response.data]
+      ));
       setNewMessage('');
+      sendTyping(false);
     } catch (error) {
       toast.error('Не удалось отправить сообщение');
     } finally {
@@ -64,6 +159,22 @@ const ChatPage = () => {
     }
   };
 
+  const sendTyping = (isTyping) => {
+    realtimeRef.current?.send({ type: 'typing', match_id: matchId, is_typing: isTyping });
+  };
+
+  const handleMessageChange = (e) => {
+    setNewMessage(e.target.value);
+    if (!typingTimeoutRef.current) {
+      sendTyping(true);
+    }
+    clearTimeout(typingTimeoutRef.current);
+    typingTimeoutRef.current = setTimeout(() => {
+      typingTimeoutRef.current = null;
+      sendTyping(false);
+    }, 3000);
+  };
+
   const handleGetIcebreaker = async () => {
     try {
       const response = await messagesAPI.getIcebreaker(matchId);
@@ -134,7 +245,7 @@ const ChatPage = () => {
               {matchedUser?.full_name || 'Пользователь'}
             </h2>
             <p className="text-sm text-gray-500">
-              {matchedUser?.is_online ? 'онлайн' : 'оффлайн'}
+              {isPeerTyping ? 'печатает...' : matchedUser?.is_online ? 'онлайн' : 'оффлайн'}
             </p>
           </div>
         </div>
@@ -146,6 +257,17 @@ const ChatPage = () => {
 
       {/* Messages */}
       <div className="flex-1 overflow-y-auto p-4 space-y-4">
+        {hasOlder && (
+          <div className="text-center">
+            <button
+              onClick={loadOlderMessages}
+              disabled={isLoadingOlder}
+              className="text-sm text-pink-500 hover:text-pink-600 disabled:opacity-50"
+            >
+              {isLoadingOlder ? 'Загружаем...' : 'Показать предыдущие сообщения'}
+            </button>
+          </div>
+        )}
         {messages.length === 0 ? (
           <div className="h-full flex flex-col items-center justify-center text-center px-6">
             <div className="w-20 h-20 bg-gradient-to-br from-pink-500 to-orange-500 rounded-full flex items-center justify-center mb-4">
@@ -245,7 +367,7 @@ const ChatPage = () => {
           <input
             type="text"
             value={newMessage}
-            onChange={(e) => setNewMessage(e.target.value)}
+            onChange={handleMessageChange}
             placeholder="Напишите сообщение..."
             className="flex-1 bg-gray-100 rounded-full px-4 py-2.5 text-sm focus:outline-none focus:ring-2 focus:ring-pink-500"
           />
@@ -13,6 +13,7 @@ const DiscoveryPage = () => {
     isLoadingCards,
     loadDiscoveryCards,
     swipeCard,
+    flushSwipeQueue,
     getCurrentCard
   } = useUserStore();
 
@@ -28,6 +29,20 @@ const DiscoveryPage = () => {
     }
   }, []);
 
+  // Send swipes queued while offline as soon as the connection is back
+  useEffect(() => {
+    const flush = async () => {
+      const result = await flushSwipeQueue();
+      if (result.matches.length > 0) {
+        toast.success(result.matches.length === 1 ? '🎉 Это матч!' : `🎉 Новых матчей: ${result.matches.length}`);
+      }
+    };
+    
+    flush();
+    window.addEventListener('online', flush);
+    return () => window.removeEventListener('online', flush);
+  }, []);
+
   const handleSwipe = async (action) => {
     const currentCard = getCurrentCard();
     if (!currentCard) return;
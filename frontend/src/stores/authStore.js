@@ -56,6 +56,12 @@ export const useAuthStore = create(
             headers: { Authorization: `Bearer ${token}` }
           });
           set({ user: response.data, isLoading: false });
+          
+          // Daily limits reset at local midnight: keep the server's timezone current
+          const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+          if (timezone && response.data.timezone !== timezone) {
+            get().updateProfile({ timezone });
+          }
         } catch (error) {
           set({ user: null, token: null, isLoading: false });
         }
@@ -1,11 +1,30 @@
 import { create } from 'zustand';
 import { discoveryAPI, matchesAPI, usersAPI } from '../utils/api';
 
+// Swipes made offline (or whose request never reached the server) wait here
+// and are sent with one batch request once the connection is back
+const SWIPE_QUEUE_KEY = 'pending-swipes';
+const SWIPE_BATCH_SIZE = 100;
+
+const loadSwipeQueue = () => {
+  try {
+    return JSON.parse(localStorage.getItem(SWIPE_QUEUE_KEY) || '[]');
+  } catch {
+    return [];
+  }
+};
+
+const saveSwipeQueue = (queue) => {
+  localStorage.setItem(SWIPE_QUEUE_KEY, JSON.stringify(queue));
+};
+
 export const useUserStore = create((set, get) => ({
   // Discovery state
   discoveryCards: [],
   currentCardIndex: 0,
   isLoadingCards: false,
+  pendingSwipes: loadSwipeQueue(),
+  isFlushingSwipes: false,
   
   // Matches state
   matches: [],
@@ -34,33 +53,99 @@ export const useUserStore = create((set, get) => ({
   },
 
   swipeCard: async (swipedUserId, action) => {
-    try {
-      const response = await discoveryAPI.swipe({ swiped_user_id: swipedUserId, action });
-      
+    const swipe = {
+      swiped_user_id: swipedUserId,
+      action,
+      idempotency_key: crypto.randomUUID(),
+      client_swiped_at: new Date().toISOString(),
+    };
+    
+    const advance = () => {
       // Move to next card
       const currentIndex = get().currentCardIndex;
       set({ currentCardIndex: currentIndex + 1 });
       
       // Load more cards if running low
       const cards = get().discoveryCards;
-      if (cards.length - currentIndex <= 3) {
+      if (cards.length - currentIndex <= 3 && navigator.onLine) {
         get().loadDiscoveryCards();
       }
-      
+    };
+    
+    if (!navigator.onLine) {
+      get().queueSwipe(swipe);
+      advance();
+      return { success: true, queued: true };
+    }
+    
+    if (get().pendingSwipes.length > 0) {
+      // Keep order: older queued swipes go first, in the same batch request
+      get().queueSwipe(swipe);
+      advance();
+      const result = await get().flushSwipeQueue();
+      const match = result.matches.some((item) => item.swiped_user_id === swipedUserId);
+      return { success: true, queued: !result.success, match };
+    }
+    
+    try {
+      const { client_swiped_at, ...swipeData } = swipe;
+      const response = await discoveryAPI.swipe(swipeData);
+      advance();
       return { success: true, match: response.data.match, message: response.data.message };
     } catch (error) {
+      if (!error.response) {
+        // Network failure: the idempotency key makes a resend safe even if it was recorded
+        get().queueSwipe(swipe);
+        advance();
+        return { success: true, queued: true };
+      }
       return { success: false, error: error.response?.data?.detail || 'Swipe failed' };
     }
   },
 
-  undoSwipe: async () => {
+  queueSwipe: (swipe) => {
+    const pendingSwipes = [...get().pendingSwipes, swipe];
+    saveSwipeQueue(pendingSwipes);
+    set({ pendingSwipes });
+  },
+
+  // Send queued swipes in order; returns the swipes that produced a match
+  flushSwipeQueue: async () => {
+    if (get().isFlushingSwipes || get().pendingSwipes.length === 0) {
+      return { success: true, matches: [] };
+    }
+    set({ isFlushingSwipes: true });
+    const matches = [];
     try {
-      await discoveryAPI.undoSwipe();
-      const currentIndex = get().currentCardIndex;
-      if (currentIndex > 0) {
-        set({ currentCardIndex: currentIndex - 1 });
+      while (get().pendingSwipes.length > 0) {
+        const batch = get().pendingSwipes.slice(0, SWIPE_BATCH_SIZE);
+        const response = await discoveryAPI.swipeBatch(batch);
+        matches.push(...response.data.results.filter((item) => item.match && item.status === 'recorded'));
+        
+        const sent = new Set(batch.map((swipe) => swipe.idempotency_key));
+        const pendingSwipes = get().pendingSwipes.filter((swipe) => !sent.has(swipe.idempotency_key));
+        saveSwipeQueue(pendingSwipes);
+        set({ pendingSwipes });
       }
-      return { success: true };
+      set({ isFlushingSwipes: false });
+      return { success: true, matches };
+    } catch (error) {
+      if (error.response?.status === 422) {
+        // A malformed queue would never be accepted; drop it rather than retry forever
+        saveSwipeQueue([]);
+        set({ pendingSwipes: [] });
+      }
+      set({ isFlushingSwipes: false });
+      return { success: false, matches, error: error.response?.data?.detail || 'Failed to send queued swipes' };
+    }
+  },
+
+  undoSwipe: async (steps = 1) => {
+    try {
+      const response = await discoveryAPI.undoSwipe(steps);
+      const undone = response.data.undone?.length || 1;
+      set({ currentCardIndex: Math.max(get().currentCardIndex - undone, 0) });
+      return { success: true, undone };
     } catch (error) {
       return { success: false, error: error.response?.data?.detail || 'Undo failed' };
     }
@@ -115,6 +200,8 @@ export const useUserStore = create((set, get) => ({
       receivedLikes: [],
       isLoadingCards: false,
       isLoadingMatches: false,
+      pendingSwipes: [],
     });
+    saveSwipeQueue([]);
   },
 }));
@@ -72,7 +72,8 @@ export const usersAPI = {
 export const discoveryAPI = {
   getCards: (limit = 10) => api.get(`/discovery?limit=${limit}`),
   swipe: (swipeData) => api.post('/swipe', swipeData),
-  undoSwipe: () => api.post('/swipe/undo'),
+  swipeBatch: (swipes) => api.post('/swipe/batch', { swipes }),
+  undoSwipe: (steps = 1) => api.post('/swipe/undo', null, { params: { steps } }),
 };
 
 // Matches
@@ -83,9 +84,10 @@ export const matchesAPI = {
 
 // Messages
 export const messagesAPI = {
-  getMessages: (matchId, limit = 50) => api.get(`/messages/${matchId}?limit=${limit}`),
+  getMessages: (matchId, { limit = 50, before, after } = {}) => api.get(`/messages/${matchId}`, { params: { limit, before, after } }),
   sendMessage: (messageData) => api.post('/messages', messageData),
-  getIcebreaker: (matchId) => api.get(`/messages/icebreaker/${matchId}`),
+  markRead: (matchId, messageIds) => api.post('/messages/read', { match_id: matchId, message_ids: messageIds }),
+  getIcebreaker: (matchId, regenerate = false) => api.get(`/messages/icebreaker/${matchId}?regenerate=${regenerate}`),
 };
 
 // Premium & Coins
@@ -0,0 +1,59 @@
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8001/api';
+const WS_URL = API_URL.replace(/^http/, 'ws') + '/ws';
+
+const getToken = () => {
+  try {
+    const { state } = JSON.parse(localStorage.getItem('auth-storage') || '{}');
+    return state?.token || null;
+  } catch {
+    return null;
+  }
+};
+
+// Open the real-time gateway and reconnect with backoff until closed.
+// onEvent receives server events: message, message_hidden, read, typing, ready.
+export const connectRealtime = (onEvent, onStatusChange = () => {}) => {
+  let socket = null;
+  let retryDelay = 1000;
+  let retryTimer = null;
+  let closed = false;
+
+  const open = () => {
+    const token = getToken();
+    if (!token || closed) return;
+
+    socket = new WebSocket(`${WS_URL}?token=${encodeURIComponent(token)}`);
+    socket.onopen = () => {
+      retryDelay = 1000;
+      onStatusChange(true);
+    };
+    socket.onmessage = (e) => {
+      try {
+        onEvent(JSON.parse(e.data));
+      } catch (error) {
+        console.error('Bad realtime event:', error);
+      }
+    };
+    socket.onclose = () => {
+      onStatusChange(false);
+      if (closed) return;
+      retryTimer = setTimeout(open, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  };
+
+  open();
+
+  return {
+    send: (event) => {
+      if (socket?.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify(event));
+      }
+    },
+    close: () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      socket?.close();
+    },
+  };
+};
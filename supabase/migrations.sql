@@ -30,6 +30,7 @@ CREATE TABLE users (
   location GEOGRAPHY(POINT, 4326),
   city TEXT,
   location_updated_at TIMESTAMP DEFAULT NOW(),
+  timezone TEXT, -- IANA name; daily limits reset at local midnight
   
   -- Social links
   instagram TEXT,
@@ -146,6 +147,14 @@ CREATE TABLE messages (
   -- Expiration for media (7 days)
   expires_at TIMESTAMP,
   
+  -- Background moderation (hidden from the recipient once flagged);
+  -- messages without text are stored as 'approved'
+  moderation_status TEXT DEFAULT 'pending' CHECK (moderation_status IN ('pending', 'approved', 'flagged')),
+  moderated_at TIMESTAMP,
+  -- Set while a worker's sweep holds the message, so other workers skip it
+  moderation_claimed_until TIMESTAMP,
+  is_hidden BOOLEAN DEFAULT FALSE,
+  
   sent_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -157,7 +166,38 @@ CREATE TABLE swipe_history (
   user_id UUID REFERENCES users(id) ON DELETE CASCADE,
   swiped_user_id UUID REFERENCES users(id) ON DELETE CASCADE,
   action TEXT CHECK (action IN ('like', 'pass', 'super_like')),
-  created_at TIMESTAMP DEFAULT NOW()
+  -- Client-generated key so retried or queued swipes are recorded once
+  idempotency_key TEXT,
+  created_at TIMESTAMP DEFAULT NOW(),
+  UNIQUE(user_id, idempotency_key)
+);
+
+-- ============================================
+-- SWIPED SETS (swipe_history compacted past the retention window)
+-- ============================================
+CREATE TABLE swiped_sets (
+  user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  swiped_user_ids UUID[] NOT NULL DEFAULT '{}',
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- ============================================
+-- SWIPE DAILY STATS (aggregated from the API's swipe event log)
+-- ============================================
+CREATE TABLE swipe_daily_stats (
+  day DATE NOT NULL,
+  user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+  likes INTEGER DEFAULT 0,
+  super_likes INTEGER DEFAULT 0,
+  passes INTEGER DEFAULT 0,
+  undos INTEGER DEFAULT 0,
+  PRIMARY KEY (day, user_id)
+);
+
+-- Event log segments already folded into swipe_daily_stats (exactly-once compaction)
+CREATE TABLE swipe_log_segments (
+  segment TEXT PRIMARY KEY,
+  compacted_at TIMESTAMP DEFAULT NOW()
 );
 
 -- ============================================
@@ -219,6 +259,8 @@ CREATE TABLE reports (
   id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
   reporter_id UUID REFERENCES users(id) ON DELETE CASCADE,
   reported_user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+  -- Set for automatic reports filed by message moderation (reporter_id is NULL)
+  message_id UUID REFERENCES messages(id) ON DELETE SET NULL,
   reason TEXT CHECK (reason IN ('inappropriate_content', 'fake_profile', 'harassment', 'spam', 'underage', 'other')),
   description TEXT,
   status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'reviewed', 'action_taken', 'dismissed')),
@@ -352,6 +394,44 @@ CREATE TABLE notifications (
   created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- ============================================
+-- MATCH INBOX (denormalized per-user match list)
+-- ============================================
+CREATE TABLE match_inbox (
+  user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+  match_id UUID REFERENCES matches(id) ON DELETE CASCADE,
+  other_user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+  match_created_at TIMESTAMP DEFAULT NOW(),
+  is_blocked BOOLEAN DEFAULT FALSE,
+  
+  -- Last message preview
+  last_message_id UUID,
+  last_message_preview TEXT,
+  last_message_type TEXT,
+  last_sender_id UUID,
+  last_message_at TIMESTAMP,
+  
+  -- Messages from the other user not yet read by user_id
+  unread_count INTEGER DEFAULT 0 CHECK (unread_count >= 0),
+  
+  -- Sort key: last message time, or match time when there are no messages
+  last_activity_at TIMESTAMP DEFAULT NOW(),
+  
+  PRIMARY KEY (user_id, match_id)
+);
+
+-- ============================================
+-- USER QUOTAS (daily usage counters, usage added periodically by the API)
+-- ============================================
+CREATE TABLE user_quotas (
+  user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+  feature TEXT NOT NULL, -- 'super_likes', 'likes', 'undos'
+  window_date DATE NOT NULL, -- day in the user's timezone the counter belongs to
+  used INTEGER DEFAULT 0 CHECK (used >= 0),
+  updated_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (user_id, feature)
+);
+
 -- ============================================
 -- INDEXES for Performance
 -- ============================================
@@ -369,6 +449,7 @@ CREATE INDEX idx_users_gender ON users (gender);
 CREATE INDEX idx_likes_liker ON likes (liker_id);
 CREATE INDEX idx_likes_liked ON likes (liked_id);
 CREATE INDEX idx_likes_created ON likes (created_at DESC);
+CREATE INDEX idx_likes_super_liker ON likes (liker_id, created_at) WHERE is_super = TRUE;
 
 -- Matches
 CREATE INDEX idx_matches_user1 ON matches (user_id_1);
@@ -376,14 +457,18 @@ CREATE INDEX idx_matches_user2 ON matches (user_id_2);
 CREATE INDEX idx_matches_created ON matches (created_at DESC);
 
 -- Messages
-CREATE INDEX idx_messages_match ON messages (match_id);
+-- Keyset pagination of a conversation, newest first (id breaks sent_at ties)
+CREATE INDEX idx_messages_match_sent ON messages (match_id, sent_at DESC, id DESC);
 CREATE INDEX idx_messages_sender ON messages (sender_id);
-CREATE INDEX idx_messages_sent ON messages (sent_at DESC);
 CREATE INDEX idx_messages_read ON messages (is_read);
+-- Small partial index for re-queueing messages that were never moderated
+CREATE INDEX idx_messages_moderation_pending ON messages (sent_at) WHERE moderation_status = 'pending' AND content IS NOT NULL;
 
 -- Swipe History
-CREATE INDEX idx_swipe_history_user ON swipe_history (user_id);
+CREATE INDEX idx_swipe_history_user_swiped ON swipe_history (user_id, swiped_user_id);
 CREATE INDEX idx_swipe_history_created ON swipe_history (created_at DESC);
+-- Latest swipes of one user (recent-swipe buffer for undo)
+CREATE INDEX idx_swipe_history_user_created ON swipe_history (user_id, created_at DESC);
 
 -- Subscriptions
 CREATE INDEX idx_subscriptions_user ON subscriptions (user_id);
@@ -412,6 +497,10 @@ CREATE INDEX idx_notifications_user ON notifications (user_id);
 CREATE INDEX idx_notifications_read ON notifications (is_read);
 CREATE INDEX idx_notifications_created ON notifications (created_at DESC);
 
+-- Match Inbox
+CREATE INDEX idx_match_inbox_user_activity ON match_inbox (user_id, last_activity_at DESC);
+CREATE INDEX idx_match_inbox_match ON match_inbox (match_id);
+
 -- ============================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
 -- ============================================
@@ -426,6 +515,11 @@ ALTER TABLE subscriptions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE coin_transactions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE reports ENABLE ROW LEVEL SECURITY;
 ALTER TABLE notifications ENABLE ROW LEVEL SECURITY;
+ALTER TABLE match_inbox ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_quotas ENABLE ROW LEVEL SECURITY;
+ALTER TABLE swiped_sets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE swipe_daily_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE swipe_log_segments ENABLE ROW LEVEL SECURITY;
 
 -- Users policies
 CREATE POLICY "Users can view own profile" ON users FOR SELECT USING (auth.uid() = id);
@@ -463,6 +557,12 @@ CREATE POLICY "Users can view own transactions" ON coin_transactions FOR SELECT
 CREATE POLICY "Users can view own notifications" ON notifications FOR SELECT USING (auth.uid() = user_id);
 CREATE POLICY "Users can update own notifications" ON notifications FOR UPDATE USING (auth.uid() = user_id);
 
+-- Match inbox policies
+CREATE POLICY "Users can view own inbox" ON match_inbox FOR SELECT USING (auth.uid() = user_id);
+
+-- User quotas policies
+CREATE POLICY "Users can view own quotas" ON user_quotas FOR SELECT USING (auth.uid() = user_id);
+
 -- ============================================
 -- FUNCTIONS
 -- ============================================
@@ -491,6 +591,71 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function returning discovery candidates for a user in one call:
+-- age/gender/approval/ban filters, max_distance radius, already-swiped
+-- (recent swipe_history plus the compacted swiped_sets) and blocked
+-- exclusion (anti-joins), with distance in km computed per row
+-- p_candidate_ids optionally restricts the scan to ids pre-selected by the
+-- application's in-memory candidate index
+CREATE OR REPLACE FUNCTION get_discovery_candidates(
+  p_user_id UUID,
+  p_limit INTEGER DEFAULT 10,
+  p_candidate_ids UUID[] DEFAULT NULL
+)
+RETURNS SETOF JSONB AS $$
+  WITH me AS (
+    SELECT
+      id,
+      location,
+      NULLIF(show_gender, '') AS show_gender,
+      COALESCE(min_age, 18) AS min_age,
+      COALESCE(max_age, 100) AS max_age,
+      COALESCE(max_distance, 100) AS max_distance
+    FROM users
+    WHERE id = p_user_id
+  ),
+  candidates AS (
+    SELECT
+      u.*,
+      CASE
+        WHEN me.location IS NULL OR u.location IS NULL THEN NULL
+        ELSE ROUND((ST_Distance(me.location, u.location) / 1000)::numeric, 1)
+      END AS distance
+    FROM users u
+    CROSS JOIN me
+    WHERE u.id <> me.id
+      AND (p_candidate_ids IS NULL OR u.id = ANY(p_candidate_ids))
+      AND u.is_approved = TRUE
+      AND u.is_banned = FALSE
+      AND u.age BETWEEN me.min_age AND me.max_age
+      AND (me.show_gender IS NULL OR u.gender = me.show_gender)
+      AND (
+        me.location IS NULL OR u.location IS NULL
+        OR ST_DWithin(u.location, me.location, me.max_distance * 1000)
+      )
+      AND NOT EXISTS (
+        SELECT 1 FROM swipe_history s
+        WHERE s.user_id = me.id AND s.swiped_user_id = u.id
+      )
+      -- Uncorrelated (keyed on the parameter), so the unnested set is hashed once
+      -- instead of scanning the array for every candidate row
+      AND u.id NOT IN (
+        SELECT unnest(ss.swiped_user_ids) FROM swiped_sets ss
+        WHERE ss.user_id = p_user_id
+      )
+      AND NOT EXISTS (
+        SELECT 1 FROM matches m
+        WHERE m.is_blocked = TRUE
+        AND m.user_id_1 = LEAST(me.id, u.id)
+        AND m.user_id_2 = GREATEST(me.id, u.id)
+      )
+  )
+  SELECT to_jsonb(c)
+  FROM candidates c
+  ORDER BY c.distance NULLS LAST
+  LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
 -- Function to create a match when mutual like occurs
 CREATE OR REPLACE FUNCTION check_and_create_match()
 RETURNS TRIGGER AS $$
@@ -537,6 +702,543 @@ CREATE TRIGGER create_match_on_mutual_like
 AFTER INSERT ON likes
 FOR EACH ROW EXECUTE FUNCTION check_and_create_match();
 
+-- Function to keep match_inbox rows in sync with matches
+CREATE OR REPLACE FUNCTION sync_match_inbox()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO match_inbox (user_id, match_id, other_user_id, match_created_at, last_activity_at)
+    VALUES
+      (NEW.user_id_1, NEW.id, NEW.user_id_2, NEW.created_at, NEW.created_at),
+      (NEW.user_id_2, NEW.id, NEW.user_id_1, NEW.created_at, NEW.created_at)
+    ON CONFLICT (user_id, match_id) DO NOTHING;
+  ELSIF NEW.is_blocked IS DISTINCT FROM OLD.is_blocked THEN
+    UPDATE match_inbox SET is_blocked = NEW.is_blocked WHERE match_id = NEW.id;
+  END IF;
+  
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger for inbox rows on match creation / blocking
+CREATE TRIGGER sync_match_inbox_on_match
+AFTER INSERT OR UPDATE OF is_blocked ON matches
+FOR EACH ROW EXECUTE FUNCTION sync_match_inbox();
+
+-- Function to update both inbox rows when a message is sent
+CREATE OR REPLACE FUNCTION inbox_record_message()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE match_inbox SET
+    last_message_id = NEW.id,
+    last_message_preview = LEFT(NEW.content, 100),
+    last_message_type = NEW.message_type,
+    last_sender_id = NEW.sender_id,
+    last_message_at = NEW.sent_at,
+    last_activity_at = NEW.sent_at,
+    unread_count = unread_count + CASE WHEN user_id <> NEW.sender_id THEN 1 ELSE 0 END
+  WHERE match_id = NEW.match_id;
+  
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger for inbox update on new message
+CREATE TRIGGER update_inbox_on_message
+AFTER INSERT ON messages
+FOR EACH ROW EXECUTE FUNCTION inbox_record_message();
+
+-- Function to mark a match as read for one user (messages + inbox counter)
+CREATE OR REPLACE FUNCTION mark_match_read(p_match_id UUID, p_user_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+  marked INTEGER;
+BEGIN
+  UPDATE messages SET is_read = TRUE, read_at = NOW()
+  WHERE match_id = p_match_id AND is_read = FALSE AND sender_id <> p_user_id;
+  GET DIAGNOSTICS marked = ROW_COUNT;
+  
+  UPDATE match_inbox SET unread_count = 0
+  WHERE match_id = p_match_id AND user_id = p_user_id AND unread_count <> 0;
+  
+  RETURN marked;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to mark specific messages as read by one user (batched read receipts)
+CREATE OR REPLACE FUNCTION mark_messages_read(p_match_id UUID, p_user_id UUID, p_message_ids UUID[])
+RETURNS UUID[] AS $$
+DECLARE
+  marked UUID[];
+BEGIN
+  WITH updated AS (
+    UPDATE messages SET is_read = TRUE, read_at = NOW()
+    WHERE id = ANY(p_message_ids)
+      AND match_id = p_match_id
+      AND sender_id <> p_user_id
+      AND is_read = FALSE
+      AND is_hidden = FALSE
+      AND EXISTS (
+        SELECT 1 FROM matches m
+        WHERE m.id = p_match_id AND (m.user_id_1 = p_user_id OR m.user_id_2 = p_user_id)
+      )
+    RETURNING id
+  )
+  SELECT COALESCE(array_agg(id), '{}') INTO marked FROM updated;
+  
+  IF cardinality(marked) > 0 THEN
+    UPDATE match_inbox SET unread_count = GREATEST(unread_count - cardinality(marked), 0)
+    WHERE match_id = p_match_id AND user_id = p_user_id;
+  END IF;
+  
+  RETURN marked;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to hide a message flagged by moderation and file a report, atomically.
+-- Returns {"match_id", "message_id", "recipient_id"} for the realtime event,
+-- or NULL if the message was already flagged
+CREATE OR REPLACE FUNCTION retract_flagged_message(p_message_id UUID, p_reason TEXT, p_description TEXT)
+RETURNS JSONB AS $$
+DECLARE
+  msg messages%ROWTYPE;
+  recipient_id UUID;
+BEGIN
+  UPDATE messages SET is_hidden = TRUE, moderation_status = 'flagged', moderated_at = NOW()
+  WHERE id = p_message_id AND moderation_status <> 'flagged'
+  RETURNING * INTO msg;
+  
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+  
+  -- Drop the preview and unread count the message added to the recipient's inbox
+  UPDATE match_inbox SET
+    last_message_preview = CASE WHEN last_message_id = msg.id THEN NULL ELSE last_message_preview END,
+    unread_count = CASE WHEN msg.is_read THEN unread_count ELSE GREATEST(unread_count - 1, 0) END
+  WHERE match_id = msg.match_id AND user_id <> msg.sender_id;
+  
+  INSERT INTO reports (reported_user_id, message_id, reason, description)
+  VALUES (msg.sender_id, msg.id, p_reason, p_description);
+  
+  SELECT CASE WHEN user_id_1 = msg.sender_id THEN user_id_2 ELSE user_id_1 END INTO recipient_id
+  FROM matches WHERE id = msg.match_id;
+  
+  RETURN jsonb_build_object('match_id', msg.match_id, 'message_id', msg.id, 'recipient_id', recipient_id);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function adding usage deltas from one API worker to user_quotas, so
+-- concurrent workers never overwrite each other's counts. A later
+-- window_date restarts the counter, an earlier one is ignored.
+-- p_rows: [{"user_id", "feature", "window_date", "delta"}], one per counter.
+-- Returns the resulting [{"user_id", "feature", "window_date", "used"}]
+CREATE OR REPLACE FUNCTION add_quota_usage(p_rows JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  results JSONB;
+BEGIN
+  INSERT INTO user_quotas (user_id, feature, window_date, used)
+  SELECT r.user_id, r.feature, r.window_date, 0
+  FROM jsonb_to_recordset(p_rows) AS r(user_id UUID, feature TEXT, window_date DATE, delta INTEGER)
+  WHERE EXISTS (SELECT 1 FROM users WHERE id = r.user_id)
+  ON CONFLICT (user_id, feature) DO NOTHING;
+  
+  -- Lock in key order so workers flushing overlapping counters cannot deadlock
+  PERFORM 1 FROM user_quotas q
+  WHERE (q.user_id, q.feature) IN (
+    SELECT r.user_id, r.feature
+    FROM jsonb_to_recordset(p_rows) AS r(user_id UUID, feature TEXT)
+  )
+  ORDER BY q.user_id, q.feature
+  FOR UPDATE;
+  
+  WITH updated AS (
+    UPDATE user_quotas q SET
+      used = CASE
+        WHEN r.window_date > q.window_date THEN GREATEST(r.delta, 0)
+        WHEN r.window_date = q.window_date THEN GREATEST(q.used + r.delta, 0)
+        ELSE q.used
+      END,
+      window_date = GREATEST(q.window_date, r.window_date),
+      updated_at = NOW()
+    FROM jsonb_to_recordset(p_rows) AS r(user_id UUID, feature TEXT, window_date DATE, delta INTEGER)
+    WHERE q.user_id = r.user_id AND q.feature = r.feature
+    RETURNING q.user_id, q.feature, q.window_date, q.used
+  )
+  SELECT COALESCE(jsonb_agg(to_jsonb(updated)), '[]'::jsonb) INTO results FROM updated;
+  
+  RETURN results;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function claiming up to p_limit messages still pending moderation that were
+-- sent before p_before, for p_lease_seconds. Claimed rows are skipped by other
+-- workers' sweeps until the lease runs out (e.g. the claiming worker died)
+CREATE OR REPLACE FUNCTION claim_pending_messages(p_before TIMESTAMP, p_limit INTEGER, p_lease_seconds INTEGER DEFAULT 300)
+RETURNS TABLE (id UUID, content TEXT) AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE messages m SET moderation_claimed_until = NOW() + make_interval(secs => p_lease_seconds)
+  WHERE m.id IN (
+    SELECT p.id FROM messages p
+    WHERE p.moderation_status = 'pending' AND p.content IS NOT NULL
+      AND p.sent_at < p_before
+      AND (p.moderation_claimed_until IS NULL OR p.moderation_claimed_until < NOW())
+    ORDER BY p.sent_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING m.id, m.content;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function recording one swipe in a single transaction: free-tier super like
+-- limit, swipe history, like row (the match trigger fires on it) and counters
+-- incremented in place. A repeated p_idempotency_key is not recorded again.
+-- Super likes are counted from p_day_start (midnight of the user's local
+-- day); a NULL p_super_like_limit or p_day_start skips the limit check.
+-- Returns {"limit_reached", "duplicate", "match", "match_id", "history_id", "created_at"}
+CREATE OR REPLACE FUNCTION record_swipe(
+  p_user_id UUID,
+  p_swiped_user_id UUID,
+  p_action TEXT,
+  p_super_like_limit INTEGER DEFAULT NULL,
+  p_idempotency_key TEXT DEFAULT NULL,
+  p_day_start TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+  user_is_premium BOOLEAN;
+  is_duplicate BOOLEAN := FALSE;
+  history_id UUID;
+  history_created_at TIMESTAMP;
+  like_id UUID;
+  found_match_id UUID;
+BEGIN
+  -- Row lock serializes concurrent swipes of one user, so the limit check cannot race
+  SELECT COALESCE(is_premium, FALSE) INTO user_is_premium
+  FROM users WHERE id = p_user_id
+  FOR UPDATE;
+  
+  IF p_idempotency_key IS NOT NULL THEN
+    SELECT EXISTS(
+      SELECT 1 FROM swipe_history
+      WHERE user_id = p_user_id AND idempotency_key = p_idempotency_key
+    ) INTO is_duplicate;
+  END IF;
+  
+  IF NOT is_duplicate THEN
+    IF p_action = 'super_like' AND p_super_like_limit IS NOT NULL AND p_day_start IS NOT NULL
+      AND NOT COALESCE(user_is_premium, FALSE) AND (
+        SELECT COUNT(*) FROM likes
+        WHERE liker_id = p_user_id AND is_super = TRUE AND created_at >= p_day_start
+      ) >= p_super_like_limit THEN
+      RETURN jsonb_build_object('limit_reached', TRUE, 'duplicate', FALSE, 'match', FALSE, 'match_id', NULL);
+    END IF;
+    
+    INSERT INTO swipe_history (user_id, swiped_user_id, action, idempotency_key)
+    VALUES (p_user_id, p_swiped_user_id, p_action, p_idempotency_key)
+    RETURNING id, created_at INTO history_id, history_created_at;
+    
+    IF p_action IN ('like', 'super_like') THEN
+      INSERT INTO likes (liker_id, liked_id, is_super)
+      VALUES (p_user_id, p_swiped_user_id, p_action = 'super_like')
+      ON CONFLICT (liker_id, liked_id) DO NOTHING
+      RETURNING id INTO like_id;
+      
+      IF like_id IS NOT NULL THEN
+        UPDATE users SET
+          total_likes_given = COALESCE(total_likes_given, 0) + 1,
+          total_super_likes_given = COALESCE(total_super_likes_given, 0)
+            + CASE WHEN p_action = 'super_like' THEN 1 ELSE 0 END
+        WHERE id = p_user_id;
+      END IF;
+    END IF;
+  END IF;
+  
+  IF p_action IN ('like', 'super_like') THEN
+    SELECT id INTO found_match_id FROM matches
+    WHERE user_id_1 = LEAST(p_user_id, p_swiped_user_id)
+      AND user_id_2 = GREATEST(p_user_id, p_swiped_user_id);
+  END IF;
+  
+  RETURN jsonb_build_object(
+    'limit_reached', FALSE,
+    'duplicate', is_duplicate,
+    'match', found_match_id IS NOT NULL,
+    'match_id', found_match_id,
+    'history_id', history_id,
+    'created_at', history_created_at
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function recording a client's queued swipes in order with bulk inserts.
+-- p_swipes: [{"swiped_user_id", "action", "idempotency_key", "client_swiped_at"}].
+-- Each item gets a status: 'recorded', 'duplicate' (key already recorded) or
+-- 'limit_reached' (super like past p_super_like_limit since p_day_start, when
+-- both are given). Returns one
+-- {"idempotency_key", "swiped_user_id", "action", "status", "match", "match_id",
+-- "history_id", "created_at"} per item, in the order given
+CREATE OR REPLACE FUNCTION record_swipes(
+  p_user_id UUID,
+  p_swipes JSONB,
+  p_super_like_limit INTEGER DEFAULT NULL,
+  p_day_start TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+  user_is_premium BOOLEAN;
+  super_likes_left INTEGER;
+  statuses JSONB;
+  results JSONB;
+BEGIN
+  SELECT COALESCE(is_premium, FALSE) INTO user_is_premium
+  FROM users WHERE id = p_user_id
+  FOR UPDATE;
+  
+  -- NULL means unchecked (premium, or no p_super_like_limit / p_day_start given)
+  IF p_super_like_limit IS NOT NULL AND p_day_start IS NOT NULL AND NOT COALESCE(user_is_premium, FALSE) THEN
+    SELECT GREATEST(p_super_like_limit - COUNT(*), 0) INTO super_likes_left
+    FROM likes
+    WHERE liker_id = p_user_id AND is_super = TRUE AND created_at >= p_day_start;
+  END IF;
+  
+  WITH incoming AS (
+    SELECT
+      e.ord,
+      e.item->>'idempotency_key' AS idempotency_key,
+      (e.item->>'swiped_user_id')::UUID AS swiped_user_id,
+      e.item->>'action' AS action,
+      -- Client clocks are untrusted: keep queued swipes within the last day and never in the future
+      LEAST(
+        GREATEST(COALESCE((e.item->>'client_swiped_at')::TIMESTAMPTZ, NOW()), NOW() - INTERVAL '1 day'),
+        NOW()
+      ) AS swiped_at,
+      EXISTS (
+        SELECT 1 FROM swipe_history h
+        WHERE h.user_id = p_user_id AND h.idempotency_key = e.item->>'idempotency_key'
+      ) OR (
+        e.item->>'idempotency_key' IS NOT NULL
+        AND ROW_NUMBER() OVER (PARTITION BY e.item->>'idempotency_key' ORDER BY e.ord) > 1
+      ) AS is_duplicate
+    FROM jsonb_array_elements(p_swipes) WITH ORDINALITY AS e(item, ord)
+  ),
+  classified AS (
+    SELECT
+      i.*,
+      CASE
+        WHEN i.is_duplicate THEN 'duplicate'
+        WHEN i.action = 'super_like' AND super_likes_left IS NOT NULL
+          AND COUNT(*) FILTER (WHERE i.action = 'super_like' AND NOT i.is_duplicate)
+            OVER (ORDER BY i.ord) > super_likes_left
+          THEN 'limit_reached'
+        ELSE 'recorded'
+      END AS status
+    FROM incoming i
+  ),
+  new_history AS (
+    INSERT INTO swipe_history (user_id, swiped_user_id, action, idempotency_key, created_at)
+    SELECT p_user_id, swiped_user_id, action, idempotency_key, swiped_at
+    FROM classified
+    WHERE status = 'recorded'
+    ORDER BY ord
+    RETURNING id, idempotency_key, created_at
+  ),
+  new_likes AS (
+    INSERT INTO likes (liker_id, liked_id, is_super)
+    SELECT DISTINCT ON (swiped_user_id) p_user_id, swiped_user_id, action = 'super_like'
+    FROM classified
+    WHERE status = 'recorded' AND action IN ('like', 'super_like')
+    ORDER BY swiped_user_id, ord
+    ON CONFLICT (liker_id, liked_id) DO NOTHING
+    RETURNING is_super
+  ),
+  counters AS (
+    UPDATE users SET
+      total_likes_given = COALESCE(total_likes_given, 0) + (SELECT COUNT(*) FROM new_likes),
+      total_super_likes_given = COALESCE(total_super_likes_given, 0)
+        + (SELECT COUNT(*) FROM new_likes WHERE is_super)
+    WHERE id = p_user_id AND EXISTS (SELECT 1 FROM new_likes)
+  )
+  SELECT jsonb_agg(jsonb_build_object(
+    'ord', c.ord,
+    'idempotency_key', c.idempotency_key,
+    'swiped_user_id', c.swiped_user_id,
+    'action', c.action,
+    'status', c.status,
+    'history_id', h.id,
+    'created_at', h.created_at
+  ) ORDER BY c.ord) INTO statuses
+  FROM classified c
+  LEFT JOIN new_history h ON c.status = 'recorded' AND h.idempotency_key = c.idempotency_key;
+  
+  -- Matches created by the likes trigger are only visible to a new statement
+  SELECT COALESCE(jsonb_agg(
+    (s.item - 'ord') || jsonb_build_object('match', m.id IS NOT NULL, 'match_id', m.id)
+    ORDER BY (s.item->>'ord')::INTEGER
+  ), '[]'::jsonb) INTO results
+  FROM jsonb_array_elements(COALESCE(statuses, '[]'::jsonb)) AS s(item)
+  LEFT JOIN matches m
+    ON s.item->>'status' <> 'limit_reached'
+    AND s.item->>'action' IN ('like', 'super_like')
+    AND m.user_id_1 = LEAST(p_user_id, (s.item->>'swiped_user_id')::UUID)
+    AND m.user_id_2 = GREATEST(p_user_id, (s.item->>'swiped_user_id')::UUID);
+  
+  RETURN results;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function undoing a user's most recent swipes in one transaction: charges
+-- p_coin_cost per swipe to non-premium users (with a 'rewind' transaction),
+-- deletes the history and like rows and lowers the like counters.
+-- Refuses with 'stale' when the user has newer swipes than the given ones
+-- (the caller's recent-swipe buffer is out of date).
+-- Returns {"status": 'undone' | 'not_found' | 'stale' | 'insufficient_coins',
+-- "undone": [{"history_id", "swiped_user_id", "action"}] newest first, "coins"}
+CREATE OR REPLACE FUNCTION undo_swipes(p_user_id UUID, p_history_ids UUID[], p_coin_cost INTEGER DEFAULT 50)
+RETURNS JSONB AS $$
+DECLARE
+  user_is_premium BOOLEAN;
+  user_coins INTEGER;
+  swipe_count INTEGER;
+  oldest TIMESTAMP;
+  charge INTEGER;
+  undone JSONB;
+BEGIN
+  SELECT COALESCE(is_premium, FALSE), COALESCE(coins, 0) INTO user_is_premium, user_coins
+  FROM users WHERE id = p_user_id
+  FOR UPDATE;
+  
+  SELECT COUNT(*), MIN(created_at) INTO swipe_count, oldest
+  FROM swipe_history
+  WHERE user_id = p_user_id AND id = ANY(p_history_ids);
+  
+  IF swipe_count = 0 THEN
+    RETURN jsonb_build_object('status', 'not_found', 'undone', '[]'::jsonb, 'coins', user_coins);
+  END IF;
+  
+  IF swipe_count < cardinality(p_history_ids) OR EXISTS (
+    SELECT 1 FROM swipe_history
+    WHERE user_id = p_user_id AND created_at > oldest AND id <> ALL(p_history_ids)
+  ) THEN
+    RETURN jsonb_build_object('status', 'stale', 'undone', '[]'::jsonb, 'coins', user_coins);
+  END IF;
+  
+  IF NOT COALESCE(user_is_premium, FALSE) THEN
+    charge := p_coin_cost * swipe_count;
+    IF user_coins < charge THEN
+      RETURN jsonb_build_object('status', 'insufficient_coins', 'undone', '[]'::jsonb, 'coins', user_coins);
+    END IF;
+    
+    UPDATE users SET coins = coins - charge WHERE id = p_user_id;
+    INSERT INTO coin_transactions (user_id, amount, transaction_type, description)
+    VALUES (p_user_id, -charge, 'rewind', 'Undo ' || swipe_count || ' swipe(s)');
+    user_coins := user_coins - charge;
+  END IF;
+  
+  WITH removed AS (
+    DELETE FROM swipe_history
+    WHERE user_id = p_user_id AND id = ANY(p_history_ids)
+    RETURNING id, swiped_user_id, action, created_at
+  ),
+  removed_likes AS (
+    DELETE FROM likes l
+    USING removed r
+    WHERE l.liker_id = p_user_id
+      AND l.liked_id = r.swiped_user_id
+      AND r.action IN ('like', 'super_like')
+    RETURNING l.is_super
+  ),
+  counters AS (
+    UPDATE users SET
+      total_likes_given = GREATEST(COALESCE(total_likes_given, 0) - (SELECT COUNT(*) FROM removed_likes), 0),
+      total_super_likes_given = GREATEST(
+        COALESCE(total_super_likes_given, 0) - (SELECT COUNT(*) FROM removed_likes WHERE is_super), 0
+      )
+    WHERE id = p_user_id AND EXISTS (SELECT 1 FROM removed_likes)
+  )
+  SELECT jsonb_agg(jsonb_build_object(
+    'history_id', id,
+    'swiped_user_id', swiped_user_id,
+    'action', action
+  ) ORDER BY created_at DESC) INTO undone
+  FROM removed;
+  
+  RETURN jsonb_build_object('status', 'undone', 'undone', COALESCE(undone, '[]'::jsonb), 'coins', user_coins);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function adding one event log segment's per-user daily counts to
+-- swipe_daily_stats. Each segment is applied at most once: returns FALSE
+-- if it was already compacted
+CREATE OR REPLACE FUNCTION add_swipe_daily_stats(p_segment TEXT, p_rows JSONB)
+RETURNS BOOLEAN AS $$
+BEGIN
+  INSERT INTO swipe_log_segments (segment) VALUES (p_segment)
+  ON CONFLICT (segment) DO NOTHING;
+  
+  IF NOT FOUND THEN
+    RETURN FALSE;
+  END IF;
+  
+  INSERT INTO swipe_daily_stats (day, user_id, likes, super_likes, passes, undos)
+  SELECT r.day, r.user_id, r.likes, r.super_likes, r.passes, r.undos
+  FROM jsonb_to_recordset(p_rows)
+    AS r(day DATE, user_id UUID, likes INTEGER, super_likes INTEGER, passes INTEGER, undos INTEGER)
+  WHERE EXISTS (SELECT 1 FROM users WHERE id = r.user_id)
+  ON CONFLICT (day, user_id) DO UPDATE SET
+    likes = swipe_daily_stats.likes + EXCLUDED.likes,
+    super_likes = swipe_daily_stats.super_likes + EXCLUDED.super_likes,
+    passes = swipe_daily_stats.passes + EXCLUDED.passes,
+    undos = swipe_daily_stats.undos + EXCLUDED.undos;
+  
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function moving up to p_limit swipe_history rows older than p_before into
+-- the per-user swiped_sets arrays (discovery exclusion only needs the pair).
+-- Safe to run from several workers at once. Returns the number of rows moved
+CREATE OR REPLACE FUNCTION compact_swipe_history(p_before TIMESTAMP, p_limit INTEGER DEFAULT 10000)
+RETURNS INTEGER AS $$
+DECLARE
+  moved_count INTEGER;
+BEGIN
+  WITH batch AS (
+    SELECT id FROM swipe_history
+    WHERE created_at < p_before
+    ORDER BY created_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  ),
+  moved AS (
+    DELETE FROM swipe_history h
+    USING batch b
+    WHERE h.id = b.id
+    RETURNING h.user_id, h.swiped_user_id
+  ),
+  grouped AS (
+    SELECT user_id, array_agg(DISTINCT swiped_user_id) AS swiped_user_ids
+    FROM moved
+    GROUP BY user_id
+  ),
+  merged AS (
+    INSERT INTO swiped_sets (user_id, swiped_user_ids, updated_at)
+    SELECT user_id, swiped_user_ids, NOW() FROM grouped
+    ON CONFLICT (user_id) DO UPDATE SET
+      swiped_user_ids = ARRAY(
+        SELECT DISTINCT unnest(swiped_sets.swiped_user_ids || EXCLUDED.swiped_user_ids)
+      ),
+      updated_at = NOW()
+  )
+  SELECT COUNT(*) INTO moved_count FROM moved;
+  
+  RETURN moved_count;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================
 -- SEED DATA - Default Achievements
 -- ============================================
@@ -584,7 +1286,9 @@ INSERT INTO admin_settings (setting_key, setting_value) VALUES
 ('app_name', 'ConnectSphere'),
 ('app_version', '1.0.0'),
 ('maintenance_mode', 'false'),
-('registration_enabled', 'true');
+('registration_enabled', 'true'),
+-- Per-tier limits (null = unlimited); messages is per minute, the rest per day
+('quota_limits', '{"free": {"super_likes": 1, "likes": null, "undos": null, "messages": null}, "premium": {"super_likes": null, "likes": null, "undos": null, "messages": null}}');
 
 -- ============================================
 -- VIEWS FOR ANALYTICS
@@ -630,6 +1334,7 @@ COMMENT ON TABLE users IS 'Main users table with profile information';
 COMMENT ON TABLE likes IS 'Swipe actions (like, pass, super like)';
 COMMENT ON TABLE matches IS 'Mutual matches between users';
 COMMENT ON TABLE messages IS 'Chat messages between matched users';
+COMMENT ON TABLE match_inbox IS 'Per-user match list with last message and unread counter';
 COMMENT ON TABLE subscriptions IS 'Premium subscription records';
 COMMENT ON TABLE coin_transactions IS 'In-app coin purchase and usage history';
 COMMENT ON TABLE achievements IS 'Available achievements in the app';